@@ -0,0 +1,33 @@
+from rest_framework import filters
+
+from core.search import search_dishes
+from core.tags import TAG_MATCH_ALL, TAG_MATCH_ANY, filter_by_tags
+
+
+class DishSearchFilter(filters.BaseFilterBackend):
+    """
+    Полнотекстовый поиск блюд по названию, описанию и тегам
+
+    Использует индекс core_dish_search вместо icontains по трем столбцам;
+    результаты упорядочены по релевантности, если не задан ordering.
+    """
+    search_param = filters.SearchFilter.search_param
+
+    def filter_queryset(self, request, queryset, view):
+        return search_dishes(queryset, request.query_params.get(self.search_param, ''))
+
+
+class DishTagFilter(filters.BaseFilterBackend):
+    """
+    Фильтр блюд по тегам: ?tags=суп,острое&tags_match=all
+
+    tags_match=any (по умолчанию) — хотя бы один тег, all — все теги.
+    """
+    tags_param = 'tags'
+    match_param = 'tags_match'
+
+    def filter_queryset(self, request, queryset, view):
+        match = request.query_params.get(self.match_param, TAG_MATCH_ANY)
+        if match not in (TAG_MATCH_ANY, TAG_MATCH_ALL):
+            match = TAG_MATCH_ANY
+        return filter_by_tags(queryset, request.query_params.get(self.tags_param, ''), match)
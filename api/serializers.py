@@ -0,0 +1,44 @@
+from rest_framework import serializers
+
+from core.models import Dish, Ingredient, HolidayEvent, Guest
+
+
+class DishSerializer(serializers.ModelSerializer):
+    """Блюдо; популярность и стоимость порции считаются сигналами"""
+    dish_type_name = serializers.CharField(source='dish_type.name', read_only=True, default=None)
+
+    class Meta:
+        model = Dish
+        fields = [
+            'id', 'name', 'description', 'dish_type', 'dish_type_name', 'cooking_time',
+            'difficulty', 'image', 'recipe', 'tags', 'popularity_score', 'cost_per_serving',
+        ]
+        read_only_fields = ['popularity_score', 'cost_per_serving']
+
+
+class IngredientSerializer(serializers.ModelSerializer):
+    """Ингредиент"""
+
+    class Meta:
+        model = Ingredient
+        fields = ['id', 'name', 'unit', 'average_price', 'category']
+
+
+class GuestSerializer(serializers.ModelSerializer):
+    """Гость с идентификаторами любимых блюд"""
+
+    class Meta:
+        model = Guest
+        fields = ['id', 'name', 'email', 'preferences', 'favorite_dishes']
+
+
+class EventSerializer(serializers.ModelSerializer):
+    """Мероприятие; выбранные блюда задаются через страницы меню"""
+
+    class Meta:
+        model = HolidayEvent
+        fields = [
+            'id', 'name', 'event_date', 'number_of_guests', 'guests',
+            'selected_dishes', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['selected_dishes', 'created_at', 'updated_at']
@@ -0,0 +1,14 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+router.register('dishes', views.DishViewSet)
+router.register('ingredients', views.IngredientViewSet)
+router.register('events', views.EventViewSet)
+router.register('guests', views.GuestViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -1,10 +1,22 @@
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from collections import Counter
+import logging
 
-from core.models import Dish, Ingredient, HolidayEvent, Guest
+from core.bulk_export import EXPORT_FORMATS, events_in_range, export_events
+from core.catalog import get_catalog, snapshot_generation
+from core.models import Dish, Ingredient, HolidayEvent, Guest, ShoppingList
+from core.similarity import TOP_NEIGHBORS, get_similarity_index
+from core.tags import tag_facets
+from .filters import DishSearchFilter, DishTagFilter
 from .serializers import (
     DishSerializer,
     IngredientSerializer,
@@ -12,96 +24,197 @@ from .serializers import (
     GuestSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _distribution(counter):
+    """Распределение по убыванию количества, как value_counts()"""
+    return dict(sorted(counter.items(), key=lambda item: item[1], reverse=True))
+
+
+def _dish_statistics(queryset):
+    """
+    Статистика каталога блюд средствами базы данных
+
+    Один сгруппированный запрос по (сложность, тип) дает общее количество,
+    среднее время и оба распределения.
+    """
+    groups = (
+        queryset.order_by()
+        .values('difficulty', 'dish_type__name')
+        .annotate(count=Count('id'), cooking_time=Sum('cooking_time'))
+    )
+
+    total = 0
+    total_time = 0
+    difficulties = Counter()
+    types = Counter()
+    for group in groups:
+        total += group['count']
+        total_time += group['cooking_time'] or 0
+        difficulties[group['difficulty']] += group['count']
+        if group['dish_type__name'] is not None:
+            types[group['dish_type__name']] += group['count']
+
+    return {
+        'total_dishes': total,
+        'avg_cooking_time': total_time / total if total else 0,
+        'difficulty_distribution': _distribution(difficulties),
+        'type_distribution': _distribution(types),
+    }
+
+
+def _top_popular(queryset, limit=5):
+    """Самые популярные блюда: запрос по индексу popularity_score"""
+    return list(queryset.order_by('-popularity_score', 'id').values('name', 'popularity_score')[:limit])
+
+
+def _to_id(value):
+    """
+    Идентификатор из JSON: целое число или строка с ним ("12")
+
+    Приведение идет через строку, поэтому true, 1.5 и "abc" дают ValueError,
+    а не молча превращаются в 1.
+    """
+    return int(str(value))
+
+
+def _dish_intersections(dish_ids, event_id=None):
+    """
+    Пересечения предпочтений по набору блюд
+
+    Пары гость–блюдо читаются одним запросом к промежуточной таблице
+    избранного (с именами гостей), названия блюд — из снимка каталога.
+    Совместная встречаемость считается матрично, без цикла по парам блюд.
+    """
+    from core.menu_logic import PreferenceMatrix
+
+    catalog = get_catalog()
+    dish_ids = [dish_id for dish_id in dish_ids if dish_id in catalog.index]
+
+    favorites = Guest.favorite_dishes.through.objects.filter(dish_id__in=dish_ids)
+    if event_id is not None:
+        favorites = favorites.filter(guest__holidayevent=event_id)
+    rows = list(favorites.order_by('guest_id').values_list('guest_id', 'dish_id', 'guest__name'))
+
+    guest_names = {guest_id: name for guest_id, _, name in rows}
+    guest_ids = list(guest_names)
+    preferences = PreferenceMatrix(guest_ids, dish_ids, [(guest_id, dish_id) for guest_id, dish_id, _ in rows])
+
+    matrix = preferences.co_occurrence()
+    counts = matrix.diagonal()
+    guests_by_dish = preferences.guests_by_dish(range(len(dish_ids)))
+
+    dishes = [
+        {
+            'dish_id': dish_id,
+            'name': str(catalog.names[catalog.index[dish_id]]),
+            'guest_count': int(counts[col]),
+            'guests': [guest_names[guest_ids[row]] for row in guests_by_dish.get(col, [])],
+        }
+        for col, dish_id in enumerate(dish_ids)
+    ]
+    dishes.sort(key=lambda dish: dish['guest_count'], reverse=True)
+
+    # Общие гости — те, кому нравится больше одного блюда из набора
+    dish_totals = preferences.guest_counts()
+    common_guests = [
+        {
+            'guest_id': guest_ids[row],
+            'name': guest_names[guest_ids[row]],
+            'common_dishes_count': int(dish_totals[row]),
+        }
+        for row in sorted(range(len(guest_ids)), key=lambda row: -dish_totals[row])
+        if dish_totals[row] > 1
+    ]
+
+    return {
+        'dishes': dishes,
+        'common_guests': common_guests,
+        'co_occurrence': {
+            'dish_ids': dish_ids,
+            'matrix': matrix.tolist(),
+        },
+    }
+
 class DishViewSet(viewsets.ModelViewSet):
     """API для блюд"""
     queryset = Dish.objects.all().select_related('dish_type')
     serializer_class = DishSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, DishTagFilter, DishSearchFilter, filters.OrderingFilter]
     filterset_fields = ['dish_type', 'difficulty']
-    search_fields = ['name', 'description', 'tags']
     ordering_fields = ['name', 'cooking_time', 'popularity_score']
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Статистика по блюдам"""
-        dishes = self.get_queryset()
-
-        # Используем pandas для анализа
-        data = list(dishes.values(
-            'name',
-            'dish_type__name',
-            'cooking_time',
-            'difficulty',
-            'popularity_score'
-        ))
-
-        if data:
-            df = pd.DataFrame(data)
-
-            stats = {
-                'total_dishes': len(df),
-                'avg_cooking_time': df['cooking_time'].mean(),
-                'difficulty_distribution': df['difficulty'].value_counts().to_dict(),
-                'type_distribution': df['dish_type__name'].value_counts().to_dict(),
-                'top_popular': df.nlargest(5, 'popularity_score')[['name', 'popularity_score']].to_dict('records')
-            }
-        else:
-            stats = {
-                'total_dishes': 0,
-                'avg_cooking_time': 0,
-                'difficulty_distribution': {},
-                'type_distribution': {},
-                'top_popular': []
-            }
+        # Распределения меняются вместе со снимком каталога, популярность —
+        # при каждом изменении избранного, поэтому читается из базы всегда
+        queryset = self.get_queryset()
+        key = f'api:dishes:statistics:{snapshot_generation()}'
+        stats = cache.get(key)
+        if stats is None:
+            stats = _dish_statistics(queryset)
+            cache.set(key, stats, settings.CATALOG_CACHE_TIMEOUT)
+        return Response({**stats, 'top_popular': _top_popular(queryset)})
 
-        return Response(stats)
+    @action(detail=False, methods=['get'])
+    def tags(self, request):
+        """Количество блюд по тегам с учетом фильтров и поиска"""
+        return Response(tag_facets(self.filter_queryset(self.get_queryset())))
 
     @action(detail=False, methods=['post'])
     def find_intersections(self, request):
-        """Поиск пересечений в предпочтениях"""
-        dish_ids = request.data.get('dish_ids', [])
+        """Поиск пересечений в предпочтениях (список dish_ids, необязательный event_id)"""
+        dish_ids = request.data.get('dish_ids')
+        event_id = request.data.get('event_id')
+        try:
+            if not isinstance(dish_ids, list):
+                raise ValueError
+            dish_ids = [_to_id(dish_id) for dish_id in dish_ids]
+        except ValueError:
+            return Response({'error': 'dish_ids должен быть списком целых чисел'}, status=400)
+        try:
+            if event_id is not None:
+                event_id = _to_id(event_id)
+        except ValueError:
+            return Response({'error': 'event_id должен быть целым числом'}, status=400)
 
+        dish_ids = list(dict.fromkeys(dish_ids))
         if not dish_ids:
             return Response({'error': 'Нет данных о блюдах'}, status=400)
 
-        # Получаем блюда
-        dishes = Dish.objects.filter(id__in=dish_ids)
-
-        # Используем pandas для анализа
-        dish_data = []
-        for dish in dishes:
-            # Получаем гостей, которым нравится это блюдо
-            guests = dish.favorited_by.all()
-            dish_data.append({
-                'dish_id': dish.id,
-                'name': dish.name,
-                'guest_count': guests.count(),
-                'guests': [guest.name for guest in guests]
-            })
-
-        df = pd.DataFrame(dish_data)
-
-        if not df.empty:
-            # Сортируем по количеству гостей
-            df = df.sort_values('guest_count', ascending=False)
-
-            # Находим общих гостей
-            all_guests = []
-            for guests_list in df['guests']:
-                all_guests.extend(guests_list)
-
-            common_guests = []
-            guest_counts = pd.Series(all_guests).value_counts()
-            for guest, count in guest_counts.items():
-                if count > 1:  # Гость встречается более чем в одном списке
-                    common_guests.append({
-                        'name': guest,
-                        'common_dishes_count': count
-                    })
+        return Response(_dish_intersections(dish_ids, event_id))
 
+    @action(detail=False, methods=['get'])
+    def similar(self, request):
+        """Блюда, которые нравятся вместе с указанными (dish_ids через запятую, limit)"""
+        try:
+            dish_ids = [int(dish_id) for dish_id in request.query_params.get('dish_ids', '').split(',') if dish_id.strip()]
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'Идентификаторы и limit должны быть числами'}, status=400)
+
+        if not dish_ids:
+            return Response({'error': 'Нет данных о блюдах'}, status=400)
+
+        # Соседи и названия берутся из индексов процесса, без запросов к базе
+        catalog = get_catalog()
+        neighbors = get_similarity_index().similar(
+            dish_ids,
+            limit=min(max(limit, 1), TOP_NEIGHBORS),
+            allowed=catalog.index
+        )
         return Response({
-            'dishes': df.to_dict('records'),
-            'common_guests': common_guests if 'common_guests' in locals() else []
+            'dish_ids': dish_ids,
+            'similar': [
+                {
+                    'dish_id': dish_id,
+                    'name': str(catalog.names[catalog.index[dish_id]]),
+                    'score': round(score, 4),
+                }
+                for dish_id, score in neighbors
+            ],
         })
 
 class IngredientViewSet(viewsets.ModelViewSet):
@@ -124,7 +237,7 @@ class EventViewSet(viewsets.ModelViewSet):
 
         try:
             shopping_list = event.shopping_list
-            items = shopping_list.items.all()
+            items = shopping_list.items.select_related('ingredient')
 
             # Группируем по категориям
             categories = {}
@@ -152,6 +265,34 @@ class EventViewSet(viewsets.ModelViewSet):
 
         return Response(response_data)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """Пакетная выгрузка списков покупок за период (date_from, date_to, file_format)"""
+        # Параметр format занят DRF под выбор рендерера
+        fmt = request.query_params.get('file_format', 'pdf')
+        if fmt not in EXPORT_FORMATS:
+            return Response({'error': f'Формат должен быть одним из: {", ".join(EXPORT_FORMATS)}'}, status=400)
+
+        try:
+            events = list(events_in_range(
+                HolidayEvent.objects.all(),
+                request.query_params.get('date_from'),
+                request.query_params.get('date_to')
+            ))
+        except ValidationError:
+            return Response({'error': 'Даты должны быть в формате ГГГГ-ММ-ДД'}, status=400)
+        if not events:
+            return Response({'error': 'За указанный период мероприятий нет'}, status=404)
+
+        def progress(done, total, name):
+            logger.info('Выгрузка списков покупок: %s/%s %s', done, total, name)
+
+        content_type, filename, content = export_events(events, fmt, progress)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Export-Events'] = str(len(events))
+        return response
+
 class GuestViewSet(viewsets.ModelViewSet):
     """API для гостей"""
     queryset = Guest.objects.all().prefetch_related('favorite_dishes')
@@ -0,0 +1,143 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import ShoppingList
+from .utils import render_shopping_list_pdf
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _artifacts_dir(shopping_list_id):
+    return os.path.join(str(settings.MEDIA_ROOT), 'shopping_lists', str(shopping_list_id))
+
+
+def _get_executor():
+    """Поток фоновой перерисовки создается при первой задаче, а не при импорте"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shopping-pdf')
+        return _executor
+
+
+def remove_shopping_pdfs(shopping_list_id):
+    """
+    Удаление всех PDF списка покупок
+
+    Вызывается после удаления списка: иначе файлы остались бы на диске,
+    а новый список с тем же id получил бы чужой каталог.
+    """
+    shutil.rmtree(_artifacts_dir(shopping_list_id), ignore_errors=True)
+
+
+def shopping_list_version(shopping_list):
+    """
+    Версия списка покупок: хэш всего, что попадает в PDF
+
+    Позиции и данные ингредиентов читаются одним запросом, поэтому версия
+    меняется и при пересчете списка, и при отметке купленных продуктов.
+    """
+    event = shopping_list.event
+    rows = list(
+        shopping_list.items
+        .order_by('id')
+        .values_list('id', 'ingredient__name', 'ingredient__category', 'ingredient__unit',
+                      'quantity_needed', 'estimated_cost', 'purchased')
+    )
+    digest = hashlib.sha1()
+    for part in (event.name, event.event_date, event.number_of_guests, shopping_list.total_cost, rows):
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'|')
+    return digest.hexdigest()[:16]
+
+
+def shopping_pdf_path(shopping_list, version=None):
+    """Путь к PDF текущей (или указанной) версии списка покупок"""
+    version = version or shopping_list_version(shopping_list)
+    return os.path.join(_artifacts_dir(shopping_list.id), f'{version}.pdf')
+
+
+def build_shopping_pdf(shopping_list):
+    """
+    PDF текущей версии списка покупок на диске
+
+    Если файл уже есть, он возвращается без рендеринга. Новый файл пишется
+    атомарно, файлы прежних версий удаляются.
+
+    Returns:
+        Путь к файлу
+    """
+    path = shopping_pdf_path(shopping_list)
+    if os.path.exists(path):
+        return path
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    content = render_shopping_list_pdf(shopping_list.event, shopping_list)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+    for name in os.listdir(directory):
+        if name != os.path.basename(path) and name.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def open_shopping_pdf(shopping_list):
+    """
+    Открытый на чтение PDF текущей версии списка покупок
+
+    Параллельная перерисовка может удалить файл между build_shopping_pdf
+    и open(): тогда файл строится еще раз, а если и он уже удален —
+    PDF рендерится в память.
+    """
+    for _ in range(2):
+        try:
+            return open(build_shopping_pdf(shopping_list), 'rb')
+        except FileNotFoundError:
+            pass
+    return io.BytesIO(render_shopping_list_pdf(shopping_list.event, shopping_list))
+
+
+def _regenerate(shopping_list_id):
+    # Изменения во время рендеринга поставят новую задачу
+    with _lock:
+        _pending.discard(shopping_list_id)
+    close_old_connections()
+    try:
+        shopping_list = ShoppingList.objects.select_related('event').filter(id=shopping_list_id).first()
+        if shopping_list is not None:
+            build_shopping_pdf(shopping_list)
+    finally:
+        connection.close()
+
+
+def schedule_shopping_pdf(shopping_list_id):
+    """
+    Фоновая перерисовка PDF после изменения списка покупок
+
+    Перерисовываются только списки, для которых PDF уже скачивали.
+    Повторные вызовы до начала работы объединяются в одну задачу.
+    """
+    if not os.path.isdir(_artifacts_dir(shopping_list_id)):
+        return
+    with _lock:
+        if shopping_list_id in _pending:
+            return
+        _pending.add(shopping_list_id)
+    _get_executor().submit(_regenerate, shopping_list_id)
@@ -0,0 +1,110 @@
+import re
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import json_script
+
+# Наибольший символ Unicode: prefix + MAX_CHAR ограничивает диапазон ключей
+MAX_CHAR = chr(0x10FFFF)
+
+# До какого размера каталог встраивается в страницу целиком
+DISH_OPTIONS_INLINE_LIMIT = 1000
+
+DISH_OPTIONS_ELEMENT_ID = 'dish-options'
+
+
+def normalize(text):
+    """Ключ для поиска: нижний регистр (в том числе кириллица), «ё» как «е», одиночные пробелы"""
+    return re.sub(r'\s+', ' ', str(text or '')).strip().casefold().replace('ё', 'е')
+
+
+class PrefixIndex:
+    """
+    Индекс подсказок по началу названия блюда
+
+    Два отсортированных массива ключей: полные нормализованные названия
+    и хвосты названий, начинающиеся со второго и следующих слов. Поиск —
+    два bisect по каждому массиву; сначала выдаются совпадения с начала
+    названия, затем по началу любого слова.
+    """
+
+    def __init__(self, names):
+        full = []
+        words = []
+        for position, name in enumerate(names):
+            key = normalize(name)
+            full.append((key, position))
+            for match in re.finditer(r' (?=\S)', key):
+                words.append((key[match.end():], position))
+        full.sort()
+        words.sort()
+        self._keys = ([key for key, _ in full], [key for key, _ in words])
+        self._positions = ([position for _, position in full], [position for _, position in words])
+
+    def __len__(self):
+        return len(self._keys[0])
+
+    def search(self, prefix, limit=10, mask=None):
+        """
+        Номера блюд, название или слово названия которых начинается с prefix
+
+        Args:
+            prefix: начало названия (пустая строка — все блюда по алфавиту)
+            limit: максимальное количество результатов
+            mask: необязательная булева маска допустимых блюд (например, по типу)
+
+        Returns:
+            Список номеров в порядке выдачи
+        """
+        prefix = normalize(prefix)
+        sources = zip(self._keys, self._positions)
+        if not prefix:
+            # Без префикса — все блюда по алфавиту названий
+            sources = [(self._keys[0], self._positions[0])]
+
+        found = []
+        seen = set()
+        for keys, positions in sources:
+            start = bisect_left(keys, prefix)
+            stop = bisect_left(keys, prefix + MAX_CHAR, start)
+            for i in range(start, stop):
+                position = positions[i]
+                if position in seen or (mask is not None and not mask[position]):
+                    continue
+                seen.add(position)
+                found.append(position)
+                if len(found) >= limit:
+                    return found
+        return found
+
+
+def dish_options_script(catalog):
+    """
+    Варианты блюд для выбора одним блоком <script type="application/json">
+
+    Блок рендерится один раз на поколение снимка каталога и хранится
+    в кэше ограниченное время, чтобы записи прошлых поколений истекали;
+    все поля выбора на странице ищут по нему без запросов.
+    Для большого каталога возвращается пустая строка — тогда подсказки
+    запрашиваются у dish_autocomplete.
+    """
+    if len(catalog) > DISH_OPTIONS_INLINE_LIMIT:
+        return ''
+
+    key = f'menu:dish_options:{catalog.generation}'
+    script = cache.get(key)
+    if script is None:
+        positions = catalog.prefix_index.search('', len(catalog))
+        script = json_script([
+            {
+                'id': int(catalog.ids[position]),
+                'name': catalog.names[position],
+                'type_id': int(catalog.type_ids[position]),
+                'type': catalog.type_names[position] or 'Разное',
+                'cooking_time': int(catalog.cooking_times[position]),
+            }
+            for position in positions
+        ], DISH_OPTIONS_ELEMENT_ID)
+        cache.set(key, script, settings.CATALOG_CACHE_TIMEOUT)
+    return script
@@ -0,0 +1,266 @@
+import csv
+import io
+import multiprocessing
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.utils.text import slugify
+
+from .costs import calculate_costs
+from .models import Dish, DishIngredient, EventDishVote, Ingredient, ShoppingItem, ShoppingList
+from .shopping import to_money
+from .utils import render_shopping_list_pdf, write_shopping_list_excel
+
+EXPORT_FORMATS = ('pdf', 'xlsx', 'csv')
+
+CONTENT_TYPES = {
+    'zip': 'application/zip',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CSV_HEADERS = [
+    'Мероприятие', 'Дата', 'Гостей', 'Категория', 'Продукт',
+    'Количество', 'Единица', 'Примерная стоимость', 'Блюда',
+]
+
+
+def load_shopping_lists(events, limit=5, fallback=3):
+    """
+    Списки покупок для набора мероприятий из общей загрузки каталога
+
+    Если у мероприятия есть сохраненный список покупок, выгружается он:
+    с отметками purchased и ценами на момент сохранения. Для остальных
+    голоса, рецепты выбранных блюд и цены ингредиентов читаются по одному
+    разу, и список считается в памяти так же, как build_shopping_list,
+    без сохранения в базе.
+
+    Yields:
+        (event, shopping_list, items, dishes_by_ingredient) — позиции
+        упорядочены по категориям
+    """
+    events = list(events)
+    if not events:
+        return
+
+    dishes_by_event = defaultdict(list)
+    votes = (
+        EventDishVote.objects
+        .filter(event_id__in=[event.id for event in events], votes__gt=0)
+        .order_by('event_id', '-votes', 'dish_id')
+        .values_list('event_id', 'dish_id')
+    )
+    for event_id, dish_id in votes:
+        if len(dishes_by_event[event_id]) < limit:
+            dishes_by_event[event_id].append(dish_id)
+
+    default_dishes = list(Dish.objects.values_list('id', flat=True)[:fallback])
+    dish_ids = set(default_dishes).union(*dishes_by_event.values())
+
+    recipes = defaultdict(list)
+    for dish_id, ingredient_id, quantity in (
+            DishIngredient.objects
+            .filter(dish_id__in=dish_ids)
+            .values_list('dish_id', 'ingredient_id', 'quantity')):
+        recipes[dish_id].append((ingredient_id, quantity))
+    dish_names = dict(Dish.objects.filter(id__in=dish_ids).values_list('id', 'name'))
+    ingredients = Ingredient.objects.in_bulk(
+        {ingredient_id for rows in recipes.values() for ingredient_id, _ in rows}
+    )
+
+    saved_lists = {
+        shopping_list.event_id: shopping_list
+        for shopping_list in ShoppingList.objects.filter(event_id__in=[event.id for event in events])
+    }
+    saved_items = defaultdict(list)
+    for item in (
+            ShoppingItem.objects
+            .filter(shopping_list_id__in=[shopping_list.id for shopping_list in saved_lists.values()])
+            .select_related('ingredient')
+            .order_by('ingredient__category', 'ingredient__name', 'id')):
+        saved_items[item.shopping_list_id].append(item)
+
+    for event in events:
+        quantities = defaultdict(float)
+        dishes_by_ingredient = defaultdict(list)
+        for dish_id in dishes_by_event.get(event.id) or default_dishes:
+            for ingredient_id, quantity in recipes[dish_id]:
+                quantities[ingredient_id] += quantity
+                dishes_by_ingredient[ingredient_id].append(dish_names[dish_id])
+
+        shopping_list = saved_lists.get(event.id)
+        if shopping_list is not None:
+            shopping_list.event = event
+            yield event, shopping_list, saved_items[shopping_list.id], dishes_by_ingredient
+            continue
+
+        rows = [ingredients[ingredient_id] for ingredient_id in quantities]
+        amounts = [quantities[ingredient.id] * event.number_of_guests for ingredient in rows]
+        costs = calculate_costs(
+            amounts,
+            [ingredient.unit for ingredient in rows],
+            [ingredient.average_price for ingredient in rows]
+        )
+
+        shopping_list = ShoppingList(event=event, total_cost=to_money(sum(costs)))
+        items = [
+            ShoppingItem(
+                shopping_list=shopping_list,
+                ingredient=ingredient,
+                quantity_needed=amount,
+                estimated_cost=to_money(cost)
+            )
+            for ingredient, amount, cost in zip(rows, amounts, costs)
+        ]
+        items.sort(key=lambda item: (item.ingredient.category or '', item.ingredient.name))
+        yield event, shopping_list, items, dishes_by_ingredient
+
+
+def _export_filename(event, fmt):
+    name = slugify(event.name, allow_unicode=True) or 'event'
+    return f'{event.event_date}_{event.id}_{name}.{fmt}'
+
+
+def render_event_file(fmt, event, shopping_list, items):
+    """Файл одного мероприятия: (имя в архиве, содержимое)"""
+    if fmt == 'pdf':
+        content = render_shopping_list_pdf(event, shopping_list, items)
+    else:
+        output = io.BytesIO()
+        write_shopping_list_excel(event, shopping_list, items, output)
+        content = output.getvalue()
+    return _export_filename(event, fmt), content
+
+
+def _render_job(job):
+    return render_event_file(*job)
+
+
+class _StreamBuffer:
+    """Файловый объект, из которого записанные байты забираются порциями"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _stream_zip(files):
+    """ZIP-архив потоком: каждый файл отдается сразу после сжатия"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def _render_files(fmt, lists, progress, workers=1):
+    """
+    Рендер файлов мероприятий с сохранением порядка
+
+    При workers > 1 файлы рендерятся в пуле процессов, который создается
+    на одну выгрузку. Это нужно только команде export_events: в обработчике
+    запроса каждый запрос запускал бы свои процессы Django.
+    """
+    jobs = [(fmt, event, shopping_list, items) for event, shopping_list, items, _ in lists]
+    total = len(jobs)
+    workers = min(workers, total)
+
+    if workers <= 1:
+        results = map(_render_job, jobs)
+        executor = None
+    else:
+        # Инициализатор должен импортироваться до настройки Django,
+        # поэтому это сам django.setup (DJANGO_SETTINGS_MODULE наследуется)
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'holiday_menu.settings')
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
+        results = executor.map(_render_job, jobs)
+
+    try:
+        for done, (name, content) in enumerate(results, 1):
+            if progress:
+                progress(done, total, name)
+            yield name, content
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _stream_csv(lists, progress):
+    """Сводный CSV по всем мероприятиям"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл кириллицу без настройки кодировки
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADERS)
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    total = len(lists)
+    for done, (event, _, items, dishes_by_ingredient) in enumerate(lists, 1):
+        for item in items:
+            writer.writerow([
+                event.name,
+                event.event_date,
+                event.number_of_guests,
+                item.ingredient.category or 'Другое',
+                item.ingredient.name,
+                round(item.quantity_needed, 3),
+                item.ingredient.get_unit_display(),
+                item.estimated_cost,
+                ', '.join(dishes_by_ingredient[item.ingredient.id]),
+            ])
+        if progress:
+            progress(done, total, event.name)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_events(events, fmt='pdf', progress=None, workers=1):
+    """
+    Пакетная выгрузка списков покупок нескольких мероприятий
+
+    Args:
+        events: мероприятия (queryset или список)
+        fmt: 'pdf' или 'xlsx' — ZIP с файлом на мероприятие, 'csv' — сводная таблица
+        progress: функция progress(готово, всего, имя) для отчета о ходе работы
+        workers: сколько процессов рендерят PDF/XLSX (1 — в текущем процессе)
+
+    Returns:
+        (content_type, имя файла, итератор байтов)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {fmt}')
+
+    lists = list(load_shopping_lists(events))
+    if fmt == 'csv':
+        return CONTENT_TYPES['csv'], 'shopping_lists.csv', _stream_csv(lists, progress)
+    return CONTENT_TYPES['zip'], f'shopping_lists_{fmt}.zip', _stream_zip(_render_files(fmt, lists, progress, workers))
+
+
+def events_in_range(queryset, date_from=None, date_to=None):
+    """Фильтр мероприятий по HolidayEvent.event_date (границы включаются)"""
+    if date_from:
+        queryset = queryset.filter(event_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(event_date__lte=date_to)
+    return queryset.order_by('event_date', 'id')
@@ -0,0 +1,80 @@
+from django.core.cache import caches
+
+from .generations import bump_generations_on_commit, get_generations
+
+CATALOG_GENERATION_KEY = 'menu:catalog'
+
+# Результаты расчетов хранятся в отдельном кэше с ограниченным числом
+# записей: LocMemCache при переполнении вытесняет давно не читавшиеся
+RESULTS_CACHE = 'results'
+
+
+def _event_generation_key(event_id):
+    return f'menu:event:{event_id}'
+
+
+def catalog_generation():
+    """Поколение каталога: меняется при любом изменении блюд, рецептов и цен"""
+    return get_generations([CATALOG_GENERATION_KEY])[CATALOG_GENERATION_KEY][0]
+
+
+def bump_catalog_generation():
+    """Сброс версий всех мероприятий после изменения каталога"""
+    bump_generations_on_commit([CATALOG_GENERATION_KEY])
+
+
+def event_version_info(event):
+    """
+    Версия входных данных мероприятия и время ее появления
+
+    Версия складывается из поколения каталога (названия, рецепты и цены
+    блюд) и поколения мероприятия (гости, их любимые блюда, количество
+    гостей). Оба поколения хранятся в базе и меняются сигналами, поэтому
+    все воркеры видят новую версию сразу после записи. Читается одним
+    запросом.
+
+    Returns:
+        Кортеж (версия, unix-время последнего изменения)
+    """
+    event_key = _event_generation_key(event.id)
+    generations = get_generations([CATALOG_GENERATION_KEY, event_key])
+    catalog, catalog_time = generations[CATALOG_GENERATION_KEY]
+    generation, event_time = generations[event_key]
+
+    changed = max(time for time in (catalog_time, event_time, event.updated_at) if time is not None)
+    return f'{catalog}-{generation}', int(changed.timestamp())
+
+
+def event_input_version(event):
+    """Версия входных данных мероприятия"""
+    return event_version_info(event)[0]
+
+
+def invalidate_events(event_ids):
+    """Новое поколение мероприятий: следующий запрос пересчитает результаты"""
+    bump_generations_on_commit(_event_generation_key(event_id) for event_id in set(event_ids))
+
+
+def get_event_result(event, kind, compute):
+    """
+    Результат расчета для мероприятия из кэша или вызовом compute()
+
+    Ключ содержит версию входных данных, поэтому устаревший результат
+    не может быть прочитан; старые записи вытесняются кэшем по LRU
+    и истекают через RESULT_CACHE_TIMEOUT.
+
+    Args:
+        event: мероприятие
+        kind: вид результата ('menu', 'shopping', 'debug')
+        compute: функция без аргументов, считающая результат
+
+    Returns:
+        Результат compute() для текущей версии входных данных
+    """
+    results = caches[RESULTS_CACHE]
+    key = f'menu:result:{kind}:{event.id}:{event_input_version(event)}'
+    result = results.get(key)
+    if result is None:
+        result = compute()
+        results.set(key, result)
+    return result
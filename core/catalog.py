@@ -0,0 +1,124 @@
+import threading
+from typing import TYPE_CHECKING
+
+from django.db.models import Count
+
+from .generations import bump_generations_on_commit, get_generation
+from .models import Dish
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from .autocomplete import PrefixIndex
+
+SNAPSHOT_GENERATION_KEY = 'menu:catalog:snapshot'
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+class CatalogSnapshot:
+    """
+    Колоночный снимок каталога блюд
+
+    Массивы NumPy одинаковой длины, строки упорядочены по id блюда.
+    Снимок неизменяем и разделяется всеми планировщиками процесса.
+    Популярность в снимок не входит: она меняется при каждом изменении
+    избранного и читается из базы там, где нужна.
+    """
+
+    def __init__(self, rows, generation=None):
+        import numpy as np
+
+        self.generation = generation
+        columns = list(zip(*rows)) or [()] * 7
+        self.ids = np.asarray(columns[0], dtype=np.int64)
+        self.names = np.asarray(columns[1], dtype=object)
+        self.type_ids = np.asarray([type_id or 0 for type_id in columns[2]], dtype=np.int64)
+        self.type_names = np.asarray([name or '' for name in columns[3]], dtype=object)
+        self.cooking_times = np.asarray(columns[4], dtype=np.int64)
+        self.difficulties = np.asarray(columns[5], dtype=object)
+        self.ingredient_counts = np.asarray(columns[6], dtype=np.int64)
+        self.index = {dish_id: i for i, dish_id in enumerate(self.ids.tolist())}
+        self._dataframe = None
+        self._prefix_index = None
+
+    @classmethod
+    def load(cls, generation=None):
+        """Снимок каталога одним запросом с подсчетом ингредиентов"""
+        rows = (
+            Dish.objects
+            .annotate(ingredients_count=Count('ingredients_list'))
+            .order_by('id')
+            .values_list('id', 'name', 'dish_type_id', 'dish_type__name', 'cooking_time',
+                         'difficulty', 'ingredients_count')
+        )
+        return cls(list(rows), generation)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, dish_ids):
+        """Номера строк снимка для указанных блюд (неизвестные пропускаются)"""
+        import numpy as np
+
+        return np.asarray(sorted(self.index[dish_id] for dish_id in dish_ids if dish_id in self.index), dtype=np.int64)
+
+    @property
+    def dataframe(self) -> 'pd.DataFrame':
+        """Каталог в виде DataFrame (строится один раз на снимок)"""
+        if self._dataframe is None:
+            import pandas as pd
+
+            self._dataframe = pd.DataFrame({
+                'dish_id': self.ids,
+                'name': self.names,
+                'dish_type': self.type_names,
+                'cooking_time': self.cooking_times,
+                'difficulty': self.difficulties,
+                'ingredients_count': self.ingredient_counts,
+            })
+        return self._dataframe
+
+    @property
+    def prefix_index(self) -> 'PrefixIndex':
+        """Индекс подсказок по названиям (строится один раз на снимок)"""
+        if self._prefix_index is None:
+            from .autocomplete import PrefixIndex
+
+            self._prefix_index = PrefixIndex(self.names.tolist())
+        return self._prefix_index
+
+
+def snapshot_generation():
+    """Поколение снимка каталога: меняется при изменении блюд, типов и рецептов"""
+    return get_generation(SNAPSHOT_GENERATION_KEY)
+
+
+def invalidate_catalog_snapshot():
+    """
+    Сброс снимка каталога во всех процессах
+
+    Поколение хранится в базе и меняется после фиксации транзакции,
+    поэтому новый снимок загрузят все воркеры, а не только текущий.
+    """
+    bump_generations_on_commit([SNAPSHOT_GENERATION_KEY])
+
+
+def get_catalog():
+    """
+    Снимок каталога текущего процесса
+
+    Пока поколение в базе не изменилось, возвращается уже загруженный
+    снимок; проверка поколения — один запрос по первичному ключу.
+    """
+    global _snapshot
+    generation = snapshot_generation()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.generation == generation:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.generation != generation:
+            _snapshot = CatalogSnapshot.load(generation)
+        return _snapshot
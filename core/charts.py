@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def menu_chart_data(selected_dishes):
+    """
+    Данные для графиков меню в виде простых значений
+
+    Из блюд берется только то, что попадает на график, поэтому данные
+    можно передать в другой процесс и использовать как ключ кэша.
+    """
+    dishes = [dish_data['dish'] for dish_data in selected_dishes]
+    return {
+        'types': sorted(Counter(
+            dish.dish_type.name if dish.dish_type else 'Другое' for dish in dishes
+        ).items()),
+        'difficulties': sorted(Counter(dish.difficulty for dish in dishes).items()),
+        'cooking_times': [dish.cooking_time for dish in dishes],
+        'popularity': [float(dish.popularity_score) for dish in dishes],
+        'names': [dish.name[:15] + '...' for dish in dishes],
+    }
+
+
+def chart_key(data):
+    """Ключ кэша графика: хэш входных данных"""
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def render_menu_analysis(data):
+    """
+    Рисует сводный график меню и возвращает PNG в base64
+
+    Используется объектный API Figure без pyplot: у каждого вызова своя
+    фигура, глобального состояния нет.
+    """
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots(2, 2)
+
+    # 1. График распределения типов блюд
+    type_labels = [label for label, _ in data['types']]
+    type_counts = [count for _, count in data['types']]
+    axes[0][0].pie(
+        type_counts,
+        labels=type_labels,
+        autopct='%1.1f%%',
+        colors=colormaps['Pastel1'].colors[:len(type_counts)]
+    )
+    axes[0][0].set_title('Распределение типов блюд')
+
+    # 2. График сложности приготовления
+    difficulty_labels = [label for label, _ in data['difficulties']]
+    difficulty_counts = [count for _, count in data['difficulties']]
+    viridis = colormaps['viridis']
+    axes[0][1].bar(
+        difficulty_labels,
+        difficulty_counts,
+        color=[viridis(i / max(len(difficulty_counts) - 1, 1)) for i in range(len(difficulty_counts))]
+    )
+    axes[0][1].set_title('Сложность приготовления')
+    axes[0][1].set_xlabel('Уровень сложности')
+    axes[0][1].set_ylabel('Количество блюд')
+
+    # 3. График времени приготовления
+    axes[1][0].bar(range(len(data['cooking_times'])), data['cooking_times'])
+    axes[1][0].set_title('Время приготовления по блюдам')
+    axes[1][0].set_xlabel('Блюдо')
+    axes[1][0].set_ylabel('Время (мин)')
+    axes[1][0].set_xticks([])
+
+    # 4. График популярности
+    axes[1][1].barh(data['names'], data['popularity'])
+    axes[1][1].set_title('Популярность блюд')
+    axes[1][1].set_xlabel('Оценка популярности')
+
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def prune_chart_cache(root, max_files, ttl):
+    """
+    Очистка дискового кэша графиков
+
+    Удаляются графики, к которым не обращались дольше ttl секунд, а если
+    файлов все еще больше max_files — самые давние из оставшихся. Время
+    обращения — mtime файла, его обновляет cached_chart.
+    """
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith('.b64'):
+                path = os.path.join(directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    pass
+    files.sort(reverse=True)
+
+    expired = time.time() - ttl
+    for position, (mtime, path) in enumerate(files):
+        if position >= max_files or mtime < expired:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _render_to_file(data, path, max_files, ttl):
+    """Рендер в процессе пула с атомарной записью результата на диск"""
+    image = render_menu_analysis(data)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as tmp:
+        tmp.write(image)
+    os.replace(tmp_path, path)
+    # Очистка идет в процессе пула, а не в обработчике запроса
+    prune_chart_cache(os.path.dirname(directory), max_files, ttl)
+    return image
+
+
+def _chart_path(key):
+    return os.path.join(str(settings.CHART_CACHE_DIR), key[:2], f'{key}.b64')
+
+
+def _get_executor():
+    """
+    Общий пул процессов рендеринга с ограниченным числом воркеров
+
+    Процессы запускаются через spawn: fork многопоточного воркера
+    веб-сервера небезопасен.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.CHART_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            _pending.clear()
+
+
+def cached_chart(data):
+    """Готовый график из дискового кэша или None"""
+    path = _chart_path(chart_key(data))
+    try:
+        with open(path) as cached:
+            image = cached.read()
+        # Используемые графики не вытесняются очисткой кэша
+        os.utime(path)
+        return image
+    except FileNotFoundError:
+        return None
+
+
+def schedule_chart(data):
+    """
+    Ставит рендеринг графика в очередь пула, если его еще нет в кэше
+
+    Повторные запросы того же графика ждут уже запущенную задачу.
+
+    Returns:
+        Future с base64 PNG
+    """
+    key = chart_key(data)
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _get_executor().submit(
+                _render_to_file, data, _chart_path(key),
+                settings.CHART_CACHE_MAX_FILES, settings.CHART_CACHE_TTL
+            )
+            _pending[key] = future
+            future.add_done_callback(lambda _: _pending.pop(key, None))
+    return future
+
+
+def get_menu_chart(selected_dishes, wait=True):
+    """
+    График анализа меню в base64
+
+    Если меню не менялось, отдается сохраненное изображение. Иначе рендер
+    выполняется в пуле процессов; при wait=False функция не ждет его и
+    возвращает None — изображение появится в кэше к следующему запросу.
+    """
+    data = menu_chart_data(selected_dishes)
+    image = cached_chart(data)
+    if image is not None:
+        return image
+
+    try:
+        future = schedule_chart(data)
+        if not wait:
+            return None
+        return future.result(timeout=settings.CHART_RENDER_TIMEOUT)
+    except TimeoutError:
+        return None
+    except BrokenProcessPool:
+        # Воркер упал: следующий запрос создаст новый пул
+        _reset_executor()
+        return None
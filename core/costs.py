@@ -0,0 +1,75 @@
+# Множитель для перевода количества в единицы цены ингредиента:
+# цена указывается за кг, литр или штуку
+UNIT_PRICE_FACTORS = {
+    'g': 0.001,     # цена за кг, количество в граммах
+    'kg': 1.0,      # цена за кг, количество в кг
+    'ml': 0.001,    # цена за литр, количество в мл
+    'l': 1.0,       # цена за литр, количество в литрах
+    'pcs': 1.0,     # цена за штуку
+    'tbsp': 0.015,  # столовая ложка ≈ 15г, цена за кг
+    'tsp': 0.005,   # чайная ложка ≈ 5г, цена за кг
+}
+
+# По умолчанию считаем, что количество в граммах, а цена за кг
+DEFAULT_PRICE_FACTOR = 0.001
+
+# Подписи для отладочного вывода: (единица количества, единица цены)
+UNIT_LABELS = {
+    'g': ('г', 'кг'),
+    'kg': ('кг', 'кг'),
+    'ml': ('мл', 'л'),
+    'l': ('л', 'л'),
+    'pcs': ('шт', 'шт'),
+    'tbsp': ('ст.л.', 'кг'),
+    'tsp': ('ч.л.', 'кг'),
+}
+
+
+def unit_factor(unit):
+    """Множитель перевода количества в единицы цены"""
+    return UNIT_PRICE_FACTORS.get(unit, DEFAULT_PRICE_FACTOR)
+
+
+def calculate_item_cost(quantity, unit, price_per_unit):
+    """Правильный расчет стоимости товара"""
+    if not price_per_unit:
+        return 0
+    return quantity * unit_factor(unit) * float(price_per_unit)
+
+
+def calculate_costs(quantities, units, prices):
+    """
+    Векторный расчет стоимости для массивов позиций за один проход
+
+    Args:
+        quantities: количества
+        units: коды единиц измерения
+        prices: цены за единицу (None считается нулем)
+
+    Returns:
+        numpy-массив стоимостей той же длины
+    """
+    import numpy as np
+
+    quantities = np.asarray(quantities, dtype=float)
+    if not len(quantities):
+        return np.zeros(0)
+
+    # Множители ищем только для уникальных единиц, а не для каждой строки
+    unique_units, inverse = np.unique(np.asarray(units, dtype=object).astype(str), return_inverse=True)
+    factors = np.array([unit_factor(unit) for unit in unique_units])[inverse]
+    prices = np.array([float(price or 0) for price in prices])
+
+    return quantities * factors * prices
+
+
+def describe_calculation(quantity, unit, price_per_unit):
+    """Текстовое пояснение расчета для отладочных страниц"""
+    quantity_label, price_label = UNIT_LABELS.get(unit, (unit, 'кг'))
+    price = float(price_per_unit or 0)
+    factor = unit_factor(unit)
+    cost = calculate_item_cost(quantity, unit, price)
+
+    if factor == 1:
+        return f"{quantity}{quantity_label} × {price}₽/{price_label} = {cost:.2f}₽"
+    return f"({quantity}{quantity_label} × {factor:g}) × {price}₽/{price_label} = {cost:.2f}₽"
@@ -107,4 +107,18 @@ class DishFilterForm(forms.Form):
             'class': 'form-control',
             'placeholder': 'Поиск блюд...'
         })
-    )
\ No newline at end of file
+    )
+
+    tags = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Теги через запятую'
+        })
+    )
+
+    tags_match = forms.ChoiceField(
+        choices=[('any', 'Любой из тегов'), ('all', 'Все теги')],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
@@ -0,0 +1,71 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CacheGeneration
+
+# Поколения хранятся в базе, а не в кэше: кэш по умолчанию локален для
+# процесса, и изменение, сделанное одним воркером, другие бы не увидели.
+# Ключ, который еще ни разу не менялся, имеет поколение 1.
+INITIAL_GENERATION = 1
+
+
+def get_generations(keys):
+    """
+    Текущие поколения по ключам одним запросом
+
+    Returns:
+        {ключ: (поколение, время изменения или None)}
+    """
+    keys = list(keys)
+    found = {
+        key: (value, updated_at)
+        for key, value, updated_at in
+        CacheGeneration.objects.filter(key__in=keys).values_list('key', 'value', 'updated_at')
+    }
+    return {key: found.get(key, (INITIAL_GENERATION, None)) for key in keys}
+
+
+def get_generation(key):
+    """Текущее поколение ключа"""
+    return get_generations([key])[key][0]
+
+
+@transaction.atomic
+def bump_generations(keys):
+    """
+    Увеличение поколений ключей
+
+    Строки блокируются в порядке ключей и увеличиваются одним UPDATE
+    с F-выражением, поэтому параллельные изменения не теряются и каждое
+    получает свое значение.
+
+    Returns:
+        {ключ: новое поколение}
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    CacheGeneration.objects.bulk_create([CacheGeneration(key=key) for key in keys], ignore_conflicts=True)
+    current = dict(
+        CacheGeneration.objects.select_for_update()
+        .filter(key__in=keys)
+        .order_by('key')
+        .values_list('key', 'value')
+    )
+    CacheGeneration.objects.filter(key__in=keys).update(value=F('value') + 1, updated_at=timezone.now())
+    return {key: value + 1 for key, value in current.items()}
+
+
+def bump_generations_on_commit(keys):
+    """
+    Увеличение поколений после фиксации текущей транзакции
+
+    Параллельный запрос не может загрузить под новым поколением данные,
+    которые еще не видны, а откат транзакции не меняет поколений.
+    """
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(partial(bump_generations, keys))
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+# Тяжелые зависимости, которые должны загружаться только при первом использовании
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'seaborn', 'reportlab', 'openpyxl')
+
+_MARKER = '--- import report ---'
+
+_PROBE = f'''
+import importlib, json, sys
+try:
+    import resource
+except ImportError:
+    resource = None
+import django
+django.setup()
+base = set(sys.modules)
+sys.stderr.write({_MARKER!r} + "\\n")
+sys.stderr.flush()
+error = None
+try:
+    importlib.import_module(sys.argv[1])
+except Exception as exc:
+    error = repr(exc)
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+print(json.dumps({{"modules": sorted(set(sys.modules) - base), "error": error, "maxrss": maxrss}}))
+'''
+
+
+def probe_import(module):
+    """
+    Импортирует модуль в отдельном интерпретаторе после django.setup()
+
+    Используется python -X importtime, поэтому время считается только для
+    модулей, загруженных самим импортом, без стоимости запуска Django.
+
+    Returns:
+        Словарь с ключами:
+            modules — новые модули в sys.modules,
+            packages — {пакет верхнего уровня: собственное время, мкс},
+            total_us — суммарное время импорта, мкс,
+            maxrss — пиковый RSS процесса (КБ в Linux),
+            error — текст исключения или None
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'holiday_menu.settings')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE, module],
+        capture_output=True, text=True, env=env, check=False
+    )
+
+    lines = completed.stderr.splitlines()
+    if _MARKER not in lines:
+        raise RuntimeError(completed.stderr.strip() or 'Не удалось запустить Django')
+
+    packages = Counter()
+    for line in lines[lines.index(_MARKER) + 1:]:
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        packages[parts[2].strip().split('.')[0]] += int(parts[0])
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['packages'] = dict(packages)
+    result['total_us'] = sum(packages.values())
+    return result
+
+
+def heavy_modules_loaded(modules):
+    """Тяжелые пакеты из HEAVY_MODULES среди загруженных модулей"""
+    loaded = {name.split('.')[0] for name in modules}
+    return sorted(loaded.intersection(HEAVY_MODULES))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_export import EXPORT_FORMATS, events_in_range, export_events
+from core.models import HolidayEvent
+
+
+class Command(BaseCommand):
+    help = 'Выгружает списки покупок всех мероприятий за период в ZIP (PDF/XLSX) или сводный CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Начало периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--to', dest='date_to', help='Конец периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--format', dest='fmt', choices=EXPORT_FORMATS, default='pdf')
+        parser.add_argument('--output', help='Путь к файлу результата')
+
+    def handle(self, *args, **options):
+        try:
+            events = list(events_in_range(HolidayEvent.objects.all(), options['date_from'], options['date_to']))
+        except ValidationError as exc:
+            raise CommandError(f'Некорректный период: {exc}')
+        if not events:
+            raise CommandError('За указанный период мероприятий нет')
+
+        def progress(done, total, name):
+            self.stdout.write(f'[{done}/{total}] {name}')
+
+        _, filename, content = export_events(events, options['fmt'], progress, settings.EXPORT_WORKERS)
+        output = options['output'] or filename
+        with open(output, 'wb') as result:
+            for chunk in content:
+                result.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Выгружено мероприятий: {len(events)} → {output}'))
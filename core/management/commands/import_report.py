@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.importtime import heavy_modules_loaded, probe_import
+
+DEFAULT_MODULES = ['core.views', 'core.menu_logic', 'core.utils', 'api.views']
+
+
+class Command(BaseCommand):
+    help = 'Показывает время импорта модулей и загружаемые ими тяжелые зависимости'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', help='Модули для проверки')
+        parser.add_argument('--limit', type=int, default=10, help='Сколько самых дорогих пакетов показать')
+
+    def handle(self, *args, **options):
+        for module in options['modules'] or DEFAULT_MODULES:
+            report = probe_import(module)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{module}: {report['total_us'] / 1000:.1f} мс"
+                + (f", пиковый RSS {report['maxrss'] / 1024:.1f} МБ" if report['maxrss'] else '')
+            ))
+            if report['error']:
+                self.stdout.write(self.style.ERROR(f"  ошибка импорта: {report['error']}"))
+
+            heavy = heavy_modules_loaded(report['modules'])
+            if heavy:
+                self.stdout.write(self.style.WARNING(f"  тяжелые зависимости: {', '.join(heavy)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS('  тяжелые зависимости не загружаются'))
+
+            costs = sorted(report['packages'].items(), key=lambda item: item[1], reverse=True)
+            for package, self_us in costs[:options['limit']]:
+                self.stdout.write(f'  {self_us / 1000:8.1f} мс  {package}')
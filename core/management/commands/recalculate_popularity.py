@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.popularity import recalculate_popularity
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает популярность блюд по любимым блюдам гостей'
+
+    def handle(self, *args, **options):
+        updated = recalculate_popularity()
+        self.stdout.write(self.style.SUCCESS(f'✅ Популярность пересчитана для {updated} блюд'))
@@ -222,7 +222,6 @@ class Command(BaseCommand):
                     'cooking_time': dish_data['cooking_time'],
                     'difficulty': dish_data['difficulty'],
                     'recipe': dish_data['recipe'],
-                    'popularity_score': 8.0,
                 }
             )
             
@@ -1,37 +1,151 @@
-import pandas as pd
-import numpy as np
-from collections import Counter
-from typing import List, Dict, Tuple
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
-import base64
+from typing import TYPE_CHECKING, List, Dict, Tuple
 from django.db.models import Count, Q
 
+from .catalog import get_catalog
+from .charts import get_menu_chart
+from .costs import calculate_costs
+from .menu_optimizer import coverage_menu, menu_scores, optimize_menu
+from .models import Dish, Guest
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+class PreferenceMatrix:
+    """
+    Разреженная матрица предпочтений гости × блюда в формате CSR
+
+    Строки — гости, столбцы — блюда. Хранятся только ненулевые элементы:
+    indptr[i]:indptr[i + 1] задает в indices столбцы блюд гостя i.
+    """
+
+    def __init__(self, guest_ids, dish_ids, pairs):
+        import numpy as np
+
+        self.guest_ids = np.asarray(guest_ids, dtype=np.int64)
+        self.dish_ids = np.asarray(dish_ids, dtype=np.int64)
+        self.guest_index = {guest_id: i for i, guest_id in enumerate(self.guest_ids.tolist())}
+        self.dish_index = {dish_id: j for j, dish_id in enumerate(self.dish_ids.tolist())}
+
+        rows = []
+        cols = []
+        for guest_id, dish_id in pairs:
+            row = self.guest_index.get(guest_id)
+            col = self.dish_index.get(dish_id)
+            if row is not None and col is not None:
+                rows.append(row)
+                cols.append(col)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order]
+        self._rows = rows[order]
+        self.indptr = np.zeros(len(self.guest_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._rows, minlength=len(self.guest_ids)), out=self.indptr[1:])
+
+    @classmethod
+    def from_guests(cls, guest_ids, dish_ids):
+        """Загрузка предпочтений одним запросом к промежуточной таблице"""
+        pairs = (
+            Guest.favorite_dishes.through.objects
+            .filter(guest_id__in=list(guest_ids))
+            .values_list('guest_id', 'dish_id')
+        )
+        return cls(guest_ids, dish_ids, pairs)
+
+    @property
+    def shape(self):
+        return len(self.guest_ids), len(self.dish_ids)
+
+    def dish_counts(self) -> 'np.ndarray':
+        """Количество гостей по каждому блюду (суммы по столбцам)"""
+        import numpy as np
+
+        return np.bincount(self.indices, minlength=len(self.dish_ids))
+
+    def guests_by_dish(self, columns) -> Dict[int, 'np.ndarray']:
+        """Индексы гостей для указанных столбцов-блюд"""
+        import numpy as np
+
+        columns = np.asarray(columns, dtype=np.int64)
+        mask = np.isin(self.indices, columns)
+        cols = self.indices[mask]
+        rows = self._rows[mask]
+        order = np.argsort(cols, kind='stable')
+        cols, rows = cols[order], rows[order]
+        bounds = np.flatnonzero(np.diff(cols)) + 1
+        return {
+            int(group_cols[0]): group_rows
+            for group_cols, group_rows in zip(np.split(cols, bounds), np.split(rows, bounds))
+            if len(group_cols)
+        }
+
+    def guest_bitsets(self, columns) -> Dict[int, int]:
+        """Гости указанных столбцов-блюд в виде битовых масок (бит i — гость i)"""
+        import numpy as np
+
+        bitsets = {}
+        for col, rows in self.guests_by_dish(columns).items():
+            mask = np.zeros(len(self.guest_ids), dtype=bool)
+            mask[rows] = True
+            bitsets[col] = int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+        return bitsets
+
+    def guest_counts(self) -> 'np.ndarray':
+        """Количество блюд по каждому гостю (суммы по строкам)"""
+        import numpy as np
+
+        return np.diff(self.indptr)
+
+    def co_occurrence(self) -> 'np.ndarray':
+        """
+        Матрица совместной встречаемости блюдо × блюдо
+
+        Элемент [i, j] — число гостей, которым нравятся оба блюда,
+        на диагонали — число гостей блюда. Считается как Mᵀ·M по матрице
+        инцидентности, поэтому столбцов должно быть немного.
+        """
+        import numpy as np
+
+        incidence = np.zeros(self.shape, dtype=np.int64)
+        incidence[self._rows, self.indices] = 1
+        return incidence.T @ incidence
+
+
 class MenuPlanner:
     """Класс для анализа предпочтений и составления меню"""
 
-    def __init__(self, guests, all_dishes):
-        self.guests = guests
-        self.all_dishes = all_dishes
-        self.dishes_df = self._create_dishes_dataframe()
-
-    def _create_dishes_dataframe(self) -> pd.DataFrame:
-        """Создание DataFrame со всеми блюдами"""
-        dishes_data = []
-        for dish in self.all_dishes:
-            dishes_data.append({
-                'dish_id': dish.id,
-                'name': dish.name,
-                'dish_type': dish.dish_type.name if dish.dish_type else '',
-                'cooking_time': dish.cooking_time,
-                'difficulty': dish.difficulty,
-                'popularity': dish.popularity_score,
-                'ingredients_count': dish.ingredients_list.count()
-            })
-        return pd.DataFrame(dishes_data)
+    def __init__(self, guests, all_dishes=None):
+        self.guests = list(guests)
+        self.all_dishes = all_dishes if all_dishes is not None else Dish.objects.all()
+        self.catalog = get_catalog()
+        if all_dishes is None:
+            # Весь каталог: снимок процесса используется без запросов
+            self.dishes_df = self.catalog.dataframe
+            dish_ids = self.catalog.ids
+        else:
+            if hasattr(all_dishes, 'values_list'):
+                ids = all_dishes.values_list('id', flat=True)
+            else:
+                ids = [dish.id for dish in all_dishes]
+            positions = self.catalog.positions(ids)
+            self.dishes_df = self.catalog.dataframe.iloc[positions].reset_index(drop=True)
+            dish_ids = self.catalog.ids[positions]
+        self._dishes_by_id = {}
+        self.preferences = PreferenceMatrix.from_guests(
+            [guest.id for guest in self.guests],
+            dish_ids
+        )
 
-    def find_dish_intersections(self, min_common: int = 2) -> pd.DataFrame:
+    def _get_dishes(self, dish_ids) -> Dict[int, Dish]:
+        """Объекты блюд по id: загружаются только для блюд, попавших в меню"""
+        missing = [dish_id for dish_id in dish_ids if dish_id not in self._dishes_by_id]
+        if missing:
+            self._dishes_by_id.update(Dish.objects.select_related('dish_type').in_bulk(missing))
+        return {dish_id: self._dishes_by_id[dish_id] for dish_id in dish_ids if dish_id in self._dishes_by_id}
+
+    def find_dish_intersections(self, min_common: int = 2) -> 'pd.DataFrame':
         """
         Находит блюда, которые нравятся нескольким гостям
 
@@ -41,54 +155,47 @@ class MenuPlanner:
         Returns:
             DataFrame с блюдами и количеством гостей, которым они нравятся
         """
-        dish_guests_map = {}
-
-        # Собираем информацию о том, какие блюда нравятся каким гостям
-        for guest in self.guests:
-            for dish in guest.favorite_dishes.all():
-                if dish.id not in dish_guests_map:
-                    dish_guests_map[dish.id] = {
-                        'dish': dish,
-                        'guest_count': 0,
-                        'guests': []
-                    }
-                dish_guests_map[dish.id]['guest_count'] += 1
-                dish_guests_map[dish.id]['guests'].append(guest.name)
-
-        # Создаем DataFrame
-        intersections_data = []
-        for dish_id, data in dish_guests_map.items():
-            if data['guest_count'] >= min_common:
-                dish = data['dish']
-                intersections_data.append({
-                    'dish_id': dish.id,
-                    'name': dish.name,
-                    'dish_type': dish.dish_type.name if dish.dish_type else '',
-                    'guest_count': data['guest_count'],
-                    'guests': ', '.join(data['guests']),
-                    'cooking_time': dish.cooking_time,
-                    'difficulty': dish.difficulty
-                })
-
-        df = pd.DataFrame(intersections_data)
-        if not df.empty:
-            df = df.sort_values('guest_count', ascending=False)
-
-        return df
+        import numpy as np
+        import pandas as pd
+
+        # Суммы по столбцам матрицы предпочтений
+        counts = self.preferences.dish_counts()
+        columns = np.flatnonzero((counts >= min_common) & (counts > 0))
+        if not len(columns):
+            return pd.DataFrame()
+
+        guest_names = np.array([guest.name for guest in self.guests], dtype=object)
+        guests_by_dish = self.preferences.guests_by_dish(columns)
+
+        df = self.dishes_df.iloc[columns][
+            ['dish_id', 'name', 'dish_type', 'cooking_time', 'difficulty']
+        ].copy()
+        df.insert(3, 'guest_count', counts[columns])
+        df.insert(4, 'guests', [', '.join(guest_names[guests_by_dish[col]]) for col in columns])
+
+        return df.sort_values('guest_count', ascending=False, kind='stable').reset_index(drop=True)
 
     def suggest_menu(
             self,
             max_dishes: int = 8,
             max_cooking_time: int = 180,
-            balance_types: bool = True
+            balance_types: bool = True,
+            per_type_limit: int = 1,
+            time_limit: float = 0.2
     ) -> List[Dict]:
         """
         Предлагает меню на основе анализа пересечений
 
+        Набор блюд подбирается оптимизатором (рюкзак по времени приготовления
+        с ограничением на число блюд одного типа). Если расчет не уложился
+        в time_limit, возвращается жадное решение.
+
         Args:
             max_dishes: максимальное количество блюд в меню
             max_cooking_time: максимальное общее время приготовления
             balance_types: сбалансировать типы блюд
+            per_type_limit: сколько блюд одного типа допускается при балансировке
+            time_limit: ограничение времени расчета в секундах
 
         Returns:
             Список рекомендованных блюд
@@ -98,7 +205,10 @@ class MenuPlanner:
 
         if intersections_df.empty:
             # Если нет пересечений, используем популярные блюда
-            suggestions = self.all_dishes.order_by('-popularity_score')[:max_dishes]
+            if hasattr(self.all_dishes, 'order_by'):
+                suggestions = self.all_dishes.order_by('-popularity_score')[:max_dishes]
+            else:
+                suggestions = sorted(self.all_dishes, key=lambda dish: dish.popularity_score, reverse=True)[:max_dishes]
             return [
                 {
                     'dish': dish,
@@ -108,51 +218,82 @@ class MenuPlanner:
                 for dish in suggestions
             ]
 
-        # Сортируем по количеству гостей и популярности
-        intersections_df['score'] = (
-                intersections_df['guest_count'] * 0.7 +
-                intersections_df['cooking_time'].apply(lambda x: 1 - (x / max_cooking_time)) * 0.3
+        # Оценка блюда: количество гостей и скорость приготовления
+        intersections_df['score'] = menu_scores(
+            intersections_df['guest_count'],
+            intersections_df['cooking_time'],
+            max_cooking_time
         )
 
-        suggestions = []
-        selected_types = set()
-        total_time = 0
-
-        # Отбираем блюда
-        for _, row in intersections_df.iterrows():
-            if len(suggestions) >= max_dishes:
-                break
-
-            dish = next((d for d in self.all_dishes if d.id == row['dish_id']), None)
-            if not dish:
-                continue
+        # Время и типы берутся из снимка каталога, объекты блюд — только для меню
+        candidates = list(intersections_df.itertuples(index=False))
+        selected, _ = optimize_menu(
+            values=[row.score for row in candidates],
+            times=[row.cooking_time for row in candidates],
+            groups=[row.dish_type or None for row in candidates],
+            max_dishes=max_dishes,
+            max_time=max_cooking_time,
+            per_group=per_type_limit if balance_types else None,
+            time_limit=time_limit
+        )
+        dishes = self._get_dishes([candidates[i].dish_id for i in selected])
 
-            # Проверяем время приготовления
-            if total_time + dish.cooking_time > max_cooking_time:
+        suggestions = []
+        for i in selected:
+            row = candidates[i]
+            dish = dishes.get(row.dish_id)
+            if dish is None:
                 continue
-
-            # Балансируем типы блюд
-            if balance_types:
-                dish_type = dish.dish_type.name if dish.dish_type else 'other'
-                if dish_type in selected_types:
-                    continue
-
             suggestions.append({
                 'dish': dish,
-                'reason': f'Нравится {int(row["guest_count"])} гостям',
-                'score': row['score'],
-                'guests': row['guests']
+                'reason': f'Нравится {int(row.guest_count)} гостям',
+                'score': row.score,
+                'guests': row.guests
             })
 
-            if dish.dish_type:
-                selected_types.add(dish.dish_type.name)
-            total_time += dish.cooking_time
-
         # Сортируем по убыванию оценки
         suggestions.sort(key=lambda x: x['score'], reverse=True)
 
         return suggestions
 
+    def suggest_coverage_menu(
+            self,
+            max_dishes: int = 6,
+            min_favorites: int = 1
+    ) -> List[Dict]:
+        """
+        Предлагает меню, в котором как можно больше гостей найдут любимые блюда
+
+        Args:
+            max_dishes: максимальное количество блюд в меню
+            min_favorites: сколько любимых блюд должно быть у каждого гостя
+
+        Returns:
+            Список рекомендованных блюд в порядке отбора
+        """
+        import numpy as np
+
+        counts = self.preferences.dish_counts()
+        # Кандидаты в порядке популярности: он решает при равном выигрыше
+        columns = [int(col) for col in np.argsort(-counts, kind='stable') if counts[col] > 0]
+        bitsets = self.preferences.guest_bitsets(columns)
+        selected, _ = coverage_menu({col: bitsets[col] for col in columns}, max_dishes, min_favorites)
+
+        guest_names = [guest.name for guest in self.guests]
+        guests_by_dish = self.preferences.guests_by_dish(selected)
+        dishes = self._get_dishes([int(self.preferences.dish_ids[col]) for col in selected])
+        suggestions = []
+        for col in selected:
+            dish = dishes[int(self.preferences.dish_ids[col])]
+            rows = guests_by_dish[col]
+            suggestions.append({
+                'dish': dish,
+                'reason': f'Нравится {int(counts[col])} гостям',
+                'score': int(counts[col]),
+                'guests': ', '.join(guest_names[row] for row in rows)
+            })
+        return suggestions
+
     def calculate_shopping_list(
             self,
             selected_dishes: List,
@@ -169,13 +310,13 @@ class MenuPlanner:
             Словарь с категоризированным списком продуктов
         """
         shopping_dict = {}
-        total_cost = 0
+        rows = []
 
         for dish_data in selected_dishes:
             dish = dish_data['dish']
             servings = dish_data.get('servings', guests_count)
 
-            for dish_ingredient in dish.ingredients_list.all():
+            for dish_ingredient in dish.ingredients_list.select_related('ingredient'):
                 ingredient = dish_ingredient.ingredient
                 quantity_needed = dish_ingredient.quantity * servings
 
@@ -190,12 +331,17 @@ class MenuPlanner:
 
                 shopping_dict[ingredient.id]['quantity'] += quantity_needed
                 shopping_dict[ingredient.id]['dishes'].append(dish.name)
+                rows.append((ingredient, quantity_needed))
 
-                # Расчет стоимости
-                if ingredient.average_price:
-                    cost = (quantity_needed / 1000) * float(ingredient.average_price)  # для грамм/кг
-                    shopping_dict[ingredient.id]['estimated_cost'] += cost
-                    total_cost += cost
+        # Расчет стоимости всех позиций за один проход
+        costs = calculate_costs(
+            [quantity for _, quantity in rows],
+            [ingredient.unit for ingredient, _ in rows],
+            [ingredient.average_price for ingredient, _ in rows]
+        )
+        for (ingredient, _), cost in zip(rows, costs):
+            shopping_dict[ingredient.id]['estimated_cost'] += float(cost)
+        total_cost = float(costs.sum())
 
         # Преобразуем в список и сортируем
         shopping_list = list(shopping_dict.values())
@@ -211,6 +357,9 @@ class MenuPlanner:
         """
         Создает визуализации для меню
 
+        Рендер выполняется в пуле процессов, готовые изображения берутся
+        из дискового кэша, пока набор блюд не изменился.
+
         Args:
             selected_dishes: список выбранных блюд
 
@@ -222,67 +371,8 @@ class MenuPlanner:
         if not selected_dishes:
             return visualizations
 
-        # 1. График распределения типов блюд
-        dish_types = []
-        for dish_data in selected_dishes:
-            dish_type = dish_data['dish'].dish_type
-            dish_types.append(dish_type.name if dish_type else 'Другое')
-
-        type_counts = Counter(dish_types)
-
-        plt.figure(figsize=(10, 6))
-        plt.subplot(2, 2, 1)
-        plt.pie(
-            type_counts.values(),
-            labels=type_counts.keys(),
-            autopct='%1.1f%%',
-            colors=sns.color_palette('pastel')
-        )
-        plt.title('Распределение типов блюд')
-
-        # 2. График сложности приготовления
-        difficulties = [dish_data['dish'].difficulty for dish_data in selected_dishes]
-        difficulty_counts = Counter(difficulties)
+        image = get_menu_chart(selected_dishes)
+        if image:
+            visualizations['menu_analysis'] = image
 
-        plt.subplot(2, 2, 2)
-        sns.barplot(
-            x=list(difficulty_counts.keys()),
-            y=list(difficulty_counts.values()),
-            palette='viridis'
-        )
-        plt.title('Сложность приготовления')
-        plt.xlabel('Уровень сложности')
-        plt.ylabel('Количество блюд')
-
-        # 3. График времени приготовления
-        cooking_times = [dish_data['dish'].cooking_time for dish_data in selected_dishes]
-
-        plt.subplot(2, 2, 3)
-        plt.bar(range(len(cooking_times)), cooking_times)
-        plt.title('Время приготовления по блюдам')
-        plt.xlabel('Блюдо')
-        plt.ylabel('Время (мин)')
-        plt.xticks([])
-
-        # 4. График популярности
-        popularity_scores = [dish_data['dish'].popularity_score for dish_data in selected_dishes]
-        dish_names = [dish_data['dish'].name[:15] + '...' for dish_data in selected_dishes]
-
-        plt.subplot(2, 2, 4)
-        plt.barh(dish_names, popularity_scores)
-        plt.title('Популярность блюд')
-        plt.xlabel('Оценка популярности')
-
-        plt.tight_layout()
-
-        # Сохраняем в base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_png = buffer.getvalue()
-        buffer.close()
-
-        visualizations['menu_analysis'] = base64.b64encode(image_png).decode('utf-8')
-        plt.close()
-
-        return visualizations
\ No newline at end of file
+        return visualizations
@@ -0,0 +1,242 @@
+import heapq
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+def menu_scores(guest_counts, cooking_times, max_time):
+    """
+    Оценка блюд для меню: число гостей и скорость приготовления
+
+    Каждый гость дает 0.7, быстрое относительно max_time блюдо — до 0.3.
+
+    Returns:
+        numpy-массив оценок той же длины
+    """
+    import numpy as np
+
+    guest_counts = np.asarray(guest_counts, dtype=float)
+    cooking_times = np.asarray(cooking_times, dtype=float)
+    return guest_counts * 0.7 + (1 - cooking_times / max_time) * 0.3
+
+
+def greedy_menu(
+        values: Sequence[float],
+        times: Sequence[int],
+        groups: Sequence[Optional[str]],
+        max_dishes: int,
+        max_time: int,
+        per_group: Optional[int]
+) -> List[int]:
+    """
+    Жадный отбор в порядке следования кандидатов
+
+    Используется как начальное решение оптимизатора и как ответ,
+    если точный расчет не уложился в отведенное время.
+    """
+    selected = []
+    group_counts = {}
+    total_time = 0
+    for i, (cooking_time, group) in enumerate(zip(times, groups)):
+        if len(selected) >= max_dishes:
+            break
+        if total_time + cooking_time > max_time:
+            continue
+        if per_group is not None and group is not None and group_counts.get(group, 0) >= per_group:
+            continue
+        selected.append(i)
+        total_time += cooking_time
+        if group is not None:
+            group_counts[group] = group_counts.get(group, 0) + 1
+    return selected
+
+
+def _undominated(candidates, keep):
+    """
+    Кандидаты, которые могут войти в оптимальное меню
+
+    Блюдо не нужно, если в его группе есть keep блюд не дольше и не хуже:
+    любое решение с ним можно улучшить заменой. Остается не больше
+    keep блюд на каждый шаг времени, что и делает расчет быстрым на
+    больших каталогах.
+
+    Args:
+        candidates: список (индекс, вес, оценка) одной группы
+        keep: сколько блюд группы может войти в меню
+    """
+    best = []
+    result = []
+    for i, _, value in sorted(candidates, key=lambda item: (item[1], -item[2])):
+        if len(best) < keep:
+            heapq.heappush(best, value)
+        elif value > best[0]:
+            heapq.heapreplace(best, value)
+        else:
+            continue
+        result.append(i)
+    return result
+
+
+def optimize_menu(
+        values: Sequence[float],
+        times: Sequence[int],
+        groups: Sequence[Optional[str]],
+        max_dishes: int,
+        max_time: int,
+        per_group: Optional[int] = 1,
+        time_limit: float = 0.2,
+        max_buckets: int = 360
+) -> Tuple[List[int], bool]:
+    """
+    Выбор блюд с максимальной суммарной оценкой
+
+    Рюкзак по времени приготовления с группировкой по типам блюд:
+    не больше max_dishes блюд, не больше per_group блюд одного типа
+    (None — без ограничения), суммарное время не больше max_time.
+    Время дискретизируется не более чем на max_buckets шагов с округлением
+    вверх, поэтому найденное меню всегда укладывается в бюджет.
+
+    Args:
+        values: оценки кандидатов
+        times: время приготовления кандидатов (мин)
+        groups: тип блюда кандидата (None — без типа, без ограничения)
+        max_dishes: максимальное количество блюд
+        max_time: бюджет времени приготовления
+        per_group: максимум блюд одного типа
+        time_limit: ограничение времени расчета в секундах
+        max_buckets: число шагов дискретизации времени
+
+    Returns:
+        (индексы выбранных кандидатов, признак того, что расчет завершен)
+    """
+    import numpy as np
+
+    deadline = time.perf_counter() + time_limit
+    values = np.asarray(values, dtype=float)
+    times = np.asarray(times, dtype=np.int64)
+
+    incumbent = greedy_menu(values, times, groups, max_dishes, max_time, per_group)
+    if not len(values) or max_dishes <= 0 or max_time < 0:
+        return incumbent, True
+
+    step = max(1, math.ceil(max_time / max_buckets))
+    budget = max_time // step
+    weights = -(-times // step)  # округление вверх
+
+    # Кандидаты без типа или без ограничения отбираются одним пулом,
+    # но в расчете каждый из них — отдельная группа из одного блюда
+    pools = {}
+    for i, group in enumerate(groups):
+        if weights[i] > budget or values[i] <= 0:
+            continue
+        key = group if (group is not None and per_group is not None) else None
+        pools.setdefault(key, []).append((i, weights[i], values[i]))
+
+    grouped = {}
+    for key, candidates in pools.items():
+        keep = max_dishes if key is None else min(per_group, max_dishes)
+        for i in _undominated(candidates, keep):
+            grouped.setdefault(key if key is not None else ('item', i), []).append(i)
+
+    counts = max_dishes + 1
+    width = budget + 1
+    # dp[c, t] — лучшая оценка при c блюдах и времени не больше t
+    dp = np.full((counts, width), -np.inf)
+    dp[0, :] = 0.0
+
+    history = []
+    for key, members in grouped.items():
+        limit = min(1 if isinstance(key, tuple) else per_group, len(members))
+        layers = [dp] + [np.full_like(dp, -np.inf) for _ in range(limit)]
+        taken = []
+        for i in members:
+            if time.perf_counter() > deadline:
+                return incumbent, False
+            w = weights[i]
+            item_taken = np.zeros((limit + 1, counts, width), dtype=bool)
+            for j in range(limit, 0, -1):
+                candidate = np.full_like(dp, -np.inf)
+                candidate[1:, w:] = layers[j - 1][:-1, :width - w] + values[i]
+                better = candidate > layers[j]
+                if better.any():
+                    layers[j] = np.where(better, candidate, layers[j])
+                    item_taken[j] = better
+            taken.append((i, item_taken))
+
+        stacked = np.stack(layers)
+        chosen_layer = stacked.argmax(axis=0)
+        dp = stacked.max(axis=0)
+        history.append((taken, chosen_layer))
+
+    best = np.unravel_index(np.argmax(dp), dp.shape)
+    if not np.isfinite(dp[best]):
+        return incumbent, True
+
+    # Восстановление решения с конца
+    selected = []
+    c, t = int(best[0]), int(best[1])
+    for taken, chosen_layer in reversed(history):
+        j = int(chosen_layer[c, t])
+        for i, item_taken in reversed(taken):
+            if j > 0 and item_taken[j, c, t]:
+                selected.append(i)
+                c -= 1
+                t -= int(weights[i])
+                j -= 1
+
+    if values[selected].sum() < values[incumbent].sum():
+        return incumbent, True
+    return sorted(selected), True
+
+
+def coverage_menu(
+        guest_sets: Dict[Hashable, int],
+        max_dishes: int,
+        min_favorites: int = 1
+) -> Tuple[List[Hashable], int]:
+    """
+    Отбор блюд, покрывающих как можно больше гостей
+
+    Гость считается покрытым, если в меню есть хотя бы min_favorites его
+    любимых блюд. Множества гостей хранятся битовыми масками (int), выигрыш
+    блюда — число его гостей, которым еще не хватает любимых блюд. Выигрыш
+    только убывает по мере набора меню, поэтому пересчитывается лениво
+    (CELF): из кучи берется лучший кандидат, и если его оценка устарела,
+    он пересчитывается и возвращается в кучу.
+
+    Args:
+        guest_sets: {ключ блюда: битовая маска гостей}, порядок задает
+            приоритет при равном выигрыше
+        max_dishes: максимальное количество блюд
+        min_favorites: сколько любимых блюд должно быть у гостя
+
+    Returns:
+        (ключи выбранных блюд в порядке отбора, число покрытых гостей)
+    """
+    min_favorites = max(1, min_favorites)
+    # levels[l] — гости, у которых в меню не меньше l + 1 любимых блюд
+    levels = [0] * min_favorites
+
+    heap = [(-bin(bits).count('1'), order, key) for order, (key, bits) in enumerate(guest_sets.items()) if bits]
+    heapq.heapify(heap)
+
+    selected = []
+    round_number = 0
+    fresh = {key: round_number for key in guest_sets}
+    while heap and len(selected) < max_dishes:
+        _, order, key = heapq.heappop(heap)
+        if fresh.get(key) != round_number:
+            gain = bin(guest_sets[key] & ~levels[-1]).count('1')
+            fresh[key] = round_number
+            if gain:
+                heapq.heappush(heap, (-gain, order, key))
+            continue
+
+        bits = guest_sets[key]
+        for level in range(min_favorites - 1, 0, -1):
+            levels[level] |= levels[level - 1] & bits
+        levels[0] |= bits
+        selected.append(key)
+        round_number += 1
+
+    return selected, bin(levels[-1]).count('1')
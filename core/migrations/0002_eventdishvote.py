@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_event_dish_votes(apps, schema_editor):
+    """Подсчет голосов для уже существующих мероприятий"""
+    HolidayEvent = apps.get_model('core', 'HolidayEvent')
+    Guest = apps.get_model('core', 'Guest')
+    EventDishVote = apps.get_model('core', 'EventDishVote')
+
+    event_guests = HolidayEvent.guests.through.objects.values_list('holidayevent_id', 'guest_id')
+    guests_by_event = {}
+    for event_id, guest_id in event_guests:
+        guests_by_event.setdefault(event_id, []).append(guest_id)
+
+    votes = []
+    for event_id, guest_ids in guests_by_event.items():
+        rows = (
+            Guest.favorite_dishes.through.objects
+            .filter(guest_id__in=guest_ids)
+            .values('dish_id')
+            .annotate(votes=Count('guest_id'))
+        )
+        votes.extend(
+            EventDishVote(event_id=event_id, dish_id=row['dish_id'], votes=row['votes'])
+            for row in rows
+        )
+    EventDishVote.objects.bulk_create(votes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='shoppingitem',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppinglist',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='shoppingitem',
+            name='estimated_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='shoppingitem',
+            name='purchased',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='shoppingitem',
+            name='quantity_needed',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='generated_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='EventDishVote',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votes', models.PositiveIntegerField(default=0, verbose_name='Голосов')),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_votes', to='core.dish')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dish_votes', to='core.holidayevent')),
+            ],
+            options={
+                'verbose_name': 'Голос за блюдо',
+                'verbose_name_plural': 'Голоса за блюда',
+                'indexes': [models.Index(fields=['event', '-votes'], name='core_vote_event_votes_idx')],
+                'unique_together': {('event', 'dish')},
+            },
+        ),
+        migrations.RunPython(fill_event_dish_votes, migrations.RunPython.noop),
+    ]
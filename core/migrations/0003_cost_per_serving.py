@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:04
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Копия таблицы из core.costs на момент миграции: миграция не должна
+# зависеть от кода приложения, который может измениться
+UNIT_PRICE_FACTORS = {
+    'g': 0.001,
+    'kg': 1.0,
+    'ml': 0.001,
+    'l': 1.0,
+    'pcs': 1.0,
+    'tbsp': 0.015,
+    'tsp': 0.005,
+}
+DEFAULT_PRICE_FACTOR = 0.001
+
+
+def fill_costs_per_serving(apps, schema_editor):
+    """Начальный расчет стоимости порций по текущим ценам"""
+    Dish = apps.get_model('core', 'Dish')
+    DishIngredient = apps.get_model('core', 'DishIngredient')
+
+    rows = DishIngredient.objects.values_list(
+        'id', 'dish_id', 'quantity', 'ingredient__unit', 'ingredient__average_price'
+    )
+
+    totals = defaultdict(float)
+    ingredient_rows = []
+    for row_id, dish_id, quantity, unit, price in rows:
+        cost = quantity * UNIT_PRICE_FACTORS.get(unit, DEFAULT_PRICE_FACTOR) * float(price or 0)
+        totals[dish_id] += cost
+        ingredient_rows.append(DishIngredient(id=row_id, cost_per_serving=Decimal(f'{cost:.4f}')))
+    DishIngredient.objects.bulk_update(ingredient_rows, ['cost_per_serving'])
+
+    Dish.objects.bulk_update(
+        [Dish(id=dish_id, cost_per_serving=Decimal(f'{total:.4f}')) for dish_id, total in totals.items()],
+        ['cost_per_serving']
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_eventdishvote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='cost_per_serving',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12, verbose_name='Стоимость порции'),
+        ),
+        migrations.AddField(
+            model_name='dishingredient',
+            name='cost_per_serving',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12, verbose_name='Стоимость на порцию'),
+        ),
+        migrations.RunPython(fill_costs_per_serving, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:06
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def recalculate_popularity(apps, schema_editor):
+    """Популярность теперь равна числу гостей, выбравших блюдо"""
+    Dish = apps.get_model('core', 'Dish')
+    Guest = apps.get_model('core', 'Guest')
+    favorites = (
+        Guest.favorite_dishes.through.objects
+        .filter(dish_id=OuterRef('pk'))
+        .values('dish_id')
+        .annotate(total=Count('guest_id'))
+        .values('total')
+    )
+    Dish.objects.update(
+        popularity_score=Coalesce(Subquery(favorites, output_field=FloatField()), Value(0.0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_cost_per_serving'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dish',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0.0, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(recalculate_popularity, migrations.RunPython.noop),
+    ]
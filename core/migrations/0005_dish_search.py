@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def _fold(column):
+    # «ё» индексируется как «е», как и в core.search
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_search_index(apps, schema_editor):
+    """Полнотекстовый индекс блюд: FTS5 в SQLite, tsvector + GIN в PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE core_dish_search ('
+            'dish_id integer PRIMARY KEY REFERENCES core_dish (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX core_dish_search_document ON core_dish_search USING GIN (document)')
+        schema_editor.execute(
+            'INSERT INTO core_dish_search (dish_id, document) '
+            f"SELECT id, setweight(to_tsvector('russian', {_fold('name')}), 'A') || "
+            f"setweight(to_tsvector('russian', {_fold('tags')}), 'B') || "
+            f"setweight(to_tsvector('russian', {_fold('description')}), 'C') FROM core_dish"
+        )
+    else:
+        # unicode61 приводит к нижнему регистру и кириллицу
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE core_dish_search USING fts5('
+            "name, description, tags, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO core_dish_search (rowid, name, description, tags) '
+            f"SELECT id, {_fold('name')}, {_fold('description')}, {_fold('tags')} FROM core_dish"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS core_dish_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_popularity_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:29
+
+import re
+
+import core.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def migrate_tags(apps, schema_editor):
+    """Перенос строк Dish.tags в таблицу тегов пакетами"""
+    Dish = apps.get_model('core', 'Dish')
+    Tag = apps.get_model('core', 'Tag')
+    DishTag = Dish.tag_index.through
+
+    pairs = set()
+    for dish_id, tags in Dish.objects.exclude(tags='').values_list('id', 'tags').iterator(chunk_size=2000):
+        for tag in tags.split(','):
+            tag = re.sub(r'\s+', ' ', tag).strip().casefold()[:50]
+            if tag:
+                pairs.add((dish_id, tag))
+
+    names = {name for _, name in pairs}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], batch_size=1000, ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    DishTag.objects.bulk_create(
+        [DishTag(dish_id=dish_id, tag_id=tag_ids[name]) for dish_id, name in pairs],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dish_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishSearchEntry',
+            fields=[
+                ('dish', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='core.dish')),
+                ('document', core.search.SearchDocumentField(db_column='core_dish_search')),
+            ],
+            options={
+                'db_table': 'core_dish_search',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Тег')),
+            ],
+            options={
+                'verbose_name': 'Тег',
+                'verbose_name_plural': 'Теги',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='tag_index',
+            field=models.ManyToManyField(blank=True, related_name='dishes', to='core.tag', verbose_name='Теги (индекс)'),
+        ),
+        migrations.RunPython(migrate_tags, migrations.RunPython.noop),
+    ]
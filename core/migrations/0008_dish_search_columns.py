@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Столбцы индекса в PostgreSQL называются так же, как в FTS5: id блюда —
+# rowid, документ — core_dish_search. Тогда модель DishSearchEntry общая
+# для обеих баз. В SQLite имена уже такие, миграция ничего не делает.
+RENAMES = (
+    ('dish_id', 'rowid'),
+    ('document', 'core_dish_search'),
+)
+
+
+def _columns(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT column_name FROM information_schema.columns '
+            "WHERE table_schema = current_schema() AND table_name = 'core_dish_search'"
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _rename(schema_editor, renames):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    columns = _columns(schema_editor)
+    quote = schema_editor.quote_name
+    for old, new in renames:
+        if old in columns and new not in columns:
+            schema_editor.execute(f'ALTER TABLE core_dish_search RENAME COLUMN {quote(old)} TO {quote(new)}')
+
+
+def rename_search_columns(apps, schema_editor):
+    _rename(schema_editor, RENAMES)
+
+
+def restore_search_columns(apps, schema_editor):
+    _rename(schema_editor, [(new, old) for old, new in RENAMES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_cache_generation'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_search_columns, restore_search_columns),
+    ]
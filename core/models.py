@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import MinValueValidator
 import uuid
 
+from .search import SearchDocumentField
+
 class DishType(models.Model):
     """Тип блюда"""
     name = models.CharField(max_length=50, verbose_name="Название типа")
@@ -14,6 +16,18 @@ class DishType(models.Model):
     def __str__(self):
         return self.name
 
+class Tag(models.Model):
+    """Тег блюда (нормализованное название)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Тег")
+
+    class Meta:
+        verbose_name = "Тег"
+        verbose_name_plural = "Теги"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 class Ingredient(models.Model):
     """Ингредиент/продукт"""
     UNIT_CHOICES = [
@@ -79,9 +93,28 @@ class Dish(models.Model):
     )
     recipe = models.TextField(verbose_name="Рецепт")
     tags = models.CharField(max_length=200, blank=True, verbose_name="Теги")
+    # Теги из строки tags в отдельной таблице; поддерживается сигналами
+    tag_index = models.ManyToManyField(
+        Tag,
+        blank=True,
+        related_name='dishes',
+        verbose_name="Теги (индекс)"
+    )
 
     # Для анализа популярности
-    popularity_score = models.FloatField(default=0.0, verbose_name="Популярность")
+    # Число гостей, выбравших блюдо; поддерживается сигналами
+    popularity_score = models.FloatField(default=0.0, db_index=True, verbose_name="Популярность")
+
+    # Поддерживается сигналами при изменении рецепта и цен
+    cost_per_serving = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        verbose_name="Стоимость порции"
+    )
+
+    # Поля, которые меняются только атомарными UPDATE с F-выражениями
+    COUNTER_FIELDS = ('popularity_score',)
 
     class Meta:
         verbose_name = "Блюдо"
@@ -91,12 +124,48 @@ class Dish(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Сохранение блюда без счетчиков
+
+        Полное сохранение объекта, загруженного до изменения избранного,
+        иначе записало бы в базу устаревшую популярность. Счетчики
+        сохраняются, только если явно указаны в update_fields.
+        """
+        if not self._state.adding and not force_insert and update_fields is None:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
+class DishSearchEntry(models.Model):
+    """Запись полнотекстового индекса блюда (таблица — миграции 0005 и 0008)"""
+    dish = models.OneToOneField(
+        Dish,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry'
+    )
+    document = SearchDocumentField(db_column='core_dish_search')
+
+    class Meta:
+        managed = False
+        db_table = 'core_dish_search'
+
 class DishIngredient(models.Model):
     """Ингредиенты для блюда с количеством"""
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='ingredients_list')
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
     quantity = models.FloatField(verbose_name="Количество")
     notes = models.CharField(max_length=100, blank=True, verbose_name="Примечания")
+    cost_per_serving = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        verbose_name="Стоимость на порцию"
+    )
 
     class Meta:
         verbose_name = "Ингредиент блюда"
@@ -190,4 +259,34 @@ class ShoppingItem(models.Model):
     purchased = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.ingredient.name}: {self.quantity_needed}"
\ No newline at end of file
+        return f"{self.ingredient.name}: {self.quantity_needed}"
+
+class CacheGeneration(models.Model):
+    """Поколение кэшируемых данных, общее для всех процессов"""
+    key = models.CharField(max_length=100, primary_key=True, verbose_name="Ключ")
+    value = models.PositiveBigIntegerField(default=1, verbose_name="Поколение")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    class Meta:
+        verbose_name = "Поколение кэша"
+        verbose_name_plural = "Поколения кэша"
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+class EventDishVote(models.Model):
+    """Количество гостей мероприятия, которым нравится блюдо"""
+    event = models.ForeignKey(HolidayEvent, on_delete=models.CASCADE, related_name='dish_votes')
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='event_votes')
+    votes = models.PositiveIntegerField(default=0, verbose_name="Голосов")
+
+    class Meta:
+        verbose_name = "Голос за блюдо"
+        verbose_name_plural = "Голоса за блюда"
+        unique_together = ['event', 'dish']
+        indexes = [
+            models.Index(fields=['event', '-votes'], name='core_vote_event_votes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.name} - {self.dish.name}: {self.votes}"
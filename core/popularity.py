@@ -0,0 +1,48 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Dish, Guest
+
+
+def adjust_popularity(guest_dish_pairs, sign):
+    """
+    Атомарное изменение счетчиков популярности через F-выражения
+
+    Args:
+        guest_dish_pairs: пары (guest_id, dish_id) добавленных/удаленных любимых блюд
+        sign: +1 для добавления, -1 для удаления
+    """
+    deltas = Counter()
+    for _, dish_id in guest_dish_pairs:
+        deltas[dish_id] += sign
+
+    # Один UPDATE на каждое различное значение изменения
+    dishes_by_delta = defaultdict(list)
+    for dish_id, delta in deltas.items():
+        if delta:
+            dishes_by_delta[delta].append(dish_id)
+
+    for delta, dish_ids in dishes_by_delta.items():
+        Dish.objects.filter(id__in=dish_ids).update(popularity_score=F('popularity_score') + delta)
+
+
+def recalculate_popularity():
+    """
+    Полный пересчет популярности всех блюд одним UPDATE с подзапросом
+
+    Returns:
+        Количество обновленных блюд
+    """
+    favorites = (
+        Guest.favorite_dishes.through.objects
+        .filter(dish_id=OuterRef('pk'))
+        .values('dish_id')
+        .annotate(total=Count('guest_id'))
+        .values('total')
+    )
+    updated = Dish.objects.update(
+        popularity_score=Coalesce(Subquery(favorites, output_field=FloatField()), Value(0.0))
+    )
+    return updated
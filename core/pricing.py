@@ -0,0 +1,97 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+
+from .cache import bump_catalog_generation
+from .costs import calculate_costs
+from .models import Dish, DishIngredient, Ingredient
+
+SERVING_PRECISION = Decimal('0.0001')
+
+
+def _to_serving_cost(value):
+    return Decimal(str(float(value))).quantize(SERVING_PRECISION, rounding=ROUND_HALF_UP)
+
+
+@transaction.atomic
+def recalculate_dish_costs(dish_ids=None):
+    """
+    Пересчет стоимости порции блюд и разбивки по ингредиентам одним пакетом
+
+    Args:
+        dish_ids: блюда для пересчета (None — весь каталог)
+
+    Returns:
+        Количество обновленных блюд
+    """
+    rows = DishIngredient.objects.all()
+    dishes = Dish.objects.all()
+    if dish_ids is not None:
+        dish_ids = list(dish_ids)
+        rows = rows.filter(dish_id__in=dish_ids)
+        dishes = dishes.filter(id__in=dish_ids)
+
+    rows = list(rows.values_list(
+        'id', 'dish_id', 'quantity', 'ingredient__unit', 'ingredient__average_price'
+    ))
+    costs = calculate_costs(
+        [row[2] for row in rows],
+        [row[3] for row in rows],
+        [row[4] for row in rows]
+    )
+
+    dish_totals = defaultdict(float)
+    ingredient_rows = []
+    for (row_id, dish_id, *_), cost in zip(rows, costs):
+        dish_totals[dish_id] += float(cost)
+        ingredient_rows.append(DishIngredient(id=row_id, cost_per_serving=_to_serving_cost(cost)))
+
+    dish_rows = [
+        Dish(id=dish_id, cost_per_serving=_to_serving_cost(dish_totals.get(dish_id, 0)))
+        for dish_id in dishes.values_list('id', flat=True)
+    ]
+
+    DishIngredient.objects.bulk_update(ingredient_rows, ['cost_per_serving'], batch_size=500)
+    Dish.objects.bulk_update(dish_rows, ['cost_per_serving'], batch_size=500)
+    return len(dish_rows)
+
+
+def recalculate_for_ingredients(ingredient_ids):
+    """Пересчет блюд, в рецепт которых входят ингредиенты"""
+    dish_ids = set(
+        DishIngredient.objects
+        .filter(ingredient_id__in=list(ingredient_ids))
+        .values_list('dish_id', flat=True)
+    )
+    if dish_ids:
+        recalculate_dish_costs(dish_ids)
+
+
+@transaction.atomic
+def update_ingredient_prices(prices):
+    """
+    Массовое обновление цен с одним пересчетом стоимости блюд
+
+    Args:
+        prices: словарь {ingredient: новая цена}
+
+    Returns:
+        Количество обновленных ингредиентов
+    """
+    ingredients = []
+    for ingredient, price in prices.items():
+        ingredient.average_price = price
+        ingredients.append(ingredient)
+
+    Ingredient.objects.bulk_update(ingredients, ['average_price'], batch_size=500)
+    recalculate_for_ingredients(ingredient.id for ingredient in ingredients)
+    # bulk_update не отправляет сигналы, поэтому сбрасываем кэш явно
+    bump_catalog_generation()
+    return len(ingredients)
+
+
+def menu_cost(dishes, guests_count):
+    """Стоимость меню без расчетов по ингредиентам: сумма порций × гости"""
+    per_guest = sum((dish.cost_per_serving for dish in dishes), Decimal('0'))
+    return per_guest * guests_count
@@ -0,0 +1,138 @@
+import re
+
+from django.db import connection, models
+
+# Полнотекстовый индекс блюд: в SQLite — виртуальная таблица FTS5,
+# в PostgreSQL — столбец tsvector с индексом GIN. Таблица создается
+# миграцией 0005_dish_search (столбцы PostgreSQL переименованы в 0008 под
+# имена FTS5), обновляется сигналами и читается через неуправляемую модель
+# DishSearchEntry.
+SEARCH_TABLE = 'core_dish_search'
+
+# Поля блюда, попадающие в индекс
+SEARCH_FIELDS = ('name', 'description', 'tags')
+
+# Вес совпадения в названии, описании и тегах (порядок столбцов FTS5)
+SQLITE_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+def _fold(column):
+    """SQL-выражение столбца для индекса: «ё» ищется как «е»"""
+    return f"replace(replace(coalesce({column}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+POSTGRES_DOCUMENT = (
+    f"setweight(to_tsvector('russian', {_fold('name')}), 'A') || "
+    f"setweight(to_tsvector('russian', {_fold('tags')}), 'B') || "
+    f"setweight(to_tsvector('russian', {_fold('description')}), 'C')"
+)
+
+
+class SearchDocumentField(models.Field):
+    """Документ полнотекстового индекса (скрытый столбец FTS5 или tsvector)"""
+
+    def db_type(self, connection):
+        return None
+
+
+@SearchDocumentField.register_lookup
+class SearchMatch(models.Lookup):
+    """document__match=запрос из search_query()"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        if connection.vendor == 'postgresql':
+            return f"{lhs} @@ to_tsquery('russian', {rhs})", lhs_params + rhs_params
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchRank(models.Func):
+    """Релевантность найденной строки: больше — точнее"""
+    output_field = models.FloatField()
+
+    def __init__(self, document, query):
+        super().__init__(document, models.Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, query = self.get_source_expressions()
+        document_sql, document_params = compiler.compile(document)
+        if connection.vendor == 'postgresql':
+            query_sql, query_params = compiler.compile(query)
+            return f"ts_rank({document_sql}, to_tsquery('russian', {query_sql}))", document_params + query_params
+        # bm25 возвращает меньшие значения для более релевантных строк
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        return f'-bm25({document_sql}, {weights})', document_params
+
+
+def _words(text):
+    return re.findall(r'\w+', (text or '').casefold().replace('ё', 'е'))
+
+
+def search_query(text):
+    """
+    Поисковый запрос для индекса: все слова обязательны и ищутся по префиксу
+
+    Returns:
+        Строка запроса или None, если в тексте нет слов
+    """
+    words = _words(text)
+    if not words:
+        return None
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_dishes(queryset, text):
+    """
+    Блюда, найденные полнотекстовым поиском, по убыванию релевантности
+
+    Индекс присоединяется к запросу блюд, поэтому фильтр и ранжирование
+    выполняются одним запросом по индексу, без сканирования текстов.
+    Релевантность доступна в поле search_rank.
+    """
+    query = search_query(text)
+    if query is None:
+        return queryset
+    return (
+        queryset
+        .filter(search_entry__document__match=query)
+        .annotate(search_rank=SearchRank('search_entry__document', query))
+        .order_by('-search_rank', 'name')
+    )
+
+
+def index_dishes(dish_ids):
+    """Обновление записей индекса для указанных блюд"""
+    dish_ids = list(dish_ids)
+    if not dish_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(dish_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, {SEARCH_TABLE}) '
+                f'SELECT id, {POSTGRES_DOCUMENT} FROM core_dish WHERE id IN ({placeholders}) '
+                f'ON CONFLICT (rowid) DO UPDATE SET {SEARCH_TABLE} = EXCLUDED.{SEARCH_TABLE}',
+                dish_ids
+            )
+        else:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', dish_ids)
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, tags) '
+                f"SELECT id, {_fold('name')}, {_fold('description')}, {_fold('tags')} "
+                f'FROM core_dish WHERE id IN ({placeholders})',
+                dish_ids
+            )
+
+
+def remove_dishes(dish_ids):
+    """Удаление записей индекса для удаленных блюд"""
+    dish_ids = list(dish_ids)
+    if not dish_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(dish_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', dish_ids)
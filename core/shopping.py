@@ -0,0 +1,455 @@
+from collections import Counter, defaultdict
+from functools import partial
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .artifacts import schedule_shopping_pdf
+from .catalog import get_catalog
+from .costs import calculate_costs
+from .menu_optimizer import coverage_menu, menu_scores, optimize_menu
+from .models import (
+    Dish, DishIngredient, EventDishVote, Guest, HolidayEvent, Ingredient, ShoppingList, ShoppingItem
+)
+
+CENT = Decimal('0.01')
+
+
+def get_popular_dishes(event, limit=5, fallback=3):
+    """
+    Самые популярные у гостей мероприятия блюда
+
+    Args:
+        event: мероприятие
+        limit: сколько блюд вернуть
+        fallback: сколько блюд взять из каталога, если гости ничего не выбрали
+
+    Returns:
+        Список блюд (с подгруженным dish_type), у каждого есть атрибут votes
+    """
+    votes = (
+        EventDishVote.objects
+        .filter(event=event, votes__gt=0)
+        .select_related('dish__dish_type')
+        .order_by('-votes', 'dish_id')[:limit]
+    )
+    dishes = []
+    for vote in votes:
+        vote.dish.votes = vote.votes
+        dishes.append(vote.dish)
+    if not dishes and fallback:
+        dishes = list(Dish.objects.select_related('dish_type')[:fallback])
+        for dish in dishes:
+            dish.votes = 0
+    return dishes
+
+
+def get_coverage_dishes(event, limit=6, min_favorites=1):
+    """
+    Блюда, покрывающие как можно больше гостей мероприятия
+
+    Гость покрыт, если в меню есть хотя бы min_favorites его любимых блюд.
+    Предпочтения загружаются одним запросом и сводятся к битовым маскам.
+
+    Returns:
+        (список блюд с атрибутом votes, число покрытых гостей)
+    """
+    event_guests = HolidayEvent.guests.through.objects.filter(holidayevent_id=event.id)
+    guest_index = {
+        guest_id: i
+        for i, guest_id in enumerate(event_guests.order_by('guest_id').values_list('guest_id', flat=True))
+    }
+    favorites = Guest.favorite_dishes.through.objects.filter(guest_id__in=list(guest_index))
+
+    bitsets = defaultdict(int)
+    votes = Counter()
+    for guest_id, dish_id in favorites.values_list('guest_id', 'dish_id'):
+        bitsets[dish_id] |= 1 << guest_index[guest_id]
+        votes[dish_id] += 1
+
+    # Порядок популярности решает при равном выигрыше
+    ranked = sorted(bitsets, key=lambda dish_id: (-votes[dish_id], dish_id))
+    selected, covered = coverage_menu({dish_id: bitsets[dish_id] for dish_id in ranked}, limit, min_favorites)
+
+    dishes_by_id = Dish.objects.select_related('dish_type').in_bulk(selected)
+    dishes = []
+    for dish_id in selected:
+        dish = dishes_by_id[dish_id]
+        dish.votes = votes[dish_id]
+        dishes.append(dish)
+    return dishes, covered
+
+
+def get_balanced_dishes(event, limit=6, max_time=180, per_type=1, time_limit=0.2):
+    """
+    Меню с наибольшей суммарной оценкой при ограничениях
+
+    Оценка блюда — голоса гостей и скорость приготовления (как в
+    MenuPlanner.suggest_menu). В меню не больше limit блюд, не больше
+    per_type блюд одного типа, а суммарное время приготовления не больше
+    max_time. Время и типы берутся из снимка каталога, объекты загружаются
+    только для выбранных блюд.
+
+    Returns:
+        (список блюд с атрибутом votes по убыванию оценки, суммарное время)
+    """
+    catalog = get_catalog()
+    votes = [
+        (dish_id, count)
+        for dish_id, count in (
+            EventDishVote.objects
+            .filter(event=event, votes__gt=0)
+            .values_list('dish_id', 'votes')
+        )
+        if dish_id in catalog.index
+    ]
+    positions = [catalog.index[dish_id] for dish_id, _ in votes]
+    times = catalog.cooking_times[positions]
+    scores = menu_scores([count for _, count in votes], times, max_time)
+
+    # Жадное решение, к которому откатывается оптимизатор, идет по убыванию оценки
+    order = sorted(range(len(votes)), key=lambda i: (-scores[i], votes[i][0]))
+    selected, _ = optimize_menu(
+        values=[scores[i] for i in order],
+        times=[int(times[i]) for i in order],
+        groups=[int(catalog.type_ids[positions[i]]) or None for i in order],
+        max_dishes=limit,
+        max_time=max_time,
+        per_group=per_type,
+        time_limit=time_limit
+    )
+    selected = [order[i] for i in selected]
+    selected.sort(key=lambda i: (-scores[i], votes[i][0]))
+
+    dishes_by_id = Dish.objects.select_related('dish_type').in_bulk([votes[i][0] for i in selected])
+    dishes = []
+    for i in selected:
+        dish_id, count = votes[i]
+        dish = dishes_by_id.get(dish_id)
+        if dish is not None:
+            dish.votes = count
+            dishes.append(dish)
+    return dishes, sum(dish.cooking_time for dish in dishes)
+
+
+def aggregate_ingredients(dishes, servings):
+    """
+    Суммирует количество ингредиентов выбранных блюд через GROUP BY
+
+    Args:
+        dishes: список блюд
+        servings: количество порций (гостей)
+
+    Returns:
+        Словарь {ingredient_id: {'ingredient', 'quantity', 'unit', 'dishes', 'estimated_cost'}}
+    """
+    dish_ids = [dish.id for dish in dishes]
+    if not dish_ids:
+        return {}
+
+    rows = DishIngredient.objects.filter(dish_id__in=dish_ids)
+    totals = rows.values('ingredient_id').annotate(total=Sum('quantity'))
+
+    dish_names = {dish.id: dish.name for dish in dishes}
+    dishes_by_ingredient = defaultdict(list)
+    for dish_id, ingredient_id in rows.order_by('ingredient_id').values_list('dish_id', 'ingredient_id'):
+        dishes_by_ingredient[ingredient_id].append(dish_names[dish_id])
+
+    ingredients = Ingredient.objects.in_bulk(list(dishes_by_ingredient))
+
+    totals = list(totals)
+    rows_ingredients = [ingredients[row['ingredient_id']] for row in totals]
+    quantities = [row['total'] * servings for row in totals]
+    costs = calculate_costs(
+        quantities,
+        [ingredient.unit for ingredient in rows_ingredients],
+        [ingredient.average_price for ingredient in rows_ingredients]
+    )
+
+    shopping_dict = {}
+    for ingredient, quantity, cost in zip(rows_ingredients, quantities, costs):
+        shopping_dict[ingredient.id] = {
+            'ingredient': ingredient,
+            'quantity': quantity,
+            'unit': ingredient.unit,
+            'dishes': dishes_by_ingredient[ingredient.id],
+            'estimated_cost': float(cost),
+        }
+    return shopping_dict
+
+
+def group_by_category(shopping_dict):
+    """Группировка позиций списка покупок по категориям"""
+    categories = {}
+    for item in shopping_dict.values():
+        category = item['ingredient'].category or 'Другое'
+        categories.setdefault(category, []).append(item)
+    return categories
+
+
+def build_shopping_list(event, limit=5):
+    """
+    Расчет списка покупок для мероприятия за постоянное число запросов
+
+    Returns:
+        Словарь с ключами items, categories, total_cost и popular_dishes
+    """
+    popular_dishes = get_popular_dishes(event, limit=limit)
+    shopping_dict = aggregate_ingredients(popular_dishes, event.number_of_guests)
+    total_cost = sum(item['estimated_cost'] for item in shopping_dict.values())
+
+    return {
+        'items': shopping_dict,
+        'categories': group_by_category(shopping_dict),
+        'total_cost': total_cost,
+        'popular_dishes': popular_dishes,
+    }
+
+
+def to_money(value):
+    """Округление суммы до копеек, как в DecimalField(decimal_places=2)"""
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@transaction.atomic
+def save_shopping_list(event, shopping_dict, total_cost):
+    """
+    Сохраняет рассчитанный список покупок, записывая только изменения
+
+    Существующие позиции сравниваются с новыми по ингредиенту: новые
+    создаются через bulk_create, изменившиеся обновляются через bulk_update,
+    лишние удаляются одним запросом. Отметки purchased сохраняются.
+
+    Returns:
+        Объект ShoppingList мероприятия
+    """
+    shopping_list, created = ShoppingList.objects.get_or_create(
+        event=event,
+        defaults={'total_cost': to_money(total_cost)}
+    )
+    if not created and shopping_list.total_cost != to_money(total_cost):
+        shopping_list.total_cost = to_money(total_cost)
+        shopping_list.save(update_fields=['total_cost'])
+
+    existing = {}
+    to_delete = []
+    for item in shopping_list.items.all():
+        if item.ingredient_id in existing:
+            # Дубликаты из старых версий списка
+            to_delete.append(item.id)
+        else:
+            existing[item.ingredient_id] = item
+
+    to_create = []
+    to_update = []
+    for ingredient_id, item_data in shopping_dict.items():
+        quantity = item_data['quantity']
+        cost = to_money(item_data.get('estimated_cost', 0))
+        item = existing.pop(ingredient_id, None)
+        if item is None:
+            to_create.append(ShoppingItem(
+                shopping_list=shopping_list,
+                ingredient_id=ingredient_id,
+                quantity_needed=quantity,
+                estimated_cost=cost
+            ))
+        elif item.quantity_needed != quantity or item.estimated_cost != cost:
+            item.quantity_needed = quantity
+            item.estimated_cost = cost
+            to_update.append(item)
+
+    to_delete.extend(item.id for item in existing.values())
+
+    if to_delete:
+        ShoppingItem.objects.filter(id__in=to_delete).delete()
+    if to_create:
+        ShoppingItem.objects.bulk_create(to_create)
+    if to_update:
+        ShoppingItem.objects.bulk_update(to_update, ['quantity_needed', 'estimated_cost'])
+
+    transaction.on_commit(partial(schedule_shopping_pdf, shopping_list.id))
+    return shopping_list
+
+
+def top_dish_ids(event_id, limit=5):
+    """Идентификаторы блюд, попадающих в список покупок мероприятия"""
+    return list(
+        EventDishVote.objects
+        .filter(event_id=event_id, votes__gt=0)
+        .order_by('-votes', 'dish_id')
+        .values_list('dish_id', flat=True)[:limit]
+    )
+
+
+def favorites_delta(guest_dish_pairs, sign):
+    """
+    Изменение голосов мероприятий при добавлении/удалении любимых блюд
+
+    Args:
+        guest_dish_pairs: пары (guest_id, dish_id)
+        sign: +1 для добавления, -1 для удаления
+
+    Returns:
+        Counter {(event_id, dish_id): изменение голосов}
+    """
+    dishes_by_guest = defaultdict(list)
+    for guest_id, dish_id in guest_dish_pairs:
+        dishes_by_guest[guest_id].append(dish_id)
+
+    deltas = Counter()
+    if not dishes_by_guest:
+        return deltas
+
+    event_guests = HolidayEvent.guests.through.objects.filter(guest_id__in=list(dishes_by_guest))
+    for event_id, guest_id in event_guests.values_list('holidayevent_id', 'guest_id'):
+        for dish_id in dishes_by_guest[guest_id]:
+            deltas[(event_id, dish_id)] += sign
+    return deltas
+
+
+def event_guests_delta(event_guest_pairs, sign):
+    """
+    Изменение голосов при добавлении/удалении гостей мероприятия
+
+    Args:
+        event_guest_pairs: пары (event_id, guest_id)
+        sign: +1 для добавления, -1 для удаления
+
+    Returns:
+        Counter {(event_id, dish_id): изменение голосов}
+    """
+    events_by_guest = defaultdict(list)
+    for event_id, guest_id in event_guest_pairs:
+        events_by_guest[guest_id].append(event_id)
+
+    deltas = Counter()
+    if not events_by_guest:
+        return deltas
+
+    favorites = Guest.favorite_dishes.through.objects.filter(guest_id__in=list(events_by_guest))
+    for guest_id, dish_id in favorites.values_list('guest_id', 'dish_id'):
+        for event_id in events_by_guest[guest_id]:
+            deltas[(event_id, dish_id)] += sign
+    return deltas
+
+
+def apply_vote_deltas(deltas):
+    """
+    Применяет изменения голосов и поддерживает списки покупок в актуальном виде
+
+    Объем работы пропорционален числу изменившихся пар (мероприятие, блюдо),
+    а не размеру мероприятия.
+    """
+    by_event = defaultdict(dict)
+    for (event_id, dish_id), delta in deltas.items():
+        if delta:
+            by_event[event_id][dish_id] = delta
+
+    for event_id, dish_deltas in by_event.items():
+        with transaction.atomic():
+            # Блокировка списка покупок сериализует изменения голосов мероприятия:
+            # иначе два параллельных изменения увидят один и тот же переход
+            # old_top → new_top и применят одну и ту же разницу дважды
+            list(ShoppingList.objects.select_for_update().filter(event_id=event_id).values_list('id'))
+            old_top = top_dish_ids(event_id)
+
+            EventDishVote.objects.bulk_create(
+                [
+                    EventDishVote(event_id=event_id, dish_id=dish_id)
+                    for dish_id, delta in dish_deltas.items() if delta > 0
+                ],
+                ignore_conflicts=True
+            )
+            for dish_id, delta in dish_deltas.items():
+                EventDishVote.objects.filter(event_id=event_id, dish_id=dish_id).update(
+                    votes=F('votes') + delta
+                )
+            EventDishVote.objects.filter(
+                event_id=event_id, dish_id__in=list(dish_deltas), votes__lte=0
+            ).delete()
+
+            new_top = top_dish_ids(event_id)
+            if set(old_top) != set(new_top):
+                update_shopping_list_dishes(event_id, old_top, new_top)
+
+
+def update_shopping_list_dishes(event_id, old_dish_ids, new_dish_ids):
+    """
+    Корректирует сохраненный список покупок при смене набора блюд
+
+    Количества меняются только у ингредиентов вышедших и вошедших в меню
+    блюд, а стоимость всех позиций и итог пересчитываются по текущим ценам
+    ингредиентов, как в build_shopping_list. Отметки purchased сохраняются.
+    Если список строился по блюдам по умолчанию (голосов не было или не
+    осталось), он пересобирается целиком.
+    """
+    shopping_list = (
+        ShoppingList.objects
+        .filter(event_id=event_id)
+        .select_related('event')
+        .first()
+    )
+    if shopping_list is None:
+        return
+
+    event = shopping_list.event
+    if not old_dish_ids or not new_dish_ids:
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+        return
+
+    leaving = set(old_dish_ids) - set(new_dish_ids)
+    entering = set(new_dish_ids) - set(old_dish_ids)
+
+    quantity_deltas = Counter()
+    ingredients = {}
+    rows = DishIngredient.objects.filter(dish_id__in=leaving | entering).select_related('ingredient')
+    for row in rows:
+        sign = 1 if row.dish_id in entering else -1
+        quantity_deltas[row.ingredient_id] += sign * row.quantity * event.number_of_guests
+        ingredients[row.ingredient_id] = row.ingredient
+
+    items = {item.ingredient_id: item for item in shopping_list.items.select_related('ingredient')}
+
+    to_create = []
+    to_delete = []
+    for ingredient_id, quantity_delta in quantity_deltas.items():
+        item = items.get(ingredient_id)
+        quantity = quantity_delta + (item.quantity_needed if item else 0)
+        if quantity <= 1e-9:
+            if item:
+                to_delete.append(items.pop(ingredient_id).id)
+            continue
+        if item:
+            item.quantity_needed = quantity
+        else:
+            item = ShoppingItem(
+                shopping_list=shopping_list,
+                ingredient=ingredients[ingredient_id],
+                quantity_needed=quantity
+            )
+            items[ingredient_id] = item
+            to_create.append(item)
+
+    # Все позиции — по текущим ценам, одним векторным расчетом
+    positions = list(items.values())
+    costs = calculate_costs(
+        [item.quantity_needed for item in positions],
+        [item.ingredient.unit for item in positions],
+        [item.ingredient.average_price for item in positions]
+    )
+    for item, cost in zip(positions, costs):
+        item.estimated_cost = to_money(float(cost))
+    total_cost = to_money(sum(float(cost) for cost in costs))
+
+    to_update = [item for item in positions if item.pk is not None]
+    if to_delete:
+        ShoppingItem.objects.filter(id__in=to_delete).delete()
+    if to_create:
+        ShoppingItem.objects.bulk_create(to_create)
+    if to_update:
+        ShoppingItem.objects.bulk_update(to_update, ['quantity_needed', 'estimated_cost'])
+    if shopping_list.total_cost != total_cost:
+        ShoppingList.objects.filter(id=shopping_list.id).update(total_cost=total_cost)
+    transaction.on_commit(partial(schedule_shopping_pdf, shopping_list.id))
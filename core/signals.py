@@ -0,0 +1,173 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .artifacts import remove_shopping_pdfs
+from .cache import bump_catalog_generation, invalidate_events
+from .catalog import invalidate_catalog_snapshot
+from .models import Dish, DishIngredient, DishType, Guest, HolidayEvent, Ingredient, ShoppingList
+from .popularity import adjust_popularity
+from .pricing import recalculate_dish_costs, recalculate_for_ingredients
+from .search import SEARCH_FIELDS, index_dishes, remove_dishes
+from .shopping import apply_vote_deltas, event_guests_delta, favorites_delta
+from .similarity import favorites_changed
+from .tags import sync_dish_tags
+
+FavoriteDish = Guest.favorite_dishes.through
+EventGuest = HolidayEvent.guests.through
+
+
+def _deleted_with_dish(origin):
+    """Строка рецепта удаляется каскадом вместе со своим блюдом"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Dish
+    return isinstance(origin, Dish)
+
+
+def _pairs(instance, reverse, pk_set):
+    """Пары (ключ прямой стороны, ключ обратной стороны) связи m2m"""
+    if reverse:
+        return [(pk, instance.pk) for pk in pk_set]
+    return [(instance.pk, pk) for pk in pk_set]
+
+
+@receiver(m2m_changed, sender=FavoriteDish)
+def favorite_dishes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчет голосов мероприятий при изменении любимых блюд гостя"""
+    if action in ('pre_remove', 'pre_clear'):
+        # post_remove получает запрошенные ключи, а post_clear — никаких,
+        # поэтому реально удаляемые связи запоминаем заранее
+        field = 'dish_id' if reverse else 'guest_id'
+        links = sender.objects.filter(**{field: instance.pk})
+        if pk_set:
+            links = links.filter(**{('guest_id' if reverse else 'dish_id') + '__in': pk_set})
+        instance._removed_favorites = list(links.values_list('guest_id', 'dish_id'))
+    elif action == 'post_add' and pk_set:
+        _apply_favorites(_pairs(instance, reverse, pk_set), 1)
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_removed_favorites', [])
+        instance._removed_favorites = []
+        _apply_favorites(removed, -1)
+
+
+def _apply_favorites(guest_dish_pairs, sign):
+    adjust_popularity(guest_dish_pairs, sign)
+    favorites_changed(guest_dish_pairs, sign)
+    deltas = favorites_delta(guest_dish_pairs, sign)
+    apply_vote_deltas(deltas)
+    invalidate_events(event_id for event_id, _ in deltas)
+
+
+@receiver(m2m_changed, sender=EventGuest)
+def event_guests_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчет голосов при добавлении и удалении гостей мероприятия"""
+    if action in ('pre_remove', 'pre_clear'):
+        field = 'guest_id' if reverse else 'holidayevent_id'
+        links = sender.objects.filter(**{field: instance.pk})
+        if pk_set:
+            links = links.filter(**{('holidayevent_id' if reverse else 'guest_id') + '__in': pk_set})
+        instance._removed_guests = list(links.values_list('holidayevent_id', 'guest_id'))
+    elif action == 'post_add' and pk_set:
+        _apply_guests(_pairs(instance, reverse, pk_set), 1)
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_removed_guests', [])
+        instance._removed_guests = []
+        _apply_guests(removed, -1)
+
+
+def _apply_guests(event_guest_pairs, sign):
+    apply_vote_deltas(event_guests_delta(event_guest_pairs, sign))
+    invalidate_events(event_id for event_id, _ in event_guest_pairs)
+
+
+@receiver(pre_delete, sender=Guest)
+def guest_deleted(sender, instance, **kwargs):
+    """Удаление гостя каскадом убирает его связи без m2m_changed"""
+    links = EventGuest.objects.filter(guest_id=instance.pk)
+    _apply_guests(list(links.values_list('holidayevent_id', 'guest_id')), -1)
+    favorites = list(FavoriteDish.objects.filter(guest_id=instance.pk).values_list('guest_id', 'dish_id'))
+    adjust_popularity(favorites, -1)
+    favorites_changed(favorites, -1)
+
+
+@receiver(post_save, sender=HolidayEvent)
+def event_saved(sender, instance, **kwargs):
+    """Количество гостей влияет на все расчеты мероприятия"""
+    invalidate_events([instance.id])
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DishType)
+@receiver(post_delete, sender=DishType)
+@receiver(post_save, sender=DishIngredient)
+@receiver(post_delete, sender=DishIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, origin=None, **kwargs):
+    """Изменение каталога, рецептов или цен сбрасывает версии всех мероприятий"""
+    if sender is DishIngredient and _deleted_with_dish(origin):
+        # Поколение сменит post_delete самого блюда
+        return
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DishType)
+@receiver(post_delete, sender=DishType)
+@receiver(post_save, sender=DishIngredient)
+@receiver(post_delete, sender=DishIngredient)
+def dishes_changed(sender, origin=None, update_fields=None, **kwargs):
+    """Снимок каталога для планировщика меню собирается заново"""
+    if sender is DishIngredient and _deleted_with_dish(origin):
+        return
+    if sender is Dish and update_fields and set(update_fields) <= set(Dish.COUNTER_FIELDS):
+        # Счетчики в снимок не входят
+        return
+    invalidate_catalog_snapshot()
+
+
+@receiver(post_save, sender=Dish)
+def dish_saved(sender, instance, update_fields=None, **kwargs):
+    """Название, описание и теги блюда попадают в полнотекстовый индекс"""
+    if update_fields is None or set(SEARCH_FIELDS) & set(update_fields):
+        index_dishes([instance.id])
+
+
+@receiver(post_save, sender=Dish)
+def dish_tags_saved(sender, instance, update_fields=None, **kwargs):
+    """Строка тегов раскладывается в таблицу тегов"""
+    if update_fields is None or 'tags' in update_fields:
+        sync_dish_tags([instance])
+
+
+@receiver(post_delete, sender=Dish)
+def dish_deleted(sender, instance, **kwargs):
+    remove_dishes([instance.id])
+
+
+@receiver(post_save, sender=DishIngredient)
+@receiver(post_delete, sender=DishIngredient)
+def recipe_changed(sender, instance, origin=None, **kwargs):
+    """Стоимость порции блюда пересчитывается при изменении рецепта"""
+    if _deleted_with_dish(origin):
+        # Блюдо удаляется целиком: пересчитывать нечего
+        return
+    recalculate_dish_costs([instance.dish_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, update_fields=None, **kwargs):
+    """Новая цена или единица ингредиента меняет стоимость блюд с ним"""
+    if update_fields is None or {'average_price', 'unit'} & set(update_fields):
+        recalculate_for_ingredients([instance.id])
+
+
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    """PDF удаленного списка (в том числе при удалении мероприятия) убираются с диска"""
+    transaction.on_commit(partial(remove_shopping_pdfs, instance.id))
@@ -0,0 +1,285 @@
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .generations import bump_generations, get_generation
+from .models import Guest
+
+SIMILARITY_GENERATION_KEY = 'menu:similarity:generation'
+SIMILARITY_DELTA_KEY = 'menu:similarity:delta:{}'
+
+# Сколько изменений воркер догоняет по журналу; при большем отставании
+# дешевле загрузить индекс заново
+MAX_REPLAY = 100
+
+# Сколько соседей хранится для каждого блюда
+TOP_NEIGHBORS = 20
+
+FavoriteDish = Guest.favorite_dishes.through
+
+_index = None
+_lock = threading.Lock()
+_reloading = False
+
+
+class SimilarityIndex:
+    """
+    Индекс похожих блюд «нравятся вместе»
+
+    Сходство — косинусная мера по матрице избранного гости × блюда:
+    число гостей, которым нравятся оба блюда, деленное на корень из
+    произведения их популярностей. Для каждого блюда хранятся только
+    top_n соседей парой массивов NumPy (id, оценка) по убыванию оценки.
+    Счетчики совместной встречаемости держатся рядом, чтобы изменения
+    избранного пересчитывали только затронутые строки.
+    """
+
+    def __init__(self, pairs, generation=None, top_n=TOP_NEIGHBORS):
+        self.generation = generation
+        self.top_n = top_n
+        self.counts = Counter()
+        self.co_counts = defaultdict(Counter)
+        self.neighbors = {}
+
+        favorites = defaultdict(list)
+        for guest_id, dish_id in pairs:
+            favorites[guest_id].append(dish_id)
+        for dishes in favorites.values():
+            self.counts.update(dishes)
+            for dish_id in dishes:
+                row = self.co_counts[dish_id]
+                for other_id in dishes:
+                    if other_id != dish_id:
+                        row[other_id] += 1
+
+        for dish_id in list(self.co_counts):
+            self._refresh(dish_id)
+
+    @classmethod
+    def load(cls, generation=None):
+        """Индекс по всей таблице избранного одним запросом"""
+        return cls(FavoriteDish.objects.values_list('guest_id', 'dish_id').iterator(chunk_size=5000), generation)
+
+    def _refresh(self, dish_id):
+        """Пересчет соседей одного блюда по счетчикам"""
+        import numpy as np
+
+        row = self.co_counts.get(dish_id)
+        count = self.counts.get(dish_id, 0)
+        if not row or count <= 0:
+            self.neighbors.pop(dish_id, None)
+            return
+
+        scores = (
+            (other_id, together / math.sqrt(count * self.counts[other_id]))
+            for other_id, together in row.items()
+            if self.counts.get(other_id, 0) > 0
+        )
+        top = heapq.nlargest(self.top_n, scores, key=lambda item: (item[1], -item[0]))
+        if not top:
+            self.neighbors.pop(dish_id, None)
+            return
+        # Кортеж заменяется целиком, поэтому читатели не видят строку наполовину
+        self.neighbors[dish_id] = (
+            np.fromiter((other_id for other_id, _ in top), dtype=np.int64, count=len(top)),
+            np.fromiter((score for _, score in top), dtype=np.float32, count=len(top)),
+        )
+
+    def apply(self, counts, pairs):
+        """
+        Инкрементальное обновление индекса
+
+        Args:
+            counts: изменения популярности {dish_id: delta}
+            pairs: изменения совместной встречаемости {(dish_id, other_id): delta}
+        """
+        affected = set(counts)
+        for dish_id, delta in counts.items():
+            self.counts[dish_id] += delta
+            if self.counts[dish_id] <= 0:
+                del self.counts[dish_id]
+
+        for (dish_id, other_id), delta in pairs.items():
+            row = self.co_counts[dish_id]
+            row[other_id] += delta
+            if row[other_id] <= 0:
+                del row[other_id]
+            if not row:
+                del self.co_counts[dish_id]
+            affected.update((dish_id, other_id))
+
+        # Популярность блюда входит в оценку всех его пар
+        for dish_id in counts:
+            affected.update(self.co_counts.get(dish_id, ()))
+        for dish_id in affected:
+            self._refresh(dish_id)
+
+    def similar(self, dish_ids, limit=10, allowed=None):
+        """
+        Похожие блюда для одного или нескольких блюд
+
+        Для нескольких блюд оценки соседей суммируются, сами блюда
+        из результата исключаются.
+
+        Args:
+            dish_ids: id блюд
+            limit: сколько соседей вернуть
+            allowed: допустимые id (например, индекс снимка каталога)
+
+        Returns:
+            Список (dish_id, оценка) по убыванию оценки
+        """
+        dish_ids = set(dish_ids)
+        scores = Counter()
+        for dish_id in dish_ids:
+            row = self.neighbors.get(dish_id)
+            if row is None:
+                continue
+            for other_id, score in zip(row[0].tolist(), row[1].tolist()):
+                if other_id not in dish_ids and (allowed is None or other_id in allowed):
+                    scores[other_id] += score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def similarity_generation():
+    """Поколение индекса похожих блюд: меняется при изменении избранного"""
+    return get_generation(SIMILARITY_GENERATION_KEY)
+
+
+def _apply_delta(counts, pairs):
+    # Поколение в базе общее для всех процессов: каждое изменение получает
+    # свой номер и записывается в журнал, по которому догоняют остальные
+    generation = bump_generations([SIMILARITY_GENERATION_KEY])[SIMILARITY_GENERATION_KEY]
+    caches['results'].set(SIMILARITY_DELTA_KEY.format(generation), (dict(counts), dict(pairs)))
+
+    with _lock:
+        index = _index
+        if index is not None and index.generation == generation - 1:
+            index.apply(counts, pairs)
+            index.generation = generation
+        # Иначе индекс отстал и догонит журнал при следующем обращении
+
+
+def _replay(index, generation):
+    """Догоняет индекс по журналу изменений; False, если журнал неполон"""
+    if index.generation is None or not 0 < generation - index.generation <= MAX_REPLAY:
+        return False
+    keys = [SIMILARITY_DELTA_KEY.format(number) for number in range(index.generation + 1, generation + 1)]
+    deltas = caches['results'].get_many(keys)
+    if len(deltas) != len(keys):
+        return False
+    for key in keys:
+        index.apply(*deltas[key])
+    index.generation = generation
+    return True
+
+
+def _load(generation):
+    index = SimilarityIndex.load(generation)
+    if similarity_generation() != generation:
+        # Изменение зафиксировано во время загрузки и могло в нее попасть:
+        # его дельта не должна примениться второй раз
+        index.generation = None
+    return index
+
+
+def _reload():
+    """Загрузка индекса заново; текущий индекс отдается, пока она идет"""
+    global _index, _reloading
+    try:
+        index = _load(similarity_generation())
+        with _lock:
+            # Индекс, который за время загрузки догнал то же поколение по журналу, остается
+            current = _index
+            if current is None or current.generation is None or current.generation != index.generation:
+                _index = index
+    finally:
+        _reloading = False
+
+
+def _reload_worker():
+    try:
+        _reload()
+    finally:
+        connection.close()
+
+
+def favorites_changed(guest_dish_pairs, sign):
+    """
+    Обновление индекса похожих блюд после изменения избранного
+
+    Вызывается, когда связи уже добавлены или удалены (для удаления
+    гостя — до каскадного удаления, тогда прочих блюд у гостя нет).
+    Текущее избранное затронутых гостей читается одним запросом, изменения
+    счетчиков применяются после фиксации транзакции и пишутся в журнал,
+    по которому остальные процессы догоняют новое поколение.
+
+    Args:
+        guest_dish_pairs: пары (guest_id, dish_id) добавленных/удаленных любимых блюд
+        sign: +1 для добавления, -1 для удаления
+    """
+    changed = defaultdict(set)
+    for guest_id, dish_id in guest_dish_pairs:
+        changed[guest_id].add(dish_id)
+    if not changed:
+        return
+
+    current = defaultdict(set)
+    for guest_id, dish_id in FavoriteDish.objects.filter(guest_id__in=list(changed)).values_list('guest_id', 'dish_id'):
+        current[guest_id].add(dish_id)
+
+    counts = Counter()
+    pairs = Counter()
+    for guest_id, dishes in changed.items():
+        others = current[guest_id] - dishes
+        for dish_id in dishes:
+            counts[dish_id] += sign
+            for other_id in others:
+                pairs[dish_id, other_id] += sign
+                pairs[other_id, dish_id] += sign
+            for other_id in dishes:
+                if other_id != dish_id:
+                    pairs[dish_id, other_id] += sign
+
+    transaction.on_commit(partial(_apply_delta, counts, pairs))
+
+
+def get_similarity_index():
+    """
+    Индекс похожих блюд текущего процесса
+
+    Пока поколение в базе не изменилось, поиск соседей обходится одним
+    запросом поколения по первичному ключу. Отставший воркер догоняет
+    изменения других процессов по журналу дельт в кэше results — это
+    один get_many без чтения таблицы избранного.
+
+    Журнал работает, только если кэш results общий для процессов
+    (FileBasedCache при DJANGO_CACHE_DIR, Redis, Memcached). С LocMemCache,
+    при вытеснении записей или отставании больше MAX_REPLAY изменений
+    индекс загружается заново в фоновом потоке, а запросы до конца загрузки
+    получают прежний индекс: соседи могут отставать на несколько изменений,
+    зато запрос не ждет полной перестройки. Синхронно индекс строится
+    только при первом обращении, когда отдавать еще нечего.
+    """
+    global _index, _reloading
+    generation = similarity_generation()
+    index = _index
+    if index is not None and index.generation == generation:
+        return index
+
+    with _lock:
+        index = _index
+        if index is None:
+            _index = _load(generation)
+            return _index
+        if index.generation == generation or _replay(index, generation) or _reloading:
+            return index
+        _reloading = True
+
+    threading.Thread(target=_reload_worker, daemon=True).start()
+    return index
@@ -0,0 +1,107 @@
+import re
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .models import Dish, Tag
+
+# Промежуточная таблица блюдо–тег: индекс по tag_id работает как
+# инвертированный индекс «тег → блюда»
+DishTag = Dish.tag_index.through
+
+TAG_MATCH_ANY = 'any'
+TAG_MATCH_ALL = 'all'
+
+
+def parse_tags(value):
+    """
+    Нормализованные теги из строки через запятую
+
+    Пробелы схлопываются, регистр приводится к нижнему, повторы убираются.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    tags = []
+    for tag in value or []:
+        tag = re.sub(r'\s+', ' ', tag).strip().casefold()[:Tag._meta.get_field('name').max_length]
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def sync_dish_tags(dishes):
+    """
+    Приведение таблицы тегов к строкам Dish.tags указанных блюд
+
+    Недостающие теги создаются одним bulk_create, связи добавляются
+    и удаляются пакетно.
+    """
+    wanted = {dish.id: set(parse_tags(dish.tags)) for dish in dishes}
+    if not wanted:
+        return
+
+    names = set().union(*wanted.values())
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    wanted = {dish_id: {tag_ids[name] for name in dish_tags} for dish_id, dish_tags in wanted.items()}
+
+    current = defaultdict(set)
+    stale = []
+    links = DishTag.objects.filter(dish_id__in=list(wanted)).values_list('id', 'dish_id', 'tag_id')
+    for link_id, dish_id, tag_id in links:
+        current[dish_id].add(tag_id)
+        if tag_id not in wanted[dish_id]:
+            stale.append(link_id)
+
+    if stale:
+        DishTag.objects.filter(id__in=stale).delete()
+    DishTag.objects.bulk_create([
+        DishTag(dish_id=dish_id, tag_id=tag_id)
+        for dish_id, dish_tags in wanted.items()
+        for tag_id in dish_tags - current[dish_id]
+    ])
+
+
+def filter_by_tags(queryset, tags, match=TAG_MATCH_ANY):
+    """
+    Блюда с любым (match='any') или со всеми (match='all') указанными тегами
+
+    Блюда выбираются подзапросом по индексу тегов, без поиска подстрок
+    в Dish.tags.
+    """
+    tags = parse_tags(tags)
+    if not tags:
+        return queryset
+
+    links = DishTag.objects.filter(tag__name__in=tags)
+    if match == TAG_MATCH_ALL:
+        links = (
+            links.values('dish_id')
+            .annotate(matched=Count('tag_id'))
+            .filter(matched=len(tags))
+        )
+    return queryset.filter(id__in=links.values('dish_id'))
+
+
+def tag_facets(queryset=None):
+    """
+    Количество блюд по тегам одним сгруппированным запросом
+
+    Args:
+        queryset: блюда, для которых считаются теги (по умолчанию все)
+
+    Returns:
+        Список {'tag': название, 'count': число блюд} по убыванию количества
+    """
+    links = DishTag.objects.all()
+    if queryset is not None:
+        links = links.filter(dish_id__in=queryset.order_by().values('id'))
+    return [
+        {'tag': name, 'count': count}
+        for name, count in (
+            links.values('tag__name')
+            .annotate(count=Count('dish_id'))
+            .order_by('-count', 'tag__name')
+            .values_list('tag__name', 'count')
+        )
+    ]
@@ -0,0 +1,1493 @@
+import base64
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from core.artifacts import shopping_pdf_path
+from core.autocomplete import PrefixIndex, dish_options_script, normalize
+from core.bulk_export import load_shopping_lists
+from core.cache import event_input_version, get_event_result
+from core.catalog import get_catalog, snapshot_generation
+from core.charts import (
+    _render_to_file, _reset_executor, cached_chart, chart_key, get_menu_chart, menu_chart_data, prune_chart_cache,
+    render_menu_analysis
+)
+from core.generations import bump_generations, get_generation
+from core.costs import (
+    DEFAULT_PRICE_FACTOR, UNIT_PRICE_FACTORS, calculate_costs, calculate_item_cost, describe_calculation
+)
+from core.importtime import heavy_modules_loaded, probe_import
+from core.menu_logic import MenuPlanner, PreferenceMatrix
+from core.menu_optimizer import coverage_menu, optimize_menu
+from core.models import (
+    Dish, DishIngredient, DishType, EventDishVote, Guest, HolidayEvent, Ingredient, ShoppingList
+)
+from core.similarity import (
+    SIMILARITY_GENERATION_KEY, SimilarityIndex, _reload, get_similarity_index, similarity_generation
+)
+from core.search import search_dishes
+from core.utils import EXCEL_COLUMN_WIDTHS, _excel_widths
+from core.tags import TAG_MATCH_ALL, filter_by_tags, parse_tags, tag_facets
+from core.shopping import (
+    aggregate_ingredients, apply_vote_deltas, build_shopping_list, get_coverage_dishes, save_shopping_list,
+    to_money, top_dish_ids
+)
+
+
+class LazyImportTests(SimpleTestCase):
+    """Тяжелые зависимости не должны загружаться при старте воркера"""
+
+    def test_views_do_not_import_heavy_modules(self):
+        report = probe_import('core.views')
+
+        self.assertIsNone(report['error'])
+        self.assertEqual(heavy_modules_loaded(report['modules']), [])
+
+    def test_views_do_not_import_pandas_or_matplotlib(self):
+        modules = {name.split('.')[0] for name in probe_import('core.views')['modules']}
+
+        self.assertNotIn('pandas', modules)
+        self.assertNotIn('matplotlib', modules)
+
+    def test_api_views_import(self):
+        report = probe_import('api.views')
+        modules = {name.split('.')[0] for name in report['modules']}
+
+        self.assertIsNone(report['error'])
+        self.assertNotIn('numpy', modules)
+        self.assertNotIn('pandas', modules)
+
+    def test_menu_logic_does_not_import_numpy_or_pandas(self):
+        report = probe_import('core.menu_logic')
+        modules = {name.split('.')[0] for name in report['modules']}
+
+        self.assertIsNone(report['error'])
+        self.assertNotIn('numpy', modules)
+        self.assertNotIn('pandas', modules)
+
+
+class MenuDataMixin:
+    """Небольшой каталог, мероприятие и гости для тестов расчетов"""
+
+    def create_dish(self, name, ingredients=(), dish_type=None, cooking_time=30, tags='', description=''):
+        dish = Dish.objects.create(
+            name=name,
+            description=description or name,
+            dish_type=dish_type,
+            cooking_time=cooking_time,
+            recipe='-',
+            tags=tags
+        )
+        for ingredient, quantity in ingredients:
+            DishIngredient.objects.create(dish=dish, ingredient=ingredient, quantity=quantity)
+        return dish
+
+    def create_event(self, number_of_guests=4):
+        return HolidayEvent.objects.create(name='Ужин', event_date='2026-12-31', number_of_guests=number_of_guests)
+
+    def create_guest(self, name, dishes=(), event=None):
+        guest = Guest.objects.create(name=name)
+        if event is not None:
+            event.guests.add(guest)
+        guest.favorite_dishes.add(*dishes)
+        return guest
+
+    def setUp(self):
+        super().setUp()
+        # Кэши и снимки процесса переживают откат транзакции теста
+        for alias in caches:
+            caches[alias].clear()
+        for name in ('core.catalog._snapshot', 'core.similarity._index'):
+            patcher = mock.patch(name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Графики меню не рендерятся в пуле процессов и не пишутся в MEDIA_ROOT
+        chart_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(chart_dir.cleanup)
+        settings_override = override_settings(CHART_CACHE_DIR=chart_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch('core.views.get_menu_chart', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(_reset_executor)
+        self.salad_type = DishType.objects.create(name='Салат')
+        self.hot_type = DishType.objects.create(name='Горячее')
+        self.potato = Ingredient.objects.create(name='Картофель', unit='g', average_price=60, category='Овощи')
+        self.egg = Ingredient.objects.create(name='Яйца', unit='pcs', average_price=10, category='Молочное')
+        self.oil = Ingredient.objects.create(name='Масло', unit='ml', average_price=200, category='Бакалея')
+        self.olivier = self.create_dish('Оливье', [(self.potato, 100), (self.egg, 1)], self.salad_type)
+        self.herring = self.create_dish('Сельдь под шубой', [(self.potato, 80), (self.oil, 10)], self.salad_type)
+        self.roast = self.create_dish('Жаркое', [(self.potato, 250), (self.oil, 20)], self.hot_type, 90)
+        self.omelette = self.create_dish('Омлет', [(self.egg, 2), (self.oil, 5)], self.hot_type, 15)
+
+
+class VoteEngineTests(MenuDataMixin, TestCase):
+    """Голоса мероприятий и сохраненный список покупок меняются по разнице"""
+
+    def assertVotesMatchFavorites(self, event):
+        expected = {}
+        for guest in event.guests.all():
+            for dish_id in guest.favorite_dishes.values_list('id', flat=True):
+                expected[dish_id] = expected.get(dish_id, 0) + 1
+        actual = dict(EventDishVote.objects.filter(event=event, votes__gt=0).values_list('dish_id', 'votes'))
+        self.assertEqual(actual, expected)
+        self.assertFalse(EventDishVote.objects.filter(event=event, votes__lte=0).exists())
+
+    def assertSavedListMatchesRebuild(self, event):
+        shopping_list = ShoppingList.objects.get(event=event)
+        saved = dict(shopping_list.items.values_list('ingredient_id', 'quantity_needed'))
+        rebuilt = {
+            ingredient_id: item['quantity']
+            for ingredient_id, item in build_shopping_list(event)['items'].items()
+        }
+        self.assertEqual(saved.keys(), rebuilt.keys())
+        for ingredient_id, quantity in rebuilt.items():
+            self.assertAlmostEqual(saved[ingredient_id], quantity)
+
+    def test_votes_follow_favorites_and_guests(self):
+        event = self.create_event()
+        anna = self.create_guest('Анна', [self.olivier, self.roast], event)
+        boris = self.create_guest('Борис', [self.olivier], event)
+        self.assertVotesMatchFavorites(event)
+
+        anna.favorite_dishes.remove(self.olivier)
+        boris.favorite_dishes.add(self.herring, self.omelette)
+        self.assertVotesMatchFavorites(event)
+
+        # Обратная сторона связи и clear() тоже учитываются
+        self.roast.favorited_by.clear()
+        self.assertVotesMatchFavorites(event)
+
+        event.guests.remove(boris)
+        self.assertVotesMatchFavorites(event)
+
+        event.guests.add(boris)
+        anna.delete()
+        self.assertVotesMatchFavorites(event)
+
+    def test_saved_list_follows_vote_changes(self):
+        event = self.create_event()
+        anna = self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+
+        anna.favorite_dishes.add(self.roast, self.omelette)
+        self.assertSavedListMatchesRebuild(event)
+
+        anna.favorite_dishes.remove(self.olivier)
+        self.assertSavedListMatchesRebuild(event)
+
+        # Без голосов список строится по блюдам каталога по умолчанию
+        event.guests.remove(anna)
+        self.assertSavedListMatchesRebuild(event)
+
+    def test_save_keeps_purchased_marks(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        shopping_list = save_shopping_list(event, result['items'], result['total_cost'])
+        shopping_list.items.filter(ingredient=self.egg).update(purchased=True)
+
+        save_shopping_list(event, result['items'], result['total_cost'])
+
+        self.assertTrue(shopping_list.items.get(ingredient=self.egg).purchased)
+        self.assertEqual(shopping_list.items.count(), 2)
+
+
+    def test_incremental_update_reprices_all_items(self):
+        event = self.create_event()
+        anna = self.create_guest('Анна', [self.olivier, self.herring], event)
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+        # Меняется цена яиц, а яйца не входят в блюда, которые меняются в меню
+        Ingredient.objects.filter(id=self.egg.id).update(average_price=25)
+
+        anna.favorite_dishes.add(self.roast)
+
+        shopping_list = ShoppingList.objects.get(event=event)
+        rebuilt = build_shopping_list(event)
+        self.assertEqual(shopping_list.total_cost, to_money(rebuilt['total_cost']))
+        self.assertEqual(
+            dict(shopping_list.items.values_list('ingredient_id', 'estimated_cost')),
+            {ingredient_id: to_money(item['estimated_cost']) for ingredient_id, item in rebuilt['items'].items()}
+        )
+
+    def test_shopping_list_locked_before_reading_top(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+        calls = []
+        select_for_update = type(ShoppingList.objects.all()).select_for_update
+
+        def locking(queryset, *args, **kwargs):
+            if queryset.model is ShoppingList:
+                calls.append('lock')
+            return select_for_update(queryset, *args, **kwargs)
+
+        def reading_top(event_id, *args, **kwargs):
+            calls.append('top')
+            return top_dish_ids(event_id, *args, **kwargs)
+
+        with mock.patch.object(type(ShoppingList.objects.all()), 'select_for_update', locking), \
+                mock.patch('core.shopping.top_dish_ids', side_effect=reading_top):
+            apply_vote_deltas({(event.id, self.roast.id): 1})
+
+        self.assertEqual(calls, ['lock', 'top', 'top'])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentVoteTests(MenuDataMixin, TransactionTestCase):
+    """Параллельные изменения голосов не применяют одну разницу дважды"""
+
+    def test_parallel_votes_for_entering_dish(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def vote():
+            try:
+                barrier.wait()
+                apply_vote_deltas({(event.id, self.roast.id): 1})
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        saved = dict(ShoppingList.objects.get(event=event).items.values_list('ingredient_id', 'quantity_needed'))
+        rebuilt = build_shopping_list(event)['items']
+        self.assertEqual(saved.keys(), rebuilt.keys())
+        for ingredient_id, item in rebuilt.items():
+            self.assertAlmostEqual(saved[ingredient_id], item['quantity'])
+
+
+class EventVersionTests(MenuDataMixin, TestCase):
+    """Версия входных данных мероприятия хранится в базе и общая для воркеров"""
+
+    def setUp(self):
+        super().setUp()
+        self.event = self.create_event()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.anna = self.create_guest('Анна', [self.olivier], self.event)
+
+    def test_version_changes_with_event_inputs(self):
+        versions = {event_input_version(self.event)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.anna.favorite_dishes.add(self.roast)
+        versions.add(event_input_version(self.event))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.guests.add(Guest.objects.create(name='Борис'))
+        versions.add(event_input_version(self.event))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.potato.average_price = 80
+            self.potato.save()
+        versions.add(event_input_version(self.event))
+
+        self.assertEqual(len(versions), 4)
+
+    def test_unrelated_event_keeps_version(self):
+        other = self.create_event()
+        version = event_input_version(other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.anna.favorite_dishes.add(self.roast)
+
+        self.assertEqual(event_input_version(other), version)
+
+    def test_rollback_keeps_version(self):
+        version = event_input_version(self.event)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.anna.favorite_dishes.add(self.roast)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(event_input_version(self.event), version)
+
+    def test_result_recomputed_after_change_in_other_process(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_event_result(self.event, 'menu', compute), 1)
+        self.assertEqual(get_event_result(self.event, 'menu', compute), 1)
+
+        # Другой воркер меняет поколение в базе, локальный кэш об этом не знает
+        bump_generations([f'menu:event:{self.event.id}'])
+
+        self.assertEqual(get_event_result(self.event, 'menu', compute), 2)
+
+    def test_bumps_are_sequential(self):
+        first = bump_generations(['test'])['test']
+        second = bump_generations(['test'])['test']
+
+        self.assertEqual(second, first + 1)
+        self.assertEqual(get_generation('test'), second)
+
+
+class DishCostTests(MenuDataMixin, TestCase):
+    """Стоимость порции блюда поддерживается при изменении рецепта и цен"""
+
+    def expected_cost(self, dish):
+        return sum(
+            calculate_item_cost(row.quantity, row.ingredient.unit, row.ingredient.average_price)
+            for row in dish.ingredients_list.select_related('ingredient')
+        )
+
+    def assertCostCurrent(self, dish):
+        dish.refresh_from_db()
+        self.assertAlmostEqual(float(dish.cost_per_serving), self.expected_cost(dish), places=3)
+
+    def test_cost_follows_recipe_and_prices(self):
+        self.assertCostCurrent(self.olivier)
+
+        DishIngredient.objects.create(dish=self.olivier, ingredient=self.oil, quantity=15)
+        self.assertCostCurrent(self.olivier)
+
+        self.egg.average_price = Decimal('12.50')
+        self.egg.save()
+        self.assertCostCurrent(self.olivier)
+        self.assertCostCurrent(self.omelette)
+
+        self.olivier.ingredients_list.get(ingredient=self.potato).delete()
+        self.assertCostCurrent(self.olivier)
+
+    def test_dish_delete_skips_recipe_recalculation(self):
+        with mock.patch('core.signals.recalculate_dish_costs') as recalculate:
+            self.roast.delete()
+            Dish.objects.filter(id=self.herring.id).delete()
+
+        recalculate.assert_not_called()
+
+    def test_migration_matches_cost_engine(self):
+        migration = importlib.import_module('core.migrations.0003_cost_per_serving')
+        Dish.objects.update(cost_per_serving=0)
+
+        migration.fill_costs_per_serving(apps, None)
+
+        for dish in (self.olivier, self.herring, self.roast, self.omelette):
+            self.assertCostCurrent(dish)
+
+
+class ShoppingListPageTests(MenuDataMixin, TestCase):
+    """GET списка покупок ничего не пишет и отвечает 304 только на ту же страницу"""
+
+    def setUp(self):
+        super().setUp()
+        self.event = self.create_event()
+        self.create_guest('Анна', [self.olivier, self.roast], self.event)
+        self.url = f'/event/{self.event.id}/shopping/'
+
+    def test_get_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertFalse(ShoppingList.objects.filter(event=self.event).exists())
+
+    def test_unchanged_page_revalidates(self):
+        response = self.client.get(self.url)
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_save_then_revalidate_returns_new_page(self):
+        before = self.client.get(self.url)
+        self.assertNotContains(before, '/shopping/pdf/')
+
+        self.client.post(self.url)
+        after = self.client.get(self.url, HTTP_IF_NONE_MATCH=before['ETag'])
+
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertContains(after, '/shopping/pdf/')
+        self.assertContains(after, 'Обновить сохраненный список')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=after['ETag']).status_code, 304)
+
+    def test_changed_inputs_return_new_page(self):
+        response = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_guest('Борис', [self.omelette], self.event)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_other_client_does_not_reuse_etag(self):
+        response = self.client.get(self.url)
+
+        other = self.client_class()
+        revalidated = other.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(revalidated.status_code, 200)
+
+
+class PopularityTests(MenuDataMixin, TestCase):
+    """Популярность блюда — число гостей, выбравших его"""
+
+    def test_counter_follows_favorites(self):
+        anna = self.create_guest('Анна', [self.olivier, self.roast])
+        self.create_guest('Борис', [self.olivier])
+        anna.favorite_dishes.remove(self.roast)
+
+        self.olivier.refresh_from_db()
+        self.roast.refresh_from_db()
+        self.assertEqual(self.olivier.popularity_score, 2)
+        self.assertEqual(self.roast.popularity_score, 0)
+
+    def test_full_save_keeps_counter(self):
+        stale = Dish.objects.get(id=self.olivier.id)
+        self.create_guest('Анна', [self.olivier])
+
+        stale.name = 'Оливье с курицей'
+        stale.save()
+
+        self.olivier.refresh_from_db()
+        self.assertEqual(self.olivier.name, 'Оливье с курицей')
+        self.assertEqual(self.olivier.popularity_score, 1)
+
+    def test_explicit_counter_save(self):
+        self.olivier.popularity_score = 5
+        self.olivier.save(update_fields=['popularity_score'])
+
+        self.olivier.refresh_from_db()
+        self.assertEqual(self.olivier.popularity_score, 5)
+
+
+def brute_force_menu(values, times, groups, max_dishes, max_time, per_group):
+    """Лучшая сумма оценок перебором всех подмножеств"""
+    best = 0.0
+    for size in range(1, max_dishes + 1):
+        for subset in itertools.combinations(range(len(values)), size):
+            if sum(times[i] for i in subset) > max_time:
+                continue
+            if per_group is not None:
+                counts = {}
+                for i in subset:
+                    if groups[i] is not None:
+                        counts[groups[i]] = counts.get(groups[i], 0) + 1
+                if any(count > per_group for count in counts.values()):
+                    continue
+            best = max(best, sum(values[i] for i in subset))
+    return best
+
+
+class MenuOptimizerTests(SimpleTestCase):
+    """Рюкзак по времени с ограничением на типы против полного перебора"""
+
+    def check_solution(self, selected, times, groups, max_dishes, max_time, per_group):
+        self.assertLessEqual(len(selected), max_dishes)
+        self.assertLessEqual(sum(times[i] for i in selected), max_time)
+        if per_group is not None:
+            for group in {groups[i] for i in selected if groups[i] is not None}:
+                self.assertLessEqual(sum(1 for i in selected if groups[i] == group), per_group)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(60):
+            size = rng.randint(1, 10)
+            values = [round(rng.uniform(0, 5), 2) for _ in range(size)]
+            times = [rng.randint(5, 120) for _ in range(size)]
+            groups = [rng.choice(['салат', 'горячее', 'десерт', None]) for _ in range(size)]
+            max_dishes = rng.randint(1, 5)
+            max_time = rng.randint(30, 300)
+            per_group = rng.choice([1, 2, None])
+
+            selected, finished = optimize_menu(
+                values, times, groups, max_dishes, max_time, per_group, time_limit=5, max_buckets=max_time
+            )
+
+            self.assertTrue(finished)
+            self.check_solution(selected, times, groups, max_dishes, max_time, per_group)
+            self.assertAlmostEqual(
+                sum(values[i] for i in selected),
+                brute_force_menu(values, times, groups, max_dishes, max_time, per_group)
+            )
+
+    def test_coarse_buckets_stay_within_budget(self):
+        rng = random.Random(11)
+        values = [rng.uniform(0, 5) for _ in range(300)]
+        times = [rng.randint(1, 240) for _ in range(300)]
+        groups = [rng.randint(1, 8) for _ in range(300)]
+
+        selected, _ = optimize_menu(values, times, groups, 8, 600, 1, max_buckets=50)
+
+        self.check_solution(selected, times, groups, 8, 600, 1)
+
+    def test_time_limit_returns_greedy_solution(self):
+        values = [3, 2, 1]
+        times = [100, 60, 60]
+        groups = [None, None, None]
+
+        selected, finished = optimize_menu(values, times, groups, 2, 120, None, time_limit=0)
+
+        self.assertFalse(finished)
+        self.assertEqual(selected, [0])
+
+
+class BalancedMenuTests(MenuDataMixin, TestCase):
+    """Оптимизатор меню подключен к странице меню и к MenuPlanner"""
+
+    def test_menu_page_balanced_mode(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier, self.herring, self.roast, self.omelette], event)
+        self.create_guest('Борис', [self.olivier, self.roast], event)
+
+        response = self.client.get(f'/event/{event.id}/menu/', {'mode': 'balanced', 'max_time': 60})
+
+        self.assertEqual(response.status_code, 200)
+        dishes = [dish for dish, _ in response.context['popular_dishes']]
+        # Жаркое (90 мин) не помещается, из салатов берется один — самый любимый
+        self.assertEqual(dishes, [self.olivier, self.omelette])
+        self.assertEqual(response.context['total_time'], 45)
+
+    def test_planner_accepts_plain_list(self):
+        self.olivier.popularity_score = 3
+        self.olivier.save(update_fields=['popularity_score'])
+        dishes = list(Dish.objects.all())
+
+        suggestions = MenuPlanner([], dishes).suggest_menu(max_dishes=2)
+
+        self.assertEqual(len(suggestions), 2)
+        self.assertEqual(suggestions[0]['dish'], self.olivier)
+
+    def test_planner_respects_constraints(self):
+        anna = self.create_guest('Анна', [self.olivier, self.herring, self.roast, self.omelette])
+        boris = self.create_guest('Борис', [self.herring, self.roast])
+
+        suggestions = MenuPlanner([anna, boris]).suggest_menu(max_dishes=3, max_cooking_time=100)
+
+        dishes = [suggestion['dish'] for suggestion in suggestions]
+        self.assertLessEqual(sum(dish.cooking_time for dish in dishes), 100)
+        self.assertEqual(len({dish.dish_type_id for dish in dishes}), len(dishes))
+        self.assertIn(self.herring, dishes)
+
+
+def covered_guests(guest_sets, keys, min_favorites):
+    """Число гостей, у которых среди keys не меньше min_favorites любимых блюд"""
+    guests = set().union(*(
+        {bit for bit in range(guest_sets[key].bit_length()) if guest_sets[key] >> bit & 1} for key in keys
+    )) if keys else set()
+    return sum(
+        1 for guest in guests
+        if sum(guest_sets[key] >> guest & 1 for key in keys) >= min_favorites
+    )
+
+
+def naive_greedy(guest_sets, max_dishes, min_favorites):
+    """Жадный отбор с полным пересчетом выигрыша на каждом шаге"""
+    selected = []
+    for _ in range(max_dishes):
+        base = covered_guests(guest_sets, selected, min_favorites)
+        best, best_gain = None, 0
+        for key in guest_sets:
+            if key in selected:
+                continue
+            gain = covered_guests(guest_sets, selected + [key], min_favorites) - base
+            if gain > best_gain:
+                best, best_gain = key, gain
+        if best is None:
+            break
+        selected.append(best)
+    return selected
+
+
+class CoverageMenuTests(SimpleTestCase):
+    """Ленивый жадный отбор по покрытию гостей"""
+
+    def random_sets(self, rng, dishes, guests):
+        return {dish: rng.getrandbits(guests) & rng.getrandbits(guests) for dish in range(dishes)}
+
+    def test_matches_naive_greedy(self):
+        rng = random.Random(5)
+        for _ in range(50):
+            guest_sets = self.random_sets(rng, rng.randint(1, 12), rng.randint(1, 20))
+            max_dishes = rng.randint(1, 6)
+
+            selected, covered = coverage_menu(guest_sets, max_dishes)
+
+            self.assertEqual(selected, naive_greedy(guest_sets, max_dishes, 1))
+            self.assertEqual(covered, covered_guests(guest_sets, selected, 1))
+
+    def test_close_to_optimum(self):
+        rng = random.Random(9)
+        for _ in range(30):
+            guest_sets = self.random_sets(rng, rng.randint(1, 9), rng.randint(1, 16))
+            max_dishes = rng.randint(1, 4)
+
+            _, covered = coverage_menu(guest_sets, max_dishes)
+
+            best = max(
+                covered_guests(guest_sets, list(keys), 1)
+                for size in range(max_dishes + 1)
+                for keys in itertools.combinations(guest_sets, size)
+            )
+            # Гарантия жадного алгоритма для покрытия: не хуже (1 - 1/e) оптимума
+            self.assertGreaterEqual(covered, best * (1 - 1 / 2.718281828))
+
+    def test_min_favorites(self):
+        guest_sets = {'a': 0b011, 'b': 0b110, 'c': 0b001}
+
+        selected, covered = coverage_menu(guest_sets, 3, min_favorites=2)
+
+        self.assertEqual(covered, covered_guests(guest_sets, selected, 2))
+        self.assertEqual(covered, 2)
+
+    def test_stops_when_nothing_to_gain(self):
+        selected, covered = coverage_menu({'a': 0b11, 'b': 0b01, 'c': 0}, 5)
+
+        self.assertEqual(selected, ['a'])
+        self.assertEqual(covered, 2)
+
+
+class CoverageDishesTests(MenuDataMixin, TestCase):
+    """Меню по покрытию гостей мероприятия"""
+
+    def test_covers_every_guest(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier, self.herring], event)
+        self.create_guest('Борис', [self.olivier], event)
+        self.create_guest('Вера', [self.roast], event)
+        # Гость другого мероприятия не учитывается
+        self.create_guest('Глеб', [self.omelette])
+
+        dishes, covered = get_coverage_dishes(event, limit=2)
+
+        self.assertEqual(dishes, [self.olivier, self.roast])
+        self.assertEqual([dish.votes for dish in dishes], [2, 1])
+        self.assertEqual(covered, 3)
+
+    def test_menu_page_coverage_mode(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier, self.herring], event)
+        self.create_guest('Борис', [self.herring], event)
+
+        response = self.client.get(f'/event/{event.id}/menu/', {'mode': 'coverage', 'min_favorites': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['covered_guests'], 1)
+
+
+class ChartCacheTests(SimpleTestCase):
+    """Рендер графиков меню и ограничение их дискового кэша"""
+
+    def menu_dishes(self):
+        salad = DishType(name='Салат')
+        return [
+            {'dish': Dish(name='Оливье', dish_type=salad, difficulty='easy', cooking_time=30, popularity_score=3)},
+            {'dish': Dish(name='Жаркое', dish_type=None, difficulty='hard', cooking_time=90, popularity_score=1)},
+        ]
+
+    def menu_data(self):
+        return menu_chart_data(self.menu_dishes())
+
+    def test_menu_chart_data(self):
+        data = self.menu_data()
+
+        self.assertEqual(data['types'], [('Другое', 1), ('Салат', 1)])
+        self.assertEqual(data['difficulties'], [('easy', 1), ('hard', 1)])
+        self.assertEqual(data['cooking_times'], [30, 90])
+        self.assertEqual(chart_key(data), chart_key(self.menu_data()))
+
+    def test_render_menu_analysis(self):
+        image = base64.b64decode(render_menu_analysis(self.menu_data()))
+
+        self.assertTrue(image.startswith(b'\x89PNG'))
+
+    def test_rendered_chart_is_served_from_cache(self):
+        data = self.menu_data()
+        with tempfile.TemporaryDirectory() as root, override_settings(CHART_CACHE_DIR=root):
+            self.assertIsNone(cached_chart(data))
+
+            path = os.path.join(root, chart_key(data)[:2], f'{chart_key(data)}.b64')
+            image = _render_to_file(data, path, max_files=10, ttl=3600)
+
+            self.assertEqual(cached_chart(data), image)
+            # Готовый график отдается без обращения к пулу процессов
+            with mock.patch('core.charts.schedule_chart') as schedule:
+                self.assertEqual(get_menu_chart(self.menu_dishes()), image)
+            schedule.assert_not_called()
+
+    def write_chart(self, root, name, age):
+        directory = os.path.join(root, name[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{name}.b64')
+        with open(path, 'w') as chart:
+            chart.write('png')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_prune_by_count_and_age(self):
+        with tempfile.TemporaryDirectory() as root:
+            newest = self.write_chart(root, 'aa01', 10)
+            recent = self.write_chart(root, 'bb02', 20)
+            older = self.write_chart(root, 'aa03', 30)
+            expired = self.write_chart(root, 'cc04', 1000)
+
+            prune_chart_cache(root, max_files=2, ttl=500)
+
+            self.assertTrue(os.path.exists(newest))
+            self.assertTrue(os.path.exists(recent))
+            self.assertFalse(os.path.exists(older))
+            self.assertFalse(os.path.exists(expired))
+
+
+class CatalogSnapshotTests(MenuDataMixin, TestCase):
+    """Поколение снимка каталога хранится в базе, популярность в снимок не входит"""
+
+    def test_favorites_do_not_invalidate_snapshot(self):
+        catalog = get_catalog()
+        generation = snapshot_generation()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            guest = self.create_guest('Анна', [self.olivier, self.roast])
+            guest.favorite_dishes.remove(self.roast)
+
+        self.assertEqual(snapshot_generation(), generation)
+        self.assertIs(get_catalog(), catalog)
+
+    def test_dish_change_reloads_snapshot(self):
+        catalog = get_catalog()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.roast.cooking_time = 120
+            self.roast.save()
+
+        reloaded = get_catalog()
+        self.assertIsNot(reloaded, catalog)
+        self.assertEqual(reloaded.cooking_times[reloaded.index[self.roast.id]], 120)
+
+    def test_reloads_after_bump_in_another_process(self):
+        catalog = get_catalog()
+        Dish.objects.filter(id=self.roast.id).update(name='Жаркое по-домашнему')
+
+        # Другой воркер меняет поколение напрямую в базе
+        bump_generations(['menu:catalog:snapshot'])
+
+        reloaded = get_catalog()
+        self.assertEqual(reloaded.names[reloaded.index[self.roast.id]], 'Жаркое по-домашнему')
+        self.assertEqual(catalog.names[catalog.index[self.roast.id]], 'Жаркое')
+
+
+class ShoppingPdfTests(MenuDataMixin, TestCase):
+    """PDF списка покупок отдается с диска и переживает удаление файла"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.event = self.create_event()
+        self.create_guest('Анна', [self.olivier], self.event)
+        result = build_shopping_list(self.event)
+        save_shopping_list(self.event, result['items'], result['total_cost'])
+        self.url = f'/event/{self.event.id}/shopping/pdf/'
+
+    def test_export(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_delete_removes_files(self):
+        self.client.get(self.url)
+        shopping_list = ShoppingList.objects.get(event=self.event)
+        directory = os.path.dirname(shopping_pdf_path(shopping_list))
+        self.assertTrue(os.listdir(directory))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.delete()
+
+        self.assertFalse(os.path.exists(directory))
+
+    def test_file_removed_before_open(self):
+        with mock.patch('core.artifacts.build_shopping_pdf', return_value='/nonexistent/shopping.pdf') as build:
+            response = self.client.get(self.url)
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class ApiTests(MenuDataMixin, TestCase):
+    """REST API подключен к URL и сериализует модели"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('organizer'))
+
+    def test_anonymous_read_only(self):
+        self.client.logout()
+
+        self.assertEqual(self.client.get('/api/dishes/').status_code, 200)
+        self.assertEqual(self.client.post('/api/guests/', {'name': 'Анна'}).status_code, 403)
+        self.assertEqual(self.client.get('/api/events/export/', {'file_format': 'csv'}).status_code, 403)
+
+    def test_dish_list(self):
+        response = self.client.get('/api/dishes/', {'dish_type': self.salad_type.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(dish['name'], dish['dish_type_name']) for dish in response.json()],
+            [('Оливье', 'Салат'), ('Сельдь под шубой', 'Салат')]
+        )
+
+    def test_create_guest_with_favorites(self):
+        response = self.client.post(
+            '/api/guests/',
+            {'name': 'Анна', 'favorite_dishes': [self.olivier.id, self.roast.id]},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.olivier.refresh_from_db()
+        self.assertEqual(self.olivier.popularity_score, 1)
+
+    def test_dish_update_keeps_counters(self):
+        self.create_guest('Анна', [self.olivier])
+
+        response = self.client.patch(
+            f'/api/dishes/{self.olivier.id}/',
+            {'cooking_time': 40, 'popularity_score': 100},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.olivier.refresh_from_db()
+        self.assertEqual(self.olivier.cooking_time, 40)
+        self.assertEqual(self.olivier.popularity_score, 1)
+
+    def test_statistics(self):
+        self.create_guest('Анна', [self.roast])
+
+        stats = self.client.get('/api/dishes/statistics/').json()
+
+        self.assertEqual(stats['total_dishes'], 4)
+        self.assertEqual(stats['type_distribution'], {'Салат': 2, 'Горячее': 2})
+        self.assertEqual(stats['top_popular'][0], {'name': 'Жаркое', 'popularity_score': 1.0})
+
+    def test_statistics_follow_favorites_and_catalog(self):
+        self.client.get('/api/dishes/statistics/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_guest('Анна', [self.herring])
+        stats = self.client.get('/api/dishes/statistics/').json()
+        self.assertEqual(stats['top_popular'][0]['name'], 'Сельдь под шубой')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_dish('Салат из капусты', dish_type=self.salad_type)
+        stats = self.client.get('/api/dishes/statistics/').json()
+        self.assertEqual(stats['type_distribution'], {'Салат': 3, 'Горячее': 2})
+
+    def test_statistics_cache_expires(self):
+        with mock.patch('api.views.cache.set') as cache_set:
+            self.client.get('/api/dishes/statistics/')
+
+        self.assertIsNotNone(cache_set.call_args.args[2])
+
+    def test_event_shopping_list(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        url = f'/api/events/{event.id}/shopping_list/'
+
+        self.assertEqual(self.client.get(url).json(), {'error': 'Список покупок не найден'})
+
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+        data = self.client.get(url).json()
+
+        self.assertEqual(data['event'], 'Ужин')
+        self.assertEqual(sorted(data['categories']), ['Молочное', 'Овощи'])
+
+    def test_export(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        save_shopping_list(event, result['items'], result['total_cost'])
+
+        response = self.client.get('/api/events/export/', {'file_format': 'csv', 'date_from': '2026-12-01'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Export-Events'], '1')
+        self.assertIn('Картофель', b''.join(response.streaming_content).decode('utf-8-sig'))
+
+    def test_export_validation(self):
+        self.assertEqual(self.client.get('/api/events/export/', {'file_format': 'doc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/events/export/', {'date_from': '31.12.2026'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/events/export/', {'date_from': '2030-01-01'}).status_code, 404)
+
+    def export_zip(self, fmt):
+        response = self.client.get('/api/events/export/', {'file_format': fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_export_zip(self):
+        first = self.create_event()
+        self.create_guest('Анна', [self.olivier], first)
+        second = HolidayEvent.objects.create(name='Новый год', event_date='2026-12-31', number_of_guests=2)
+
+        for fmt, signature in (('pdf', b'%PDF'), ('xlsx', b'PK')):
+            with self.subTest(fmt=fmt), self.export_zip(fmt) as archive:
+                self.assertEqual(archive.namelist(), [
+                    f'2026-12-31_{first.id}_ужин.{fmt}',
+                    f'2026-12-31_{second.id}_новый-год.{fmt}',
+                ])
+                for name in archive.namelist():
+                    self.assertTrue(archive.read(name).startswith(signature))
+
+
+class BulkExportTests(MenuDataMixin, TestCase):
+    """Пакетная выгрузка берет сохраненный список покупок, если он есть"""
+
+    def test_saved_list_exported(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+        result = build_shopping_list(event)
+        shopping_list = save_shopping_list(event, result['items'], result['total_cost'])
+        shopping_list.items.filter(ingredient=self.egg).update(purchased=True)
+        saved_costs = dict(shopping_list.items.values_list('ingredient__name', 'estimated_cost'))
+        Ingredient.objects.filter(pk=self.potato.pk).update(average_price=1000)
+
+        (_, exported, items, dishes_by_ingredient), = load_shopping_lists([event])
+
+        self.assertEqual(exported.pk, shopping_list.pk)
+        self.assertEqual({item.ingredient.name: item.estimated_cost for item in items}, saved_costs)
+        self.assertEqual([item.purchased for item in items], [True, False])
+        self.assertEqual(dishes_by_ingredient[self.potato.id], ['Оливье'])
+
+    def test_unsaved_list_computed(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+
+        (_, shopping_list, items, _), = load_shopping_lists([event])
+
+        self.assertIsNone(shopping_list.pk)
+        self.assertEqual([item.ingredient.name for item in items], ['Яйца', 'Картофель'])
+
+
+class IntersectionsApiTests(MenuDataMixin, TestCase):
+    """Пересечения предпочтений принимают список идентификаторов: чисел или строк с числами"""
+
+    url = '/api/dishes/find_intersections/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('organizer'))
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def test_intersections(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier, self.roast], event)
+        self.create_guest('Борис', [self.olivier], event)
+        self.create_guest('Вера', [self.roast])
+
+        response = self.post({'dish_ids': [self.olivier.id, self.roast.id, self.olivier.id], 'event_id': event.id})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([dish['guest_count'] for dish in data['dishes']], [2, 1])
+        self.assertEqual([guest['name'] for guest in data['common_guests']], ['Анна'])
+        self.assertEqual(data['co_occurrence']['matrix'], [[2, 1], [1, 1]])
+
+    def test_numeric_strings_accepted(self):
+        event = self.create_event()
+        self.create_guest('Анна', [self.olivier], event)
+
+        response = self.post({'dish_ids': [str(self.olivier.id), self.olivier.id], 'event_id': str(event.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dish['guest_count'] for dish in response.json()['dishes']], [1])
+
+    def test_rejects_invalid_ids(self):
+        for data in (
+            {'dish_ids': '12'},
+            {'dish_ids': 12},
+            {'dish_ids': ['abc']},
+            {'dish_ids': [1.5]},
+            {'dish_ids': [True]},
+            {'dish_ids': [None]},
+            {'dish_ids': None},
+            {'dish_ids': [self.olivier.id], 'event_id': 'abc'},
+            {'dish_ids': []},
+            {},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+
+
+class SimilarityIndexTests(MenuDataMixin, TestCase):
+    """Индекс похожих блюд обновляется инкрементально по поколению в базе"""
+
+    def neighbors(self, index):
+        return {dish_id: index.similar([dish_id], limit=10) for dish_id in index.neighbors}
+
+    def test_incremental_update_matches_reload(self):
+        anna = self.create_guest('Анна', [self.olivier, self.roast])
+        self.create_guest('Борис', [self.olivier, self.herring])
+        index = get_similarity_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            anna.favorite_dishes.add(self.herring)
+            anna.favorite_dishes.remove(self.roast)
+            self.create_guest('Вера', [self.roast, self.omelette])
+
+        self.assertIs(get_similarity_index(), index)
+        fresh = SimilarityIndex.load()
+        self.assertEqual(self.neighbors(index), self.neighbors(fresh))
+        self.assertEqual(dict(index.counts), dict(fresh.counts))
+
+    def test_replays_changes_from_another_process(self):
+        self.create_guest('Анна', [self.olivier, self.roast])
+        index = get_similarity_index()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_guest('Борис', [self.olivier, self.herring])
+            self.create_guest('Вера', [self.herring, self.omelette])
+        # Другой воркер (без индекса в памяти) сменил поколение и записал дельты в журнал
+        with mock.patch('core.similarity._index', None):
+            for callback in callbacks:
+                callback()
+
+        with mock.patch.object(SimilarityIndex, 'load') as load:
+            self.assertIs(get_similarity_index(), index)
+        load.assert_not_called()
+        self.assertEqual(index.generation, similarity_generation())
+        self.assertEqual(self.neighbors(index), self.neighbors(SimilarityIndex.load()))
+
+    def test_reloads_in_background_without_log(self):
+        self.create_guest('Анна', [self.olivier, self.roast])
+        index = get_similarity_index()
+
+        # Другой воркер сменил поколение, журнала изменений нет (LocMemCache)
+        self.create_guest('Борис', [self.olivier, self.herring])
+        bump_generations([SIMILARITY_GENERATION_KEY])
+
+        with mock.patch('core.similarity.threading.Thread') as thread:
+            self.assertIs(get_similarity_index(), index)
+            self.assertIs(get_similarity_index(), index)
+        thread.assert_called_once()
+        self.assertEqual([dish_id for dish_id, _ in index.similar([self.olivier.id])], [self.roast.id])
+
+        # Загрузка из фонового потока
+        _reload()
+        reloaded = get_similarity_index()
+        self.assertIsNot(reloaded, index)
+        self.assertEqual([dish_id for dish_id, _ in reloaded.similar([self.olivier.id])], [self.herring.id, self.roast.id])
+
+    def test_similar_endpoint(self):
+        self.create_guest('Анна', [self.olivier, self.roast])
+        self.create_guest('Борис', [self.olivier, self.roast, self.herring])
+
+        response = self.client.get('/api/dishes/similar/', {'dish_ids': str(self.olivier.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dish['name'] for dish in response.json()['similar']], ['Жаркое', 'Сельдь под шубой'])
+
+
+class SearchTests(MenuDataMixin, TestCase):
+    """Полнотекстовый поиск блюд по индексу core_dish_search"""
+
+    def search(self, text):
+        return [dish.name for dish in search_dishes(Dish.objects.all(), text)]
+
+    def test_prefix_words_and_yo(self):
+        self.create_dish('Салат с свёклой', description='Свекла и чеснок', tags='овощи')
+
+        self.assertEqual(self.search('свекл'), ['Салат с свёклой'])
+        self.assertEqual(self.search('СВЁК чесн'), ['Салат с свёклой'])
+        self.assertEqual(self.search('свекла картофель'), [])
+
+    def test_name_ranks_above_description(self):
+        self.create_dish('Шарлотка', description='Пирог с яблоками')
+        self.create_dish('Яблочный пирог', description='Выпечка')
+
+        self.assertEqual(self.search('пирог'), ['Яблочный пирог', 'Шарлотка'])
+
+    def test_tags_are_searchable(self):
+        self.create_dish('Борщ', tags='суп, острое')
+
+        self.assertEqual(self.search('остр'), ['Борщ'])
+
+    def test_index_follows_changes(self):
+        dish = self.create_dish('Уха', description='Рыбный суп')
+        dish.name = 'Солянка'
+        dish.description = 'Мясной суп'
+        dish.save()
+
+        self.assertEqual(self.search('уха'), [])
+        self.assertEqual(self.search('мясн'), ['Солянка'])
+
+        dish.delete()
+        self.assertEqual(self.search('солянка'), [])
+
+    def test_popularity_update_keeps_index(self):
+        self.create_guest('Анна', [self.olivier])
+
+        self.assertEqual(self.search('оливье'), ['Оливье'])
+
+    def test_empty_query_returns_all(self):
+        self.assertEqual(len(self.search('  !! ')), 4)
+
+    def test_dish_list_and_api(self):
+        self.create_dish('Утка с яблоками', dish_type=self.hot_type)
+
+        page = self.client.get('/dishes/', {'search': 'утк'})
+        api = self.client.get('/api/dishes/', {'search': 'утк'})
+
+        self.assertEqual([dish.name for dish in page.context['dishes']], ['Утка с яблоками'])
+        self.assertEqual([dish['name'] for dish in api.json()], ['Утка с яблоками'])
+
+
+class TagTests(MenuDataMixin, TestCase):
+    """Теги блюд в нормализованной таблице"""
+
+    def setUp(self):
+        super().setUp()
+        self.borscht = self.create_dish('Борщ', dish_type=self.hot_type, tags='Суп, острое,  домашнее ')
+        self.solyanka = self.create_dish('Солянка', dish_type=self.hot_type, tags='суп,мясное')
+
+    def names(self, queryset):
+        return sorted(dish.name for dish in queryset)
+
+    def test_parse_tags(self):
+        self.assertEqual(parse_tags(' Суп ,  ОСТРОЕ  блюдо,суп,, '), ['суп', 'острое блюдо'])
+        self.assertEqual(parse_tags(['Суп', 'суп']), ['суп'])
+        self.assertEqual(parse_tags(''), [])
+
+    def test_filter_any_and_all(self):
+        dishes = Dish.objects.all()
+
+        self.assertEqual(self.names(filter_by_tags(dishes, 'острое, мясное')), ['Борщ', 'Солянка'])
+        self.assertEqual(self.names(filter_by_tags(dishes, 'суп, ОСТРОЕ', TAG_MATCH_ALL)), ['Борщ'])
+        self.assertEqual(len(filter_by_tags(dishes, '')), 6)
+
+    def test_tags_follow_dish_changes(self):
+        self.borscht.tags = 'суп'
+        self.borscht.save()
+
+        self.assertEqual(self.names(filter_by_tags(Dish.objects.all(), 'острое')), [])
+        self.assertEqual(tag_facets(), [{'tag': 'суп', 'count': 2}, {'tag': 'мясное', 'count': 1}])
+
+        self.solyanka.delete()
+        self.assertEqual(tag_facets(), [{'tag': 'суп', 'count': 1}])
+
+    def test_facets_for_queryset(self):
+        facets = tag_facets(Dish.objects.filter(name='Солянка'))
+
+        self.assertEqual(facets, [{'tag': 'мясное', 'count': 1}, {'tag': 'суп', 'count': 1}])
+
+    def test_api(self):
+        dishes = self.client.get('/api/dishes/', {'tags': 'суп,острое', 'tags_match': 'all'}).json()
+        facets = self.client.get('/api/dishes/tags/', {'tags': 'мясное'}).json()
+
+        self.assertEqual([dish['name'] for dish in dishes], ['Борщ'])
+        self.assertEqual(facets, [{'tag': 'мясное', 'count': 1}, {'tag': 'суп', 'count': 1}])
+
+
+class AutocompleteTests(MenuDataMixin, TestCase):
+    """Подсказки блюд по началу названия или слова"""
+
+    def test_prefix_index(self):
+        index = PrefixIndex(['Салат Оливье', 'Оладьи', 'Ёжики мясные', 'Суп с олениной'])
+
+        self.assertEqual(index.search('ол'), [1, 3, 0])
+        self.assertEqual(index.search('ол', limit=2), [1, 3])
+        self.assertEqual(index.search('ЕЖ'), [2])
+        self.assertEqual(index.search('мясн'), [2])
+        self.assertEqual(index.search('', limit=10), [2, 1, 0, 3])
+        self.assertEqual(index.search('ол', mask=[True, False, True, True]), [3, 0])
+        self.assertEqual(index.search('щи'), [])
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Ёлочка\tНОВОГОДНЯЯ  '), 'елочка новогодняя')
+
+    def test_endpoint(self):
+        response = self.client.get('/dishes/autocomplete/', {'q': 'о', 'limit': 5})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dish['name'] for dish in response.json()['results']], ['Оливье', 'Омлет'])
+
+    def test_endpoint_type_filter_and_validation(self):
+        response = self.client.get('/dishes/autocomplete/', {'q': 'о', 'type': self.hot_type.id})
+
+        self.assertEqual([dish['name'] for dish in response.json()['results']], ['Омлет'])
+        self.assertEqual(self.client.get('/dishes/autocomplete/', {'limit': 'x'}).status_code, 400)
+
+    def test_endpoint_follows_catalog(self):
+        self.client.get('/dishes/autocomplete/', {'q': 'о'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_dish('Окрошка', dish_type=self.hot_type)
+
+        response = self.client.get('/dishes/autocomplete/', {'q': 'ок'})
+        self.assertEqual([dish['name'] for dish in response.json()['results']], ['Окрошка'])
+
+
+class DishOptionsTests(MenuDataMixin, TestCase):
+    """Варианты блюд для страницы гостей кэшируются по поколению снимка"""
+
+    def names(self, script):
+        return [option['name'] for option in json.loads(script[script.index('>') + 1:script.rindex('<')])]
+
+    def test_cached_per_generation_with_timeout(self):
+        with mock.patch('core.autocomplete.cache.set', wraps=caches['default'].set) as cache_set:
+            script = dish_options_script(get_catalog())
+            self.assertEqual(dish_options_script(get_catalog()), script)
+
+        self.assertEqual(cache_set.call_count, 1)
+        self.assertIsNotNone(cache_set.call_args.args[2])
+        self.assertEqual(self.names(script), ['Жаркое', 'Оливье', 'Омлет', 'Сельдь под шубой'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_dish('Окрошка', dish_type=self.hot_type)
+
+        self.assertIn('Окрошка', self.names(dish_options_script(get_catalog())))
+
+    def test_favorites_keep_cached_options(self):
+        dish_options_script(get_catalog())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_guest('Анна', [self.olivier])
+
+        with mock.patch('core.autocomplete.json_script') as render:
+            dish_options_script(get_catalog())
+        render.assert_not_called()
+
+
+class AggregateIngredientsTests(MenuDataMixin, TestCase):
+    """Сводка ингредиентов меню одним GROUP BY вместо цикла по блюдам"""
+
+    def per_dish_totals(self, dishes, servings):
+        """Прежний расчет: цикл по блюдам и их ингредиентам"""
+        totals = {}
+        for dish in dishes:
+            for dish_ingredient in dish.ingredients_list.select_related('ingredient'):
+                item = totals.setdefault(dish_ingredient.ingredient_id, {
+                    'quantity': 0,
+                    'dishes': [],
+                    'estimated_cost': 0,
+                })
+                item['quantity'] += dish_ingredient.quantity * servings
+                item['dishes'].append(dish.name)
+        for ingredient_id, item in totals.items():
+            ingredient = Ingredient.objects.get(id=ingredient_id)
+            item['estimated_cost'] = float(calculate_item_cost(item['quantity'], ingredient.unit, ingredient.average_price))
+        return totals
+
+    def test_constant_number_of_queries(self):
+        dishes = [self.olivier, self.herring, self.roast, self.omelette]
+
+        with self.assertNumQueries(3):
+            aggregate_ingredients(dishes, 4)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(aggregate_ingredients([], 4), {})
+
+    def test_matches_per_dish_loop(self):
+        dishes = [self.olivier, self.herring, self.roast, self.omelette]
+
+        result = aggregate_ingredients(dishes, 6)
+        expected = self.per_dish_totals(dishes, 6)
+
+        self.assertEqual(result.keys(), expected.keys())
+        for ingredient_id, item in expected.items():
+            self.assertAlmostEqual(result[ingredient_id]['quantity'], item['quantity'])
+            self.assertEqual(sorted(result[ingredient_id]['dishes']), sorted(item['dishes']))
+            self.assertAlmostEqual(result[ingredient_id]['estimated_cost'], item['estimated_cost'], places=2)
+        # Картофель входит в три блюда: 100 + 80 + 250 г на порцию
+        self.assertAlmostEqual(result[self.potato.id]['quantity'], 430 * 6)
+
+
+class CostEngineTests(SimpleTestCase):
+    """Стоимость позиции: количество × множитель единицы × цена"""
+
+    # (количество, единица, цена, стоимость)
+    CASES = [
+        (500, 'g', Decimal('120'), 60.0),
+        (1.5, 'kg', Decimal('120'), 180.0),
+        (250, 'ml', Decimal('80'), 20.0),
+        (2, 'l', Decimal('80'), 160.0),
+        (3, 'pcs', Decimal('12.5'), 37.5),
+        (2, 'tbsp', Decimal('1000'), 30.0),
+        (4, 'tsp', Decimal('1000'), 20.0),
+        # Неизвестная единица считается граммами при цене за кг
+        (500, 'cup', Decimal('120'), 60.0),
+        (500, 'g', None, 0),
+        (500, 'g', Decimal('0'), 0),
+    ]
+
+    def test_item_cost_per_unit(self):
+        for quantity, unit, price, cost in self.CASES:
+            with self.subTest(unit=unit, price=price):
+                self.assertAlmostEqual(calculate_item_cost(quantity, unit, price), cost)
+
+    def test_every_unit_has_a_case(self):
+        self.assertLessEqual(set(UNIT_PRICE_FACTORS), {unit for _, unit, _, _ in self.CASES})
+        self.assertEqual(DEFAULT_PRICE_FACTOR, UNIT_PRICE_FACTORS['g'])
+
+    def test_vectorized_matches_item_cost(self):
+        quantities, units, prices, _ = zip(*self.CASES)
+
+        costs = calculate_costs(quantities, units, prices)
+
+        self.assertEqual(len(costs), len(self.CASES))
+        for cost, quantity, unit, price in zip(costs, quantities, units, prices):
+            self.assertAlmostEqual(float(cost), calculate_item_cost(quantity, unit, price))
+        self.assertEqual(len(calculate_costs([], [], [])), 0)
+
+    def test_describe_calculation(self):
+        self.assertEqual(describe_calculation(500, 'g', 120), '(500г × 0.001) × 120.0₽/кг = 60.00₽')
+        self.assertEqual(describe_calculation(3, 'pcs', 12.5), '3шт × 12.5₽/шт = 37.50₽')
+        self.assertEqual(describe_calculation(2, 'tbsp', 1000), '(2ст.л. × 0.015) × 1000.0₽/кг = 30.00₽')
+        self.assertEqual(describe_calculation(5, 'cup', None), '(5cup × 0.001) × 0.0₽/кг = 0.00₽')
+
+
+class PreferenceMatrixTests(SimpleTestCase):
+    """CSR-матрица предпочтений против наивного подсчета по множествам"""
+
+    # Гость 40 без любимых блюд, блюдо 4 никому не нравится,
+    # пара (50, 9) ссылается на неизвестных гостя и блюдо
+    GUESTS = [10, 20, 30, 40]
+    DISHES = [1, 2, 3, 4]
+    PAIRS = [(10, 1), (10, 2), (20, 2), (20, 3), (30, 1), (30, 2), (30, 3), (50, 9), (10, 9)]
+
+    def setUp(self):
+        self.matrix = PreferenceMatrix(self.GUESTS, self.DISHES, self.PAIRS)
+        self.fans = {
+            dish_id: {guest_id for guest_id, other_id in self.PAIRS if other_id == dish_id and guest_id in self.GUESTS}
+            for dish_id in self.DISHES
+        }
+
+    def test_shape_and_counts(self):
+        self.assertEqual(self.matrix.shape, (4, 4))
+        self.assertEqual(self.matrix.dish_counts().tolist(), [len(self.fans[dish_id]) for dish_id in self.DISHES])
+        self.assertEqual(self.matrix.guest_counts().tolist(), [2, 2, 3, 0])
+
+    def test_co_occurrence_matches_set_intersections(self):
+        matrix = self.matrix.co_occurrence()
+
+        expected = [
+            [len(self.fans[dish_id] & self.fans[other_id]) for other_id in self.DISHES]
+            for dish_id in self.DISHES
+        ]
+        self.assertEqual(matrix.tolist(), expected)
+        self.assertEqual(matrix[3].tolist(), [0, 0, 0, 0])
+
+    def test_guests_by_dish_and_bitsets(self):
+        by_dish = self.matrix.guests_by_dish([0, 2, 3])
+        bitsets = self.matrix.guest_bitsets([0, 1, 2, 3])
+
+        self.assertEqual({col: rows.tolist() for col, rows in by_dish.items()}, {0: [0, 2], 2: [1, 2]})
+        self.assertEqual(bitsets, {0: 0b101, 1: 0b111, 2: 0b110})
+
+    def test_empty(self):
+        matrix = PreferenceMatrix([], [1, 2], [])
+
+        self.assertEqual(matrix.dish_counts().tolist(), [0, 0])
+        self.assertEqual(matrix.co_occurrence().tolist(), [[0, 0], [0, 0]])
+        self.assertEqual(matrix.guests_by_dish([0, 1]), {})
+
+
+class ShoppingExcelTests(MenuDataMixin, TestCase):
+    """Выгрузка сохраненного списка покупок в Excel"""
+
+    def setUp(self):
+        super().setUp()
+        self.salt = Ingredient.objects.create(name='Соль поваренная йодированная мелкая', unit='g', average_price=30)
+        self.event = self.create_event()
+        self.create_guest('Анна', [self.olivier], self.event)
+        DishIngredient.objects.create(dish=self.olivier, ingredient=self.salt, quantity=2)
+        result = build_shopping_list(self.event)
+        self.shopping_list = save_shopping_list(self.event, result['items'], result['total_cost'])
+        self.shopping_list.items.filter(ingredient=self.egg).update(purchased=True)
+
+    def test_export(self):
+        import openpyxl
+
+        response = self.client.get(f'/event/{self.event.id}/shopping/excel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('.xlsx', response['Content-Disposition'])
+
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+        self.assertEqual(rows[0][0], 'Список покупок: Ужин')
+        self.assertEqual(rows[1][0], 'Дата: 2026-12-31')
+        self.assertEqual(rows[2][0], 'Гостей: 4')
+        self.assertEqual(rows[4], ['Категория', 'Продукт', 'Количество', 'Единица', 'Примерная стоимость', 'Куплено'])
+        self.assertEqual([row[:4] + row[5:] for row in rows[5:8]], [
+            ['Другое', 'Соль поваренная йодированная мелкая', 8, 'грамм', 'Нет'],
+            ['Молочное', 'Яйца', 4, 'штук', 'Да'],
+            ['Овощи', 'Картофель', 400, 'грамм', 'Нет'],
+        ])
+        self.assertAlmostEqual(rows[7][4], 24.0)
+        self.assertEqual(rows[-1][3:5], ['Общая стоимость:', float(self.shopping_list.total_cost)])
+
+        widths = {column: sheet.column_dimensions[column].width for column in 'ABCDEF'}
+        self.assertEqual(widths['B'], len('Соль поваренная йодированная мелкая') + 2)
+        self.assertEqual(widths['A'], EXCEL_COLUMN_WIDTHS['A'][0])
+        self.assertEqual(widths['E'], EXCEL_COLUMN_WIDTHS['E'][0])
+
+    def test_widths_include_fallback_category(self):
+        Ingredient.objects.filter(id=self.egg.id).update(category='')
+
+        with mock.patch.dict(EXCEL_COLUMN_WIDTHS, {'A': (1, 30)}):
+            from_query = _excel_widths(self.shopping_list, None)
+            in_memory = _excel_widths(self.shopping_list, list(self.shopping_list.items.select_related('ingredient')))
+
+        # Самая длинная подпись категории — «Другое» у соли без категории
+        self.assertEqual(from_query['A'], len('Другое') + 2)
+        self.assertEqual(from_query, in_memory)
+
+    def test_requires_saved_list(self):
+        event = self.create_event()
+
+        self.assertEqual(self.client.get(f'/event/{event.id}/shopping/excel/').status_code, 404)
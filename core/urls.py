@@ -7,9 +7,12 @@ urlpatterns = [
     path('event/<int:event_id>/guests/', views.add_guests, name='add_guests'),
     path('event/<int:event_id>/menu/', views.generate_menu, name='generate_menu'),
     path('event/<int:event_id>/shopping/', views.generate_shopping_list, name='shopping_list'),
+    path('event/<int:event_id>/shopping/pdf/', views.export_shopping_pdf, name='shopping_pdf'),
+    path('event/<int:event_id>/shopping/excel/', views.export_shopping_excel, name='shopping_excel'),
     path('event/<int:event_id>/shopping/debug/', views.generate_shopping_list_debug, name='shopping_debug'),
     path('event/<int:event_id>/show/', views.show_event, name='show_event'),
     path('event/<int:event_id>/guest/<int:guest_id>/edit/', views.edit_guest, name='edit_guest'),
     path('event/<int:event_id>/guest/<int:guest_id>/delete/', views.delete_guest, name='delete_guest'),
     path('dishes/', views.dish_list, name='dish_list'),
+    path('dishes/autocomplete/', views.dish_autocomplete, name='dish_autocomplete'),
 ]
@@ -1,20 +1,19 @@
+from functools import lru_cache
 from io import BytesIO
-import pandas as pd
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-
-def export_shopping_list_pdf(event, shopping_list, items):
-    """Экспорт списка покупок в PDF"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
 
-    # Стили
+@lru_cache(maxsize=None)
+def pdf_styles():
+    """
+    Стили PDF, общие для всех экспортов процесса
+
+    Таблица стилей reportlab и TableStyle строятся один раз и только
+    читаются при сборке документов.
+    """
+    # reportlab нужен только для экспорта, поэтому загружается при первом вызове
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle(
         'CustomTitle',
@@ -22,6 +21,40 @@ def export_shopping_list_pdf(event, shopping_list, items):
         fontSize=16,
         spaceAfter=30
     )
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+    return styles, title_style, table_style
+
+
+def render_shopping_list_pdf(event, shopping_list, items=None):
+    """
+    PDF списка покупок в байтах
+
+    Позиции загружаются одним запросом вместе с ингредиентами, уже
+    упорядоченными по категориям.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+    if items is None:
+        items = shopping_list.items.all()
+    if hasattr(items, 'select_related'):
+        items = items.select_related('ingredient').order_by('ingredient__category', 'ingredient__name')
+
+    styles, title_style, table_style = pdf_styles()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
 
     # Заголовок
     elements.append(Paragraph(f"Список покупок: {event.name}", title_style))
@@ -32,10 +65,7 @@ def export_shopping_list_pdf(event, shopping_list, items):
     # Группируем по категориям
     categories = {}
     for item in items:
-        category = item.ingredient.category or 'Другое'
-        if category not in categories:
-            categories[category] = []
-        categories[category].append(item)
+        categories.setdefault(item.ingredient.category or 'Другое', []).append(item)
 
     # Создаем таблицы для каждой категории
     for category, category_items in categories.items():
@@ -51,18 +81,8 @@ def export_shopping_list_pdf(event, shopping_list, items):
                 "✓" if item.purchased else "☐"
             ])
 
-        # Создаем таблицу
         table = Table(table_data, colWidths=[3*inch, 1.5*inch, 1.5*inch, 0.8*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        table.setStyle(table_style)
 
         elements.append(table)
         elements.append(Spacer(1, 20))
@@ -73,75 +93,149 @@ def export_shopping_list_pdf(event, shopping_list, items):
         styles['Heading2']
     ))
 
-    # Создаем PDF
     doc.build(elements)
-    buffer.seek(0)
+    return buffer.getvalue()
+
 
+def export_shopping_list_pdf(event, shopping_list, items=None):
+    """Экспорт списка покупок в PDF"""
     from django.http import HttpResponse
-    response = HttpResponse(buffer, content_type='application/pdf')
+
+    response = HttpResponse(render_shopping_list_pdf(event, shopping_list, items), content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="shopping_list_{event.name}.pdf"'
     return response
 
-def export_shopping_list_excel(event, shopping_list, items):
-    """Экспорт списка покупок в Excel"""
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Список покупок"
 
-    # Заголовок
-    ws['A1'] = f"Список покупок: {event.name}"
-    ws['A2'] = f"Дата: {event.event_date}"
-    ws['A3'] = f"Гостей: {event.number_of_guests}"
+# Ширина колонок Excel: (минимальная, максимальная)
+EXCEL_COLUMN_WIDTHS = {
+    'A': (12, 30),   # Категория
+    'B': (14, 50),   # Продукт
+    'C': (12, 14),   # Количество
+    'D': (12, 12),   # Единица
+    'E': (21, 21),   # Примерная стоимость
+    'F': (8, 8),     # Куплено
+}
+
+
+def _excel_items(shopping_list, items):
+    """Позиции списка потоком, без загрузки всего списка в память"""
+    if items is None:
+        items = shopping_list.items.all()
+    if hasattr(items, 'select_related'):
+        items = (
+            items.select_related('ingredient')
+            .order_by('ingredient__category', 'ingredient__name')
+            .iterator(chunk_size=2000)
+        )
+    return items
+
+
+def _excel_widths(shopping_list, items):
+    """
+    Ширина колонок по самым длинным названиям
+
+    В режиме write-only ширины задаются до первой строки, поэтому длины
+    считаются одним агрегирующим запросом, а не вторым проходом по ячейкам.
+    """
+    from django.db.models import Max, Value
+    from django.db.models.functions import Coalesce, Length, NullIf
+
+    if items is None or hasattr(items, 'aggregate'):
+        queryset = items if items is not None else shopping_list.items.all()
+        lengths = queryset.aggregate(
+            # Пустая категория выводится как «Другое»
+            category=Max(Length(Coalesce(NullIf('ingredient__category', Value('')), Value('Другое')))),
+            name=Max(Length('ingredient__name')),
+        )
+    else:
+        # Позиции уже в памяти (например, при пакетной выгрузке)
+        lengths = {
+            'category': max((len(item.ingredient.category or 'Другое') for item in items), default=0),
+            'name': max((len(item.ingredient.name) for item in items), default=0),
+        }
+
+    widths = {column: low for column, (low, high) in EXCEL_COLUMN_WIDTHS.items()}
+    for column, length in (('A', lengths['category']), ('B', lengths['name'])):
+        low, high = EXCEL_COLUMN_WIDTHS[column]
+        widths[column] = min(max(low, (length or 0) + 2), high)
+    return widths
+
+
+def write_shopping_list_excel(event, shopping_list, items, output):
+    """
+    Запись списка покупок в Excel в файловый объект output
+
+    Книга пишется в режиме write-only: строки сразу уходят в поток,
+    память не растет с размером списка.
+    """
+    # openpyxl нужен только для экспорта, поэтому загружается при первом вызове
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Список покупок")
+
+    for column, width in _excel_widths(shopping_list, items).items():
+        ws.column_dimensions[column].width = width
 
-    # Стили заголовка
-    title_font = Font(size=14, bold=True)
-    ws['A1'].font = title_font
+    # Заголовок
+    title = WriteOnlyCell(ws, value=f"Список покупок: {event.name}")
+    title.font = Font(size=14, bold=True)
+    ws.append([title])
+    ws.append([f"Дата: {event.event_date}"])
+    ws.append([f"Гостей: {event.number_of_guests}"])
+    ws.append([])
 
     # Заголовки таблицы
-    headers = ['Категория', 'Продукт', 'Количество', 'Единица', 'Примерная стоимость', 'Куплено']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=5, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    headers = []
+    for header in ['Категория', 'Продукт', 'Количество', 'Единица', 'Примерная стоимость', 'Куплено']:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        headers.append(cell)
+    ws.append(headers)
 
     # Данные
-    row = 6
-    for item in items:
-        ws.cell(row=row, column=1, value=item.ingredient.category or 'Другое')
-        ws.cell(row=row, column=2, value=item.ingredient.name)
-        ws.cell(row=row, column=3, value=item.quantity_needed)
-        ws.cell(row=row, column=4, value=item.ingredient.get_unit_display())
-        ws.cell(row=row, column=5, value=float(item.estimated_cost) if item.estimated_cost else None)
-        ws.cell(row=row, column=6, value='Да' if item.purchased else 'Нет')
-        row += 1
+    for item in _excel_items(shopping_list, items):
+        ws.append([
+            item.ingredient.category or 'Другое',
+            item.ingredient.name,
+            item.quantity_needed,
+            item.ingredient.get_unit_display(),
+            float(item.estimated_cost) if item.estimated_cost else None,
+            'Да' if item.purchased else 'Нет',
+        ])
 
     # Итог
-    ws.cell(row=row+1, column=4, value="Общая стоимость:")
-    ws.cell(row=row+1, column=5, value=float(shopping_list.total_cost))
-    ws.cell(row=row+1, column=5).number_format = '#,##0.00 ₽'
-
-    # Автоширина колонок
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-    # Сохраняем в буфер
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    total = WriteOnlyCell(ws, value=float(shopping_list.total_cost))
+    total.number_format = '#,##0.00 ₽'
+    ws.append([])
+    ws.append([None, None, None, "Общая стоимость:", total])
 
-    from django.http import HttpResponse
-    response = HttpResponse(
-        buffer,
+    wb.save(output)
+
+
+def export_shopping_list_excel(event, shopping_list, items=None):
+    """
+    Экспорт списка покупок в Excel
+
+    Книга собирается во временном файле и отдается потоком через
+    FileResponse (StreamingHttpResponse).
+    """
+    import tempfile
+
+    from django.http import FileResponse
+
+    output = tempfile.TemporaryFile()
+    write_shopping_list_excel(event, shopping_list, items, output)
+    output.seek(0)
+
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f"shopping_list_{event.name}.xlsx",
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    response['Content-Disposition'] = f'attachment; filename="shopping_list_{event.name}.xlsx"'
-    return response
\ No newline at end of file
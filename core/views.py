@@ -1,10 +1,41 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django.db.models import Avg, Count
 from collections import Counter
-from .models import Dish, HolidayEvent, Guest, DishType, ShoppingList, ShoppingItem, Ingredient, DishIngredient
+from .models import Dish, HolidayEvent, Guest, DishType, ShoppingList, Ingredient, DishIngredient
+from .artifacts import open_shopping_pdf
+from .autocomplete import dish_options_script
+from .cache import event_version_info, get_event_result
+from .catalog import get_catalog
+from .charts import get_menu_chart
+from .costs import calculate_item_cost, describe_calculation
+from .forms import DishFilterForm
+from .pricing import menu_cost
+from .search import search_dishes
+from .shopping import (
+    build_shopping_list, get_balanced_dishes, get_coverage_dishes, get_popular_dishes, save_shopping_list
+)
+from .tags import TAG_MATCH_ANY, filter_by_tags, tag_facets
+from .utils import export_shopping_list_excel
 import datetime
+import hashlib
+
+# Верхняя граница min_favorites в режиме покрытия гостей
+MAX_MIN_FAVORITES = 3
+
+# Бюджет времени приготовления в сбалансированном режиме (мин)
+DEFAULT_MENU_TIME = 180
+MIN_MENU_TIME = 15
+MAX_MENU_TIME = 24 * 60
+
+MENU_MODES = ('popular', 'coverage', 'balanced')
+
+# Сколько подсказок может вернуть dish_autocomplete
+MAX_AUTOCOMPLETE_RESULTS = 50
 
 def index(request):
     return render(request, 'core/index.html')
@@ -36,7 +67,6 @@ def create_event(request):
 
 def add_guests(request, event_id):
     event = get_object_or_404(HolidayEvent, id=event_id)
-    dishes = Dish.objects.all()
     
     if request.method == 'POST':
         guests_count = event.number_of_guests
@@ -62,21 +92,61 @@ def add_guests(request, event_id):
     
     guest_range = range(1, int(event.number_of_guests) + 1)
     
+    # Список блюд рендерится один раз на версию каталога и общий для всех гостей
     return render(request, 'core/add_guests.html', {
         'event': event,
-        'dishes': dishes,
-        'guest_range': guest_range
+        'guest_range': guest_range,
+        'dish_options': dish_options_script(get_catalog()),
+    })
+
+def dish_autocomplete(request):
+    """Подсказки блюд по началу названия (q, limit, необязательный type)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_AUTOCOMPLETE_RESULTS)
+        type_id = int(request.GET['type']) if request.GET.get('type') else None
+    except ValueError:
+        return JsonResponse({'error': 'limit и type должны быть числами'}, status=400)
+    
+    # Индекс строится по снимку каталога и обновляется вместе с ним
+    catalog = get_catalog()
+    mask = catalog.type_ids == type_id if type_id is not None else None
+    positions = catalog.prefix_index.search(request.GET.get('q', ''), limit, mask)
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': int(catalog.ids[position]),
+                'name': catalog.names[position],
+                'type': catalog.type_names[position] or 'Разное',
+                'cooking_time': int(catalog.cooking_times[position]),
+            }
+            for position in positions
+        ]
     })
 
 def dish_list(request):
-    dishes = Dish.objects.all().select_related('dish_type')
+    all_dishes = Dish.objects.all()
+    dishes = all_dishes.select_related('dish_type')
+    
+    form = DishFilterForm(request.GET or None)
+    if form.is_valid():
+        if form.cleaned_data['difficulty']:
+            dishes = dishes.filter(difficulty=form.cleaned_data['difficulty'])
+        if form.cleaned_data['max_cooking_time'] is not None:
+            dishes = dishes.filter(cooking_time__lte=form.cleaned_data['max_cooking_time'])
+        dishes = filter_by_tags(dishes, form.cleaned_data['tags'], form.cleaned_data['tags_match'] or TAG_MATCH_ANY)
+        # Поиск по полнотекстовому индексу, результаты по релевантности
+        dishes = search_dishes(dishes, form.cleaned_data['search'])
     
     dish_types_count = DishType.objects.count()
-    avg_cooking_time = dishes.aggregate(Avg('cooking_time'))['cooking_time__avg'] or 0
-    easy_dishes = dishes.filter(difficulty='easy').count()
+    avg_cooking_time = all_dishes.aggregate(Avg('cooking_time'))['cooking_time__avg'] or 0
+    easy_dishes = all_dishes.filter(difficulty='easy').count()
     
     context = {
         'dishes': dishes,
+        'form': form,
+        'tag_facets': tag_facets(dishes),
+        'total_dishes': all_dishes.count(),
         'dish_types_count': dish_types_count,
         'avg_cooking_time': avg_cooking_time,
         'easy_dishes': easy_dishes,
@@ -84,6 +154,42 @@ def dish_list(request):
     
     return render(request, 'core/dish_list.html', context)
 
+def _menu_result(event, guests, mode='popular', min_favorites=1, max_time=DEFAULT_MENU_TIME):
+    """Популярные блюда мероприятия и распределение по типам"""
+    covered_guests = None
+    total_time = None
+    if mode == 'coverage':
+        # Меню, в котором любимые блюда найдет как можно больше гостей
+        dishes, covered_guests = get_coverage_dishes(event, limit=6, min_favorites=min_favorites)
+    elif mode == 'balanced':
+        # Лучшее меню по голосам при бюджете времени и одном блюде каждого типа
+        dishes, total_time = get_balanced_dishes(event, limit=6, max_time=max_time)
+    else:
+        # Рейтинг берется из голосов мероприятия одним запросом по индексу
+        dishes = get_popular_dishes(event, limit=6, fallback=0)
+    popular_dishes = [(dish, dish.votes) for dish in dishes]
+    
+    type_distribution = Counter([
+        d.dish_type.name if d.dish_type else 'Разное' 
+        for d in dishes
+    ]).most_common()
+    
+    # Стоимость порций хранится в блюдах, поэтому считать ингредиенты не нужно
+    estimated_cost = menu_cost(dishes, event.number_of_guests)
+    
+    return {
+        'popular_dishes': popular_dishes,
+        'type_distribution': type_distribution,
+        'guests_count': guests.count(),
+        'estimated_cost': estimated_cost,
+        'per_guest_cost': estimated_cost / event.number_of_guests if event.number_of_guests > 0 else 0,
+        'mode': mode,
+        'min_favorites': min_favorites,
+        'covered_guests': covered_guests,
+        'max_time': max_time,
+        'total_time': total_time,
+    }
+
 def generate_menu(request, event_id):
     """Генерация меню на основе предпочтений гостей"""
     event = get_object_or_404(HolidayEvent, id=event_id)
@@ -92,143 +198,142 @@ def generate_menu(request, event_id):
     if not guests.exists():
         return HttpResponse("Нет данных о гостях", status=400)
     
-    all_favorite_dishes = []
-    for guest in guests:
-        all_favorite_dishes.extend(list(guest.favorite_dishes.all()))
-    
-    if not all_favorite_dishes:
+    # Режим coverage: как можно больше гостей с min_favorites любимыми блюдами в меню,
+    # режим balanced: лучшие блюда при бюджете времени max_time
+    mode = request.GET.get('mode')
+    if mode not in MENU_MODES:
+        mode = 'popular'
+    try:
+        min_favorites = min(max(int(request.GET.get('min_favorites', 1)), 1), MAX_MIN_FAVORITES)
+    except ValueError:
+        min_favorites = 1
+    try:
+        max_time = min(max(int(request.GET.get('max_time', DEFAULT_MENU_TIME)), MIN_MENU_TIME), MAX_MENU_TIME)
+    except ValueError:
+        max_time = DEFAULT_MENU_TIME
+    
+    # Пересчитываем только при изменении входных данных мероприятия
+    kind = {
+        'coverage': f'menu:coverage:{min_favorites}',
+        'balanced': f'menu:balanced:{max_time}',
+    }.get(mode, 'menu')
+    result = get_event_result(event, kind, lambda: _menu_result(event, guests, mode, min_favorites, max_time))
+    
+    if not result['popular_dishes']:
         return HttpResponse("Гости не выбрали любимые блюда", status=400)
     
-    dish_counter = Counter(all_favorite_dishes)
-    popular_dishes = dish_counter.most_common(6)
-    
-    type_distribution = Counter([
-        d.dish_type.name if d.dish_type else 'Разное' 
-        for d, _ in popular_dishes
-    ]).most_common()
+    # График рисуется в фоне и показывается, как только попадет в кэш
+    menu_chart = get_menu_chart([{'dish': dish} for dish, _ in result['popular_dishes']], wait=False)
     
     context = {
         'event': event,
-        'popular_dishes': popular_dishes,
-        'type_distribution': type_distribution,
-        'guests_count': guests.count(),
+        'menu_chart': menu_chart,
+        **result,
     }
     
     return render(request, 'core/generate_menu.html', context)
 
-def calculate_item_cost(quantity, unit, price_per_unit):
-    """Правильный расчет стоимости товара"""
-    if not price_per_unit:
-        return 0
-    
-    # Конвертируем количество в единицы цены
-    if unit == 'g':  # цена за кг, количество в граммах
-        return (quantity / 1000) * price_per_unit
-    elif unit == 'kg':  # цена за кг, количество в кг
-        return quantity * price_per_unit
-    elif unit == 'ml':  # цена за литр, количество в мл
-        return (quantity / 1000) * price_per_unit
-    elif unit == 'l':  # цена за литр, количество в литрах
-        return quantity * price_per_unit
-    elif unit == 'pcs':  # цена за штуку
-        return quantity * price_per_unit
-    elif unit == 'tbsp':  # столовая ложка ≈ 15г
-        return (quantity * 0.015 / 1000) * price_per_unit
-    elif unit == 'tsp':  # чайная ложка ≈ 5г
-        return (quantity * 0.005 / 1000) * price_per_unit
-    else:
-        # По умолчанию считаем, что цена за кг
-        return (quantity / 1000) * price_per_unit
+def _shopping_list_etag(request, version, shopping_list):
+    """
+    ETag страницы списка покупок
+    
+    Кроме версии входных данных страница зависит от того, сохранен ли список
+    (надпись кнопки, ссылки на PDF и Excel), и от CSRF-токена формы
+    сохранения, поэтому в тег входят id сохраненного списка и хэш секрета
+    CSRF и пользователя.
+    """
+    client = f'{request.user.pk}:{request.META.get("CSRF_COOKIE", "")}'
+    client = hashlib.sha1(client.encode('utf-8')).hexdigest()[:8]
+    saved = shopping_list.id if shopping_list is not None else 0
+    return quote_etag(f'{version}-{saved}-{client}')
 
 def generate_shopping_list(request, event_id):
-    """Формирование списка покупок для меню - РЕАЛИСТИЧНЫЙ РАСЧЕТ"""
-    event = get_object_or_404(HolidayEvent, id=event_id)
-    guests = event.guests.all()
+    """Формирование списка покупок для меню - РЕАЛИСТИЧНЫЙ РАСЧЕТ
     
-    # Получаем выбранные блюда
-    all_favorite_dishes = []
-    for guest in guests:
-        all_favorite_dishes.extend(list(guest.favorite_dishes.all()))
-    
-    if not all_favorite_dishes:
-        all_favorite_dishes = list(Dish.objects.all()[:3])
-        if not all_favorite_dishes:
-            return HttpResponse("Нет данных о блюдах", status=400)
-    
-    # Находим популярные блюда
-    dish_counter = Counter(all_favorite_dishes)
-    popular_dishes = [dish for dish, _ in dish_counter.most_common(5)]
-    
-    # Считаем ингредиенты
-    shopping_dict = {}
-    total_cost = 0
+    GET ничего не пишет в базу и отвечает 304, если входные данные
+    мероприятия не менялись. Сохранение списка — явный POST.
+    """
+    event = get_object_or_404(HolidayEvent, id=event_id)
     
-    for dish in popular_dishes:
-        for dish_ingredient in dish.ingredients_list.all():
-            ingredient = dish_ingredient.ingredient
-            quantity_needed = dish_ingredient.quantity * event.number_of_guests
-            
-            if ingredient.id not in shopping_dict:
-                shopping_dict[ingredient.id] = {
-                    'ingredient': ingredient,
-                    'quantity': 0,
-                    'unit': ingredient.unit,
-                    'dishes': [],
-                    'estimated_cost': 0
-                }
-            
-            shopping_dict[ingredient.id]['quantity'] += quantity_needed
-            shopping_dict[ingredient.id]['dishes'].append(dish.name)
-            
-            # ПРАВИЛЬНЫЙ РАСЧЕТ СТОИМОСТИ
-            price_per_unit = float(ingredient.average_price or 0)
-            item_cost = calculate_item_cost(quantity_needed, ingredient.unit, price_per_unit)
-            
-            shopping_dict[ingredient.id]['estimated_cost'] += item_cost
-            total_cost += item_cost
+    if request.method == 'POST':
+        result = build_shopping_list(event)
+        if result['items']:
+            # Сохраняем в базе только изменившиеся позиции
+            save_shopping_list(event, result['items'], result['total_cost'])
+        return redirect('shopping_list', event_id=event.id)
+    
+    # Секрет CSRF нужен форме сохранения и входит в ETag
+    get_token(request)
+    shopping_list = ShoppingList.objects.filter(event=event).first()
+    version, version_time = event_version_info(event)
+    if shopping_list is not None:
+        version_time = max(version_time, int(shopping_list.generated_at.timestamp()))
+    etag = _shopping_list_etag(request, version, shopping_list)
+    response = get_conditional_response(request, etag=etag, last_modified=version_time)
+    if response is not None:
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Cookie'])
+        return response
+    
+    # Голоса, ингредиенты и стоимость считаются агрегирующими запросами
+    result = get_event_result(event, 'shopping', lambda: build_shopping_list(event))
+    popular_dishes = result['popular_dishes']
+    shopping_dict = result['items']
+    total_cost = result['total_cost']
+    
+    if not popular_dishes:
+        return HttpResponse("Нет данных о блюдах", status=400)
     
     if not shopping_dict:
-        return render(request, 'core/shopping_list_empty.html', {
+        response = render(request, 'core/shopping_list_empty.html', {
             'event': event,
             'popular_dishes': popular_dishes,
         })
+    else:
+        per_guest_cost = total_cost / event.number_of_guests if event.number_of_guests > 0 else 0
+        
+        context = {
+            'event': event,
+            'categories': result['categories'],
+            'total_cost': total_cost,
+            'per_guest_cost': per_guest_cost,
+            'popular_dishes': popular_dishes,
+            'shopping_list': shopping_list,
+            'guests_count': event.number_of_guests,
+        }
+        response = render(request, 'core/shopping_list.html', context)
     
-    # Сортируем по категориям
-    categories = {}
-    for item in shopping_dict.values():
-        category = item['ingredient'].category or 'Другое'
-        if category not in categories:
-            categories[category] = []
-        categories[category].append(item)
-    
-    # Сохраняем в базе
-    shopping_list, created = ShoppingList.objects.get_or_create(event=event)
-    shopping_list.total_cost = total_cost
-    shopping_list.save()
-    
-    shopping_list.items.all().delete()
-    
-    for item_data in shopping_dict.values():
-        ShoppingItem.objects.create(
-            shopping_list=shopping_list,
-            ingredient=item_data['ingredient'],
-            quantity_needed=item_data['quantity'],
-            estimated_cost=item_data.get('estimated_cost', 0)
-        )
-    
-    per_guest_cost = total_cost / event.number_of_guests if event.number_of_guests > 0 else 0
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(version_time)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+def export_shopping_excel(request, event_id):
+    """Выгрузка сохраненного списка покупок в Excel"""
+    event = get_object_or_404(HolidayEvent, id=event_id)
+    shopping_list = ShoppingList.objects.filter(event=event).first()
+    if shopping_list is None:
+        return HttpResponse("Сначала сохраните список покупок", status=404)
     
-    context = {
-        'event': event,
-        'categories': categories,
-        'total_cost': total_cost,
-        'per_guest_cost': per_guest_cost,
-        'popular_dishes': popular_dishes,
-        'shopping_list': shopping_list,
-        'guests_count': event.number_of_guests,
-    }
+    return export_shopping_list_excel(event, shopping_list)
+
+def export_shopping_pdf(request, event_id):
+    """Выгрузка сохраненного списка покупок в PDF
     
-    return render(request, 'core/shopping_list.html', context)
+    Файл рендерится один раз на версию списка и дальше отдается с диска.
+    """
+    event = get_object_or_404(HolidayEvent, id=event_id)
+    shopping_list = ShoppingList.objects.filter(event=event).select_related('event').first()
+    if shopping_list is None:
+        return HttpResponse("Сначала сохраните список покупок", status=404)
+    
+    return FileResponse(
+        open_shopping_pdf(shopping_list),
+        as_attachment=True,
+        filename=f"shopping_list_{event.name}.pdf",
+        content_type='application/pdf'
+    )
 
 def show_event(request, event_id):
     """Отладочная страница для просмотра мероприятия"""
@@ -249,7 +354,6 @@ def edit_guest(request, event_id, guest_id):
     """Редактирование предпочтений гостя"""
     event = get_object_or_404(HolidayEvent, id=event_id)
     guest = get_object_or_404(Guest, id=guest_id)
-    dishes = Dish.objects.all().select_related('dish_type')
     dish_types = DishType.objects.all()
     
     if request.method == 'POST':
@@ -258,20 +362,18 @@ def edit_guest(request, event_id, guest_id):
             guest.name = guest_name
             guest.save()
         
+        # set() меняет только разницу, поэтому голоса пересчитываются по изменениям
         dish_ids = request.POST.getlist('favorite_dishes')
-        guest.favorite_dishes.clear()
-        if dish_ids:
-            favorite_dishes = Dish.objects.filter(id__in=dish_ids)
-            guest.favorite_dishes.add(*favorite_dishes)
+        guest.favorite_dishes.set(Dish.objects.filter(id__in=dish_ids))
         
         return redirect('show_event', event_id=event_id)
     
     context = {
         'event': event,
         'guest': guest,
-        'dishes': dishes,
         'dish_types': dish_types,
-        'selected_dishes': list(guest.favorite_dishes.values_list('id', flat=True))
+        'selected_dishes': guest.favorite_dishes.select_related('dish_type'),
+        'dish_options': dish_options_script(get_catalog()),
     }
     
     return render(request, 'core/edit_guest.html', context)
@@ -291,16 +393,8 @@ def delete_guest(request, event_id, guest_id):
     })
 from .views_debug import generate_shopping_list_debug
 
-def generate_shopping_list_debug(request, event_id):
-    """Отладочная версия расчета стоимости"""
-    from django.shortcuts import get_object_or_404
-    from django.http import HttpResponse
-    from .models import HolidayEvent, Dish
-    from collections import Counter
-    import json
-    
-    event = get_object_or_404(HolidayEvent, id=event_id)
-    
+def _debug_result(event):
+    """Детальный расчет стоимости для отладочной страницы"""
     # Собираем блюда
     all_dishes = []
     for guest in event.guests.all():
@@ -342,25 +436,9 @@ def generate_shopping_list_debug(request, event_id):
             # Расчет для всех гостей
             total_quantity = quantity_per_guest * event.number_of_guests
             
-            # Расчет стоимости
-            if unit == 'g':
-                cost = (total_quantity / 1000) * price
-                calculation = f"({total_quantity}g / 1000) × {price}₽/кг"
-            elif unit == 'kg':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}кг × {price}₽/кг"
-            elif unit == 'pcs':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}шт × {price}₽/шт"
-            elif unit == 'l':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}л × {price}₽/л"
-            elif unit == 'ml':
-                cost = (total_quantity / 1000) * price
-                calculation = f"({total_quantity}мл / 1000) × {price}₽/л"
-            else:
-                cost = total_quantity * price
-                calculation = f"{total_quantity}{unit} × {price}₽"
+            # Расчет стоимости по общей таблице единиц
+            cost = calculate_item_cost(total_quantity, unit, price)
+            calculation = describe_calculation(total_quantity, unit, price)
             
             ingredient_info = {
                 'name': ingredient.name,
@@ -380,6 +458,14 @@ def generate_shopping_list_debug(request, event_id):
     
     debug_info['total'] = total_cost
     
+    return debug_info
+
+def generate_shopping_list_debug(request, event_id):
+    """Отладочная версия расчета стоимости"""
+    event = get_object_or_404(HolidayEvent, id=event_id)
+    
+    debug_info = get_event_result(event, 'debug', lambda: _debug_result(event))
+    
     # Формируем HTML
     html = f"""
     <html>
@@ -2,6 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
 import json
 
+from .costs import calculate_item_cost, describe_calculation
+
 def generate_shopping_list_debug(request, event_id):
     """Версия для отладки расчета"""
     from .models import HolidayEvent, Dish
@@ -52,26 +54,9 @@ def generate_shopping_list_debug(request, event_id):
             # Расчет для всех гостей
             total_quantity = quantity_per_guest * event.number_of_guests
             
-            # Расчет стоимости
-            if unit == 'g':
-                # граммы → килограммы
-                cost = (total_quantity / 1000) * price
-                calculation = f"({total_quantity}g / 1000) × {price}₽/кг = {cost:.2f}₽"
-            elif unit == 'kg':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}кг × {price}₽/кг = {cost:.2f}₽"
-            elif unit == 'pcs':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}шт × {price}₽/шт = {cost:.2f}₽"
-            elif unit == 'l':
-                cost = total_quantity * price
-                calculation = f"{total_quantity}л × {price}₽/л = {cost:.2f}₽"
-            elif unit == 'ml':
-                cost = (total_quantity / 1000) * price
-                calculation = f"({total_quantity}мл / 1000) × {price}₽/л = {cost:.2f}₽"
-            else:
-                cost = total_quantity * price
-                calculation = f"{total_quantity}{unit} × {price}₽ = {cost:.2f}₽"
+            # Расчет стоимости по общей таблице единиц
+            cost = calculate_item_cost(total_quantity, unit, price)
+            calculation = describe_calculation(total_quantity, unit, price)
             
             ingredient_info = {
                 'name': ingredient.name,
@@ -4,6 +4,7 @@ from django.utils import timezone
 from django.db.models import Avg, Count
 from collections import Counter
 from .models import Dish, HolidayEvent, Guest, DishType, ShoppingList, ShoppingItem, Ingredient, DishIngredient
+from .costs import calculate_item_cost
 import datetime
 
 def index(request):
@@ -116,30 +117,6 @@ def generate_menu(request, event_id):
     
     return render(request, 'core/generate_menu.html', context)
 
-def calculate_item_cost(quantity, unit, price_per_unit):
-    """Правильный расчет стоимости товара"""
-    if not price_per_unit:
-        return 0
-    
-    # Конвертируем количество в единицы цены
-    if unit == 'g':  # цена за кг, количество в граммах
-        return (quantity / 1000) * price_per_unit
-    elif unit == 'kg':  # цена за кг, количество в кг
-        return quantity * price_per_unit
-    elif unit == 'ml':  # цена за литр, количество в мл
-        return (quantity / 1000) * price_per_unit
-    elif unit == 'l':  # цена за литр, количество в литрах
-        return quantity * price_per_unit
-    elif unit == 'pcs':  # цена за штуку
-        return quantity * price_per_unit
-    elif unit == 'tbsp':  # столовая ложка ≈ 15г
-        return (quantity * 0.015 / 1000) * price_per_unit
-    elif unit == 'tsp':  # чайная ложка ≈ 5г
-        return (quantity * 0.005 / 1000) * price_per_unit
-    else:
-        # По умолчанию считаем, что цена за кг
-        return (quantity / 1000) * price_per_unit
-
 def generate_shopping_list(request, event_id):
     """Формирование списка покупок для меню - РЕАЛИСТИЧНЫЙ РАСЧЕТ"""
     event = get_object_or_404(HolidayEvent, id=event_id)
@@ -4,6 +4,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'holiday_menu.settings')
 django.setup()
 
 from core.models import Ingredient
+from core.pricing import update_ingredient_prices
 
 print("ИСПРАВЛЕНИЕ ВСЕХ ЦЕН В БАЗЕ ДАННЫХ")
 print("=" * 50)
@@ -55,7 +56,7 @@ realistic_prices_rub = {
 }
 
 # Исправляем ВСЕ цены
-fixed_count = 0
+new_prices = {}
 for ingredient in Ingredient.objects.all():
     current_price = float(ingredient.average_price or 0)
     
@@ -88,10 +89,10 @@ for ingredient in Ingredient.objects.all():
         print(f"  Стало: {realistic_price} ₽")
         print(f"  Коэффициент: {current_price / realistic_price:.0f}x")
     
-    # Обновляем цену
-    ingredient.average_price = realistic_price
-    ingredient.save()
-    fixed_count += 1
+    new_prices[ingredient] = realistic_price
+
+# Обновляем цены одним пакетом и пересчитываем стоимость порций блюд
+fixed_count = update_ingredient_prices(new_prices)
 
 print(f"\n✅ Исправлено {fixed_count} ингредиентов")
 
@@ -100,19 +101,8 @@ print("\n=== ПРИМЕР РАСЧЕТА ДЛЯ ОДНОГО ГОСТЯ ===")
 from core.models import Dish
 dish = Dish.objects.first()
 if dish:
-    total = 0
-    for di in dish.ingredients_list.all():
-        quantity = di.quantity
-        price = float(di.ingredient.average_price or 0)
-        
-        if di.ingredient.unit == 'g':
-            cost = (quantity / 1000) * price
-        elif di.ingredient.unit == 'pcs':
-            cost = quantity * price
-        else:
-            cost = quantity * price
-            
-        total += cost
+    # Стоимость порции уже пересчитана вместе с ценами
+    total = float(dish.cost_per_serving)
     
     print(f"Блюдо '{dish.name}': {total:.2f} ₽ на одного гостя")
     
@@ -4,6 +4,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'holiday_menu.settings')
 django.setup()
 
 from core.models import Ingredient
+from core.costs import calculate_item_cost
 
 # Реалистичные цены (в рублях за единицу измерения)
 realistic_prices = {
@@ -74,12 +75,7 @@ for di in olivye.ingredients_list.all():
     price = float(di.ingredient.average_price or 0)
     
     # Конвертация единиц
-    if di.ingredient.unit == 'g':
-        cost = (quantity / 1000) * price
-    elif di.ingredient.unit == 'pcs':
-        cost = quantity * price
-    else:
-        cost = quantity * price
+    cost = calculate_item_cost(quantity, di.ingredient.unit, price)
     
     total += cost
     print(f"  {di.ingredient.name}: {quantity}{di.ingredient.unit} = {cost:.2f} ₽")
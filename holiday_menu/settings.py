@@ -84,6 +84,53 @@ DATABASES = {
 if os.getenv('DATABASE_URL'):
     DATABASES['default'] = dj_database_url.config(conn_max_age=600)
 
+# Сколько результатов расчетов мероприятий держать в кэше и как долго
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '500'))
+RESULT_CACHE_TIMEOUT = 60 * 60 * 24
+# Записи кэша, привязанные к поколению снимка каталога (статистика блюд,
+# варианты для выбора): после смены поколения старые записи истекают сами
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Cache
+# Кэш хранится в локальной памяти процесса, для общего кэша между
+# воркерами можно указать каталог. Ключи результатов содержат версию
+# данных из базы (core.generations), поэтому запись в одном воркере
+# сразу делает устаревшими записи остальных.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'holiday-menu',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # Результаты расчетов мероприятий; LocMemCache вытесняет по LRU
+    'results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'holiday-menu-results',
+        'TIMEOUT': RESULT_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': RESULT_CACHE_MAX_ENTRIES},
+    },
+}
+
+if os.getenv('DJANGO_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_DIR'),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+    CACHES['results'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(os.getenv('DJANGO_CACHE_DIR'), 'results'),
+        'TIMEOUT': RESULT_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': RESULT_CACHE_MAX_ENTRIES},
+    }
+
+# Графики меню рисуются в отдельных процессах и хранятся на диске
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+CHART_RENDER_TIMEOUT = 30
+
+# Процессы для пакетной выгрузки списков покупок
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '4'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,6 +161,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', MEDIA_ROOT / 'charts')
+# Не больше CHART_CACHE_MAX_FILES графиков; неиспользуемые дольше недели удаляются
+CHART_CACHE_MAX_FILES = int(os.getenv('CHART_CACHE_MAX_FILES', '500'))
+CHART_CACHE_TTL = 7 * 24 * 60 * 60
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -125,7 +176,7 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.AllowAny',
+        'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
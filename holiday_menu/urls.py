@@ -15,6 +15,6 @@ urlpatterns = [
     # Если у вас есть файл core/urls.py:
     path('', include('core.urls')),
 
-    # Подключаем API (если создали приложение api)
-    # path('api/', include('api.urls')),
+    # REST API
+    path('api/', include('api.urls')),
 ]
\ No newline at end of file
@@ -4,24 +4,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'holiday_menu.settings')
 django.setup()
 
 from core.models import Dish, Ingredient
-
-def calculate_item_cost(quantity, unit, price_per_unit):
-    """Правильный расчет стоимости товара"""
-    if not price_per_unit:
-        return 0
-    
-    if unit == 'g':
-        return (quantity / 1000) * price_per_unit
-    elif unit == 'kg':
-        return quantity * price_per_unit
-    elif unit == 'pcs':
-        return quantity * price_per_unit
-    elif unit == 'l':
-        return quantity * price_per_unit
-    elif unit == 'ml':
-        return (quantity / 1000) * price_per_unit
-    else:
-        return (quantity / 1000) * price_per_unit
+from core.costs import calculate_item_cost
 
 print("=== ТЕСТ РАСЧЕТА СТОИМОСТИ ===")
 print("Пример: Оливье на 10 гостей")